@@ -0,0 +1,63 @@
+"""
+WebSocket consumer pushing notifications and messages to signed-in users.
+
+Each connection joins ``user_<id>`` and, for school users, ``tenant_<id>``
+(tenant-wide events such as platform announcements).
+Events are published with apps.communications.realtime; the REST endpoints
+remain for history.
+"""
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from . import counters
+from .realtime import user_group, tenant_group
+
+
+class UserEventsConsumer(AsyncWebsocketConsumer):
+    """Per-user event stream (notifications, messages, unread counts)."""
+    
+    async def connect(self):
+        """Join the user's and tenant's groups."""
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        
+        self.groups_joined = [user_group(user.id)]
+        if user.tenant_id:
+            self.groups_joined.append(tenant_group(user.tenant_id))
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        
+        await self.accept()
+        
+        # Seed badges so the client never needs an initial REST poll
+        await self.send(text_data=json.dumps({
+            'type': 'unread_counts',
+            'data': await self.get_unread_counts(user.id)
+        }))
+    
+    async def disconnect(self, close_code):
+        """Leave all groups."""
+        for group in getattr(self, 'groups_joined', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+    
+    async def receive(self, text_data):
+        """Handle client messages (only keepalive pings)."""
+        try:
+            message_type = json.loads(text_data).get('type')
+        except (TypeError, ValueError):
+            return
+        if message_type == 'ping':
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+    
+    async def push_event(self, event):
+        """Forward a published event to the WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': event['event'],
+            'data': event['data']
+        }))
+    
+    @database_sync_to_async
+    def get_unread_counts(self, user_id):
+        return counters.get_unread_counts(user_id)
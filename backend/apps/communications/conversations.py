@@ -0,0 +1,95 @@
+"""
+Conversation inbox for in-app messaging.
+
+The inbox (latest message and unread count per conversation partner) comes
+from one window-function query; each branch of the UNION is served by an
+index on the sender or recipient side. Conversations are paginated by
+keyset on the latest message's ``(created_at, id)``, so deep pages cost the
+same as the first.
+"""
+import base64
+from datetime import datetime
+
+from django.db import connection
+
+from .models import Message
+
+INBOX_SQL = """
+    SELECT id, partner_id, unread_count, created_at
+    FROM (
+        SELECT
+            id, partner_id, created_at,
+            ROW_NUMBER() OVER (PARTITION BY partner_id ORDER BY created_at DESC, id DESC) AS position,
+            SUM(unread) OVER (PARTITION BY partner_id) AS unread_count
+        FROM (
+            SELECT id, recipient_id AS partner_id, created_at, 0 AS unread
+            FROM messages
+            WHERE sender_id = %(user_id)s AND NOT is_deleted
+            UNION ALL
+            SELECT id, sender_id AS partner_id, created_at, CASE WHEN is_read THEN 0 ELSE 1 END AS unread
+            FROM messages
+            WHERE recipient_id = %(user_id)s AND NOT is_deleted
+        ) AS user_messages
+    ) AS threads
+    WHERE position = 1 {keyset}
+    ORDER BY created_at DESC, id DESC
+    {limit}
+"""
+
+KEYSET_SQL = "AND (created_at, id) < (%(cursor_time)s, %(cursor_id)s)"
+
+
+def encode_cursor(created_at, message_id):
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, message_id)``; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, message_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def get_conversations(user, limit=None, cursor=None):
+    """
+    Return ``(conversations, next_cursor)`` for ``user``, most recent first.
+
+    Each conversation carries the partner, the latest message and the
+    number of unread messages from that partner. ``next_cursor`` is None on
+    the last page.
+    """
+    params = {'user_id': user.id}
+    keyset = ''
+    if cursor:
+        params['cursor_time'], params['cursor_id'] = decode_cursor(cursor)
+        keyset = KEYSET_SQL
+    limit_sql = ''
+    if limit:
+        # Fetch one extra row to know whether another page exists
+        params['limit'] = limit + 1
+        limit_sql = 'LIMIT %(limit)s'
+
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(INBOX_SQL.format(keyset=keyset, limit=limit_sql), params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+    messages = Message.objects.select_related('sender', 'recipient').in_bulk([row[0] for row in rows])
+    conversations = []
+    for message_id, partner_id, unread_count, created_at in rows:
+        message = messages[message_id]
+        partner = message.recipient if message.sender_id == user.id else message.sender
+        conversations.append({
+            'partner': partner,
+            'last_message': message,
+            'unread_count': int(unread_count),
+        })
+    return conversations, next_cursor
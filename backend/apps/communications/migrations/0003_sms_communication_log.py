@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schooladmin', '0003_reconciliation_snapshot'),
+        ('communications', '0002_sms_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smslog',
+            name='communication_log',
+            field=models.ForeignKey(blank=True, help_text='Campaign message this SMS delivers, if any', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sms_logs', to='schooladmin.communicationlog'),
+        ),
+    ]
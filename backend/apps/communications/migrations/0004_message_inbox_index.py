@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0003_sms_communication_log'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', 'sender', 'created_at'], name='messages_inbox_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0004_message_inbox_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='smslog',
+            name='provider_message_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
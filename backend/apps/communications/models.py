@@ -53,6 +53,7 @@ class SMSLog(BaseModel):
         max_length=20,
         choices=[
             ('pending', 'Pending'),
+            ('sending', 'Sending'),
             ('sent', 'Sent'),
             ('delivered', 'Delivered'),
             ('failed', 'Failed'),
@@ -60,16 +61,30 @@ class SMSLog(BaseModel):
         default='pending'
     )
     provider = models.CharField(max_length=50, default='twilio')
-    provider_message_id = models.CharField(max_length=100, blank=True)
+    provider_message_id = models.CharField(max_length=100, blank=True, db_index=True)
     error_message = models.TextField(blank=True)
     sent_at = models.DateTimeField(null=True, blank=True)
     
+    communication_log = models.ForeignKey(
+        'schooladmin.CommunicationLog',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sms_logs',
+        help_text="Campaign message this SMS delivers, if any"
+    )
+    
+    # Outbound queue
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="When the message is next due for sending")
+    
     class Meta:
         db_table = 'sms_logs'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['recipient_phone']),
+            models.Index(fields=['status', 'next_attempt_at']),
         ]
     
     def __str__(self):
@@ -111,6 +126,7 @@ class Message(BaseModel):
         indexes = [
             models.Index(fields=['sender', 'recipient']),
             models.Index(fields=['recipient', 'is_read']),
+            models.Index(fields=['recipient', 'sender', 'created_at'], name='messages_inbox_idx'),
         ]
     
     def __str__(self):
@@ -0,0 +1,188 @@
+"""
+Pluggable SMS providers used by the outbound SMS queue.
+
+A provider sends a batch of queued SMSLog rows and yields a result per row
+as each send returns; it never touches the database. The active provider is chosen with the
+``SMS_PROVIDER`` setting.
+"""
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SendResult:
+    """Outcome of sending one message."""
+
+    log_id: int
+    success: bool
+    provider_message_id: str = ''
+    error: str = ''
+    retryable: bool = True
+
+
+class ReceiptError(Exception):
+    """Raised for delivery-receipt callbacks that fail verification or parsing."""
+
+
+class BaseSMSProvider:
+    """Interface for SMS providers."""
+
+    name = 'base'
+    # Provider-wide throughput shared by every tenant (messages/second, burst)
+    rate_per_second = 10
+    burst = 20
+    max_batch_size = 100
+    # Upper bound on one send call (seconds); claims are leased from it
+    send_timeout = 10
+
+    def send_batch(self, logs):
+        """Send queued SMSLog rows, yielding a SendResult per row as each send returns."""
+        raise NotImplementedError
+    
+    def parse_receipts(self, request):
+        """
+        Verify a delivery-receipt callback and return
+        ``[(provider_message_id, status, error), ...]`` with status
+        'delivered' or 'failed' (other statuses are dropped).
+        """
+        raise ReceiptError(f"{self.name} does not support delivery receipts")
+
+
+class TwilioProvider(BaseSMSProvider):
+    """Twilio Programmable SMS (one API call per message, reusing one client)."""
+
+    name = 'twilio'
+    rate_per_second = 30
+    burst = 60
+
+    # Twilio error codes that will not succeed on retry (invalid/unreachable number, opted out)
+    PERMANENT_ERRORS = {21211, 21214, 21408, 21610, 21612, 21614}
+    
+    RECEIPT_STATUSES = {'delivered': 'delivered', 'undelivered': 'failed', 'failed': 'failed'}
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client as TwilioClient
+            self._client = TwilioClient(
+                settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN,
+                http_client=TwilioHttpClient(timeout=self.send_timeout)
+            )
+        return self._client
+
+    def send_batch(self, logs):
+        if not (settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN):
+            for log in logs:
+                yield SendResult(log.id, False, error='Twilio client not configured', retryable=False)
+            return
+
+        from twilio.base.exceptions import TwilioRestException
+
+        for log in logs:
+            try:
+                message = self.client.messages.create(
+                    body=log.message,
+                    from_=settings.TWILIO_PHONE_NUMBER,
+                    to=log.recipient_phone
+                )
+                yield SendResult(log.id, True, provider_message_id=message.sid)
+            except TwilioRestException as e:
+                yield SendResult(log.id, False, error=str(e), retryable=e.code not in self.PERMANENT_ERRORS)
+            except Exception as e:
+                logger.error(f"Failed to send SMS {log.id}: {e}")
+                yield SendResult(log.id, False, error=str(e))
+    
+    def parse_receipts(self, request):
+        """Twilio status callback (form-encoded, signed with the auth token)."""
+        from twilio.request_validator import RequestValidator
+        
+        validator = RequestValidator(settings.TWILIO_AUTH_TOKEN)
+        if not validator.validate(
+            request.build_absolute_uri(),
+            request.POST.dict(),
+            request.headers.get('X-Twilio-Signature', '')
+        ):
+            raise ReceiptError('Invalid signature')
+        
+        status = self.RECEIPT_STATUSES.get(request.POST.get('MessageStatus'))
+        message_id = request.POST.get('MessageSid')
+        if not status or not message_id:
+            return []
+        error = request.POST.get('ErrorCode', '')
+        return [(message_id, status, f"Twilio error {error}" if error else '')]
+
+
+class FakeSMSProvider(BaseSMSProvider):
+    """
+    In-process provider for tests and local development.
+
+    Sent messages are appended to ``outbox``; numbers listed in
+    ``fail_numbers`` fail (retryably unless in ``permanent_fail_numbers``).
+    """
+
+    name = 'fake'
+    rate_per_second = 1000
+    burst = 1000
+
+    outbox = []
+    fail_numbers = set()
+    permanent_fail_numbers = set()
+
+    def send_batch(self, logs):
+        for log in logs:
+            if log.recipient_phone in self.permanent_fail_numbers:
+                yield SendResult(log.id, False, error='Invalid number', retryable=False)
+            elif log.recipient_phone in self.fail_numbers:
+                yield SendResult(log.id, False, error='Temporary failure')
+            else:
+                provider_message_id = f"FAKE{uuid.uuid4().hex[:16]}"
+                self.outbox.append({
+                    'id': provider_message_id,
+                    'to': log.recipient_phone,
+                    'message': log.message,
+                })
+                yield SendResult(log.id, True, provider_message_id=provider_message_id)
+
+    def parse_receipts(self, request):
+        """``{"receipts": [{"id": ..., "status": ..., "error": ...}]}``; fake mode only."""
+        if settings.SMS_PROVIDER != 'fake':
+            raise ReceiptError('Fake provider is disabled')
+        try:
+            return [
+                (receipt['id'], receipt['status'], receipt.get('error', ''))
+                for receipt in json.loads(request.body)['receipts']
+            ]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ReceiptError(f'Malformed receipts: {e}')
+    
+    @classmethod
+    def reset(cls):
+        cls.outbox = []
+        cls.fail_numbers = set()
+        cls.permanent_fail_numbers = set()
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (TwilioProvider, FakeSMSProvider)
+}
+
+_instances = {}
+
+
+def get_provider(name=None):
+    """Provider instance by name (defaults to ``settings.SMS_PROVIDER``)."""
+    name = name or settings.SMS_PROVIDER
+    if name not in _instances:
+        _instances[name] = PROVIDERS[name]()
+    return _instances[name]
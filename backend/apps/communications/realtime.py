@@ -0,0 +1,75 @@
+"""
+Publishing events to connected users over the channel layer.
+
+Pushes are best effort: a missing or unreachable channel layer is logged
+and never fails the write that triggered the event. Callers inside a
+transaction should publish from ``transaction.on_commit``.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# Group sends issued concurrently per round trip to the event loop
+SEND_BATCH_SIZE = 200
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def tenant_group(tenant_id):
+    return f"tenant_{tenant_id}"
+
+
+def _publish(messages):
+    """Send ``(group, event, data)`` triples, batching the group sends."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not messages:
+        return
+
+    async def send_all():
+        for start in range(0, len(messages), SEND_BATCH_SIZE):
+            await asyncio.gather(*(
+                channel_layer.group_send(group, {'type': 'push_event', 'event': event, 'data': data})
+                for group, event, data in messages[start:start + SEND_BATCH_SIZE]
+            ))
+
+    try:
+        async_to_sync(send_all)()
+    except Exception as e:
+        logger.warning(f"Realtime push failed: {e}")
+
+
+def push_to_user(user_id, event, data):
+    _publish([(user_group(user_id), event, data)])
+
+
+def push_to_users(events):
+    """Push many per-user events, e.g. ``[(user_id, 'notification', data), ...]``."""
+    _publish([(user_group(user_id), event, data) for user_id, event, data in events])
+
+
+def push_to_tenant(tenant_id, event, data):
+    """One event to every connected user of a tenant, e.g. a tenant-wide announcement."""
+    _publish([(tenant_group(tenant_id), event, data)])
+
+
+def push_notifications(notifications):
+    """Push newly created notifications to their users."""
+    from .serializers import NotificationSerializer
+
+    push_to_users([
+        (notification.user_id, 'notification', data)
+        for notification, data in zip(notifications, NotificationSerializer(notifications, many=True).data)
+    ])
+
+
+def push_message(message):
+    """Push a newly created message to its recipient."""
+    from .serializers import MessageSerializer
+
+    push_to_user(message.recipient_id, 'message', MessageSerializer(message).data)
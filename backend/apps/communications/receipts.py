@@ -0,0 +1,251 @@
+"""
+Delivery-receipt ingestion for SMS and campaign messages.
+
+Provider callbacks only append receipts to a Redis list and return. A
+Celery task drains the list in batches: receipts are de-duplicated, grouped
+by final status and applied with one ``UPDATE ... FROM (VALUES ...)`` per
+status and table, and the affected campaigns' delivered/failed counters are
+bumped with one statement per status. Each batch is a few short statements,
+so a receipt storm after a large broadcast never queues row-by-row updates
+behind each other.
+
+A receipt can beat the sender's own write of the provider message id. Such
+receipts match no row; they are parked and re-applied on later runs for up
+to RECEIPT_PARK_SECONDS before being dropped as unknown.
+"""
+import json
+import logging
+import time
+from collections import Counter
+
+import redis
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from apps.core.rate_limit import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'receipts:sms'
+PARKED_KEY = 'receipts:sms:unmatched'
+# How long an unmatched receipt keeps being retried
+RECEIPT_PARK_SECONDS = 600
+SCHEDULE_LOCK_KEY = 'communications:receipts:scheduled'
+SCHEDULE_WINDOW_SECONDS = 5
+
+FINAL_STATUSES = ('delivered', 'failed')
+# A later receipt for the same message never downgrades delivered to failed
+STATUS_PRECEDENCE = {'failed': 0, 'delivered': 1}
+
+SMS_UPDATE_SQL = """
+    UPDATE sms_logs AS s
+    SET status = %s, error_message = v.error, updated_at = NOW()
+    FROM (VALUES {values}) AS v(provider_message_id, error)
+    WHERE s.provider_message_id = v.provider_message_id
+      AND s.status IN ('sending', 'sent')
+    RETURNING s.communication_log_id, v.error, s.provider_message_id
+"""
+
+LOG_UPDATE_SQL = """
+    UPDATE communication_logs AS c
+    SET status = %s,
+        error_message = v.error,
+        delivered_at = CASE WHEN %s = 'delivered' THEN NOW() ELSE c.delivered_at END,
+        updated_at = NOW()
+    FROM (VALUES {values}) AS v(match_key, error)
+    WHERE c.{key_column} = v.match_key
+      AND c.status IN ('pending', 'sent')
+    RETURNING c.campaign_id, v.match_key
+"""
+
+CAMPAIGN_ROLLUP_SQL = """
+    UPDATE communication_campaigns AS c
+    SET {counter} = c.{counter} + v.n, updated_at = NOW()
+    FROM (VALUES {values}) AS v(id, n)
+    WHERE c.id = v.id
+"""
+
+
+def _values(rows, casts):
+    """``(%s::type, ...), ...`` placeholders and flattened params for VALUES."""
+    row_sql = '(' + ', '.join(f'%s::{cast}' for cast in casts) + ')'
+    return ', '.join([row_sql] * len(rows)), [value for row in rows for value in row]
+
+
+def buffer_receipts(receipts):
+    """
+    Queue ``(provider_message_id, status, error)`` receipts for batched
+    application, stamped with the time they arrived. Falls back to applying
+    immediately if Redis is down.
+    """
+    now = time.time()
+    receipts = [(*receipt[:3], now) for receipt in receipts if receipt[1] in FINAL_STATUSES]
+    if not receipts:
+        return 0
+    try:
+        get_redis().rpush(BUFFER_KEY, *[json.dumps(receipt) for receipt in receipts])
+    except redis.RedisError as e:
+        logger.warning(f"Receipt buffer unavailable, applying inline: {e}")
+        apply_receipts(receipts)
+        return len(receipts)
+    schedule_receipt_processing()
+    return len(receipts)
+
+
+def schedule_receipt_processing():
+    """Enqueue the consumer at most once per window; beat picks up anything missed."""
+    from .tasks import apply_delivery_receipts
+
+    try:
+        if not cache.add(SCHEDULE_LOCK_KEY, 1, timeout=SCHEDULE_WINDOW_SECONDS):
+            return
+    except Exception:
+        return
+    apply_delivery_receipts.apply_async(countdown=SCHEDULE_WINDOW_SECONDS)
+
+
+# Moves every parked receipt back onto the buffer in one step
+REQUEUE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+for i = 1, #items do
+    redis.call('RPUSH', KEYS[2], items[i])
+end
+return #items
+"""
+
+
+def park_receipts(receipts):
+    """Keep ``(provider_message_id, status, error, first_seen)`` receipts for a later retry."""
+    now = time.time()
+    receipts = [receipt for receipt in receipts if now - receipt[3] < RECEIPT_PARK_SECONDS]
+    if not receipts:
+        return
+    try:
+        get_redis().rpush(PARKED_KEY, *[json.dumps(receipt) for receipt in receipts])
+    except redis.RedisError as e:
+        logger.warning(f"Could not park {len(receipts)} unmatched receipts: {e}")
+        return
+    schedule_receipt_processing()
+
+
+def requeue_parked_receipts():
+    """Put parked receipts back on the buffer; returns how many."""
+    return get_redis().register_script(REQUEUE_SCRIPT)(keys=[PARKED_KEY, BUFFER_KEY])
+
+
+def pop_receipts(batch_size):
+    """Atomically take up to ``batch_size`` buffered receipts."""
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.lrange(BUFFER_KEY, 0, batch_size - 1)
+    pipe.ltrim(BUFFER_KEY, batch_size, -1)
+    raw, _ = pipe.execute()
+    return [tuple(json.loads(item)) for item in raw]
+
+
+def drain_receipts(batch_size=1000, max_batches=20):
+    """Apply buffered receipts batch by batch; returns counts by status."""
+    totals = Counter()
+    requeue_parked_receipts()
+    for _ in range(max_batches):
+        receipts = pop_receipts(batch_size)
+        if not receipts:
+            break
+        try:
+            totals.update(apply_receipts(receipts))
+        except Exception:
+            # Put the batch back so the next run retries it
+            get_redis().rpush(BUFFER_KEY, *[json.dumps(receipt) for receipt in receipts])
+            raise
+    return dict(totals)
+
+
+def apply_receipts(receipts):
+    """
+    Apply a batch of ``(provider_message_id, status, error[, first_seen])``
+    receipts.
+
+    Updates SMSLog rows by provider id, the CommunicationLog rows they
+    deliver (and any logged directly under the provider id), then rolls
+    the transitions up into the campaigns. Receipts that matched nothing
+    are parked once the batch commits. Returns counts by status.
+    """
+    now = time.time()
+    latest = {}
+    for provider_message_id, status, error, *rest in receipts:
+        first_seen = rest[0] if rest else now
+        current = latest.get(provider_message_id)
+        if current is None or STATUS_PRECEDENCE[status] >= STATUS_PRECEDENCE[current[0]]:
+            first_seen = min(first_seen, current[2]) if current else first_seen
+            latest[provider_message_id] = (status, error or '', first_seen)
+
+    applied = Counter()
+    unmatched = []
+    with transaction.atomic():
+        for status in FINAL_STATUSES:
+            rows = sorted(
+                (provider_message_id, error)
+                for provider_message_id, (receipt_status, error, _) in latest.items()
+                if receipt_status == status
+            )
+            if not rows:
+                continue
+
+            with connection.cursor() as cursor:
+                values, params = _values(rows, ('text', 'text'))
+                cursor.execute(SMS_UPDATE_SQL.format(values=values), [status] + params)
+                updated = cursor.fetchall()
+            matched = {provider_message_id for _, _, provider_message_id in updated}
+            linked = sorted((log_id, error) for log_id, error, _ in updated if log_id)
+
+            campaign_ids = []
+            if linked:
+                campaign_ids += [campaign_id for campaign_id, _ in _update_logs(status, 'id', 'bigint', linked)]
+            for campaign_id, provider_message_id in _update_logs(status, 'provider_message_id', 'text', rows):
+                campaign_ids.append(campaign_id)
+                matched.add(provider_message_id)
+            rollup_campaigns(status, Counter(campaign_id for campaign_id in campaign_ids if campaign_id))
+
+            applied[status] += len(matched)
+            unmatched += [
+                (provider_message_id, status, error, latest[provider_message_id][2])
+                for provider_message_id, error in rows
+                if provider_message_id not in matched
+            ]
+        if unmatched:
+            transaction.on_commit(lambda: park_receipts(unmatched))
+    return dict(applied)
+
+
+def _update_logs(status, key_column, key_cast, rows):
+    """Returns ``[(campaign_id, match_key), ...]`` for the rows updated."""
+    values, params = _values(rows, (key_cast, 'text'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            LOG_UPDATE_SQL.format(values=values, key_column=key_column),
+            [status, status] + params
+        )
+        return cursor.fetchall()
+
+
+def apply_communication_log_statuses(status, rows):
+    """
+    Mark CommunicationLog rows (``[(log_id, error), ...]``) delivered or
+    failed and roll the change up into their campaigns, e.g. when an SMS
+    fails permanently before reaching the provider.
+    """
+    if not rows:
+        return
+    with transaction.atomic():
+        updated = _update_logs(status, 'id', 'bigint', sorted(rows))
+        rollup_campaigns(status, Counter(campaign_id for campaign_id, _ in updated if campaign_id))
+
+
+def rollup_campaigns(status, counts):
+    """Add ``{campaign_id: n}`` to the campaigns' delivered or failed counter."""
+    if not counts:
+        return
+    counter = 'delivered_count' if status == 'delivered' else 'failed_count'
+    values, params = _values(sorted(counts.items()), ('bigint', 'integer'))
+    with connection.cursor() as cursor:
+        cursor.execute(CAMPAIGN_ROLLUP_SQL.format(counter=counter, values=values), params)
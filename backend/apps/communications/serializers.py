@@ -3,6 +3,7 @@ Serializers for Communications app.
 """
 from rest_framework import serializers
 from .models import Notification, SMSLog, Message, MessageTemplate
+from .templating import TemplateError, compile_template, declared_variables
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -51,7 +52,27 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'read_at')
 
 
-class MessageTemplateSerializer(serializers.ModelSerializer):
+class TemplateVariablesMixin:
+    """
+    Validation for MessageTemplate serializers (either app's model): the body
+    and subject may only use the variables the template declares.
+    """
+    
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        variables = attrs.get('variables', getattr(self.instance, 'variables', []))
+        if not variables:
+            return attrs
+        declared = declared_variables(variables)
+        for field in ('body', 'subject'):
+            try:
+                compile_template(attrs.get(field, getattr(self.instance, field, '')) or '').validate(declared)
+            except TemplateError as e:
+                raise serializers.ValidationError({field: str(e)})
+        return attrs
+
+
+class MessageTemplateSerializer(TemplateVariablesMixin, serializers.ModelSerializer):
     """Serializer for MessageTemplate."""
     
     class Meta:
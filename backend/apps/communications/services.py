@@ -2,65 +2,243 @@
 Communication services: SMS, Email, Notifications.
 """
 import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
 from django.conf import settings
-from twilio.rest import Client as TwilioClient
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from apps.core.rate_limit import TokenBucket, take_all
+from . import counters, realtime
 from .models import SMSLog, Notification, Message
+from .providers import PROVIDERS, get_provider
+from .receipts import apply_communication_log_statuses
 
 logger = logging.getLogger(__name__)
 
 
 class SMSService:
-    """Service for sending SMS messages."""
+    """
+    Outbound SMS queue.
     
-    def __init__(self):
-        self.twilio_client = None
-        if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-            try:
-                self.twilio_client = TwilioClient(
-                    settings.TWILIO_ACCOUNT_SID,
-                    settings.TWILIO_AUTH_TOKEN
-                )
-            except Exception as e:
-                logger.error(f"Failed to initialize Twilio client: {e}")
+    Messages are written to SMSLog as pending rows and sent by Celery
+    workers (see apps.communications.tasks.drain_sms_queue). Each
+    tenant/provider group claims only as many rows as its token buckets
+    grant, the results of each provider batch are written with one bulk
+    update, and retryable failures back off exponentially. Receipts that
+    arrive before their batch is written are parked and re-applied (see
+    apps.communications.receipts).
+    """
+    
+    SCHEDULE_LOCK_KEY = 'communications:sms:drain-scheduled'
+    SCHEDULE_WINDOW_SECONDS = 2
+    # Added to the worst-case send time of a claim to form its lease
+    SEND_LEASE_MARGIN_SECONDS = 60
+    STATUS_FIELDS = ['status', 'provider_message_id', 'sent_at', 'error_message', 'attempts', 'next_attempt_at', 'updated_at']
     
     def send_sms(self, phone_number, message, tenant=None):
-        """Send SMS message."""
-        if not self.twilio_client:
-            logger.warning("Twilio client not configured")
-            return None
+        """Queue a single SMS."""
+        sms_log = SMSLog.objects.create(
+            tenant=tenant,
+            recipient_phone=phone_number,
+            message=message,
+            status='pending',
+            provider=settings.SMS_PROVIDER,
+            next_attempt_at=timezone.now()
+        )
+        self.schedule_dispatch()
+        return sms_log
+    
+    def send_bulk_sms(self, recipients, message=None, tenant=None, batch_size=1000):
+        """
+        Queue many SMS with chunked bulk inserts.
         
-        try:
-            # Log SMS attempt
-            sms_log = SMSLog.objects.create(
+        ``recipients`` is an iterable of phone numbers (all sent ``message``),
+        of ``(phone_number, message)`` pairs, or of
+        ``(phone_number, message, extra_fields)`` triples whose dict is set on
+        the SMSLog (e.g. ``communication_log_id``). It is consumed lazily.
+        Returns the number of messages queued.
+        """
+        now = timezone.now()
+        queued = 0
+        chunk = []
+        for recipient in recipients:
+            extra = {}
+            if not isinstance(recipient, (tuple, list)):
+                phone_number, text = recipient, message
+            elif len(recipient) == 3:
+                phone_number, text, extra = recipient
+            else:
+                phone_number, text = recipient
+            chunk.append(SMSLog(
                 tenant=tenant,
                 recipient_phone=phone_number,
-                message=message,
+                message=text,
                 status='pending',
-                provider='twilio'
-            )
-            
-            # Send via Twilio
-            twilio_message = self.twilio_client.messages.create(
-                body=message,
-                from_=settings.TWILIO_PHONE_NUMBER,
-                to=phone_number
-            )
-            
-            # Update log
-            sms_log.status = 'sent'
-            sms_log.provider_message_id = twilio_message.sid
-            sms_log.sent_at = twilio_message.date_sent
-            sms_log.save()
-            
-            return sms_log
+                provider=settings.SMS_PROVIDER,
+                next_attempt_at=now,
+                **extra
+            ))
+            if len(chunk) >= batch_size:
+                SMSLog.objects.bulk_create(chunk)
+                queued += len(chunk)
+                chunk = []
+        if chunk:
+            SMSLog.objects.bulk_create(chunk)
+            queued += len(chunk)
         
+        if queued:
+            self.schedule_dispatch()
+        return queued
+    
+    def schedule_dispatch(self):
+        """Enqueue a drain at most once per window; beat covers anything missed."""
+        from .tasks import drain_sms_queue
+        
+        try:
+            if not cache.add(self.SCHEDULE_LOCK_KEY, 1, timeout=self.SCHEDULE_WINDOW_SECONDS):
+                return
         except Exception as e:
-            logger.error(f"Failed to send SMS: {e}")
-            if sms_log:
-                sms_log.status = 'failed'
-                sms_log.error_message = str(e)
-                sms_log.save()
-            return None
+            logger.warning(f"Could not schedule SMS dispatch: {e}")
+            return
+        drain_sms_queue.apply_async(countdown=self.SCHEDULE_WINDOW_SECONDS / 2)
+    
+    def drain(self, batch_size=100, max_batches=50):
+        """Send due messages batch by batch; returns counts by outcome."""
+        stats = defaultdict(int)
+        for _ in range(max_batches):
+            claimed = 0
+            for tenant_id, provider_name in self._due_groups():
+                claimed += self._drain_group(tenant_id, provider_name, batch_size, stats)
+            if not claimed:
+                break
+        return dict(stats)
+    
+    def _due_groups(self):
+        """``(tenant_id, provider)`` pairs with messages due now."""
+        return list(
+            SMSLog.objects.filter(
+                status__in=['pending', 'sending'],
+                next_attempt_at__lte=timezone.now(),
+                is_deleted=False
+            ).order_by().values_list('tenant_id', 'provider').distinct()
+        )
+    
+    def _drain_group(self, tenant_id, provider_name, batch_size, stats):
+        """
+        Claim only as many of one tenant/provider's due messages as the rate
+        limits grant, and send them. Returns the number claimed.
+        """
+        if provider_name not in PROVIDERS:
+            logs, lease = self._claim(tenant_id, provider_name, batch_size, self.SEND_LEASE_MARGIN_SECONDS)
+            for log in logs:
+                log.status = 'failed'
+                log.error_message = f"Unknown SMS provider: {provider_name}"
+                log.next_attempt_at = None
+            self._save(logs, lease)
+            stats['failed'] += len(logs)
+            self._fail_campaign_logs(logs)
+            return len(logs)
+        
+        provider = get_provider(provider_name)
+        buckets = [
+            TokenBucket(
+                f"sms:tenant:{tenant_id or 'platform'}",
+                settings.SMS_TENANT_RATE_PER_SECOND,
+                settings.SMS_TENANT_BURST
+            ),
+            TokenBucket(f"sms:provider:{provider_name}", provider.rate_per_second, provider.burst),
+        ]
+        granted = take_all(buckets, batch_size)
+        if not granted:
+            # Rows stay pending untouched; the follow-up drain retries them
+            stats['throttled_groups'] += 1
+            return 0
+        
+        # Long enough to send every claimed message at the provider's timeout
+        lease_seconds = granted * provider.send_timeout + self.SEND_LEASE_MARGIN_SECONDS
+        logs, lease = self._claim(tenant_id, provider_name, granted, lease_seconds)
+        # Tokens for messages another worker claimed first go back
+        for bucket in buckets:
+            bucket.refund(granted - len(logs))
+        
+        by_id = {log.id: log for log in logs}
+        for start in range(0, len(logs), provider.max_batch_size):
+            batch = logs[start:start + provider.max_batch_size]
+            for result in provider.send_batch(batch):
+                self._apply_result(by_id[result.log_id], result, stats)
+            self._save(batch, lease)
+        self._fail_campaign_logs(logs)
+        return len(logs)
+    
+    def _claim(self, tenant_id, provider_name, limit, lease_seconds):
+        """
+        Lease up to ``limit`` due messages so concurrent workers skip them.
+        
+        Returns the claimed rows and the lease expiry, which also identifies
+        this claim when its results are written.
+        """
+        now = timezone.now()
+        lease = now + timedelta(seconds=lease_seconds)
+        with transaction.atomic():
+            ids = list(
+                SMSLog.objects.select_for_update(skip_locked=True).filter(
+                    tenant_id=tenant_id,
+                    provider=provider_name,
+                    status__in=['pending', 'sending'],
+                    next_attempt_at__lte=now,
+                    is_deleted=False
+                ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+            )
+            if not ids:
+                return [], lease
+            SMSLog.objects.filter(id__in=ids).update(status='sending', next_attempt_at=lease)
+        return list(SMSLog.objects.filter(id__in=ids).order_by('id')), lease
+    
+    def _save(self, logs, lease):
+        """
+        Write a batch's results in one bulk update, only to rows still held
+        under ``lease``, so a row another drain reclaimed or finished is
+        never overwritten.
+        """
+        now = timezone.now()
+        for log in logs:
+            log.updated_at = now
+        SMSLog.objects.filter(status='sending', next_attempt_at=lease).bulk_update(logs, self.STATUS_FIELDS)
+    
+    @staticmethod
+    def _fail_campaign_logs(logs):
+        # Campaign messages that will never reach the provider count as failed
+        apply_communication_log_statuses('failed', [
+            (log.communication_log_id, log.error_message)
+            for log in logs
+            if log.status == 'failed' and log.communication_log_id
+        ])
+    
+    @staticmethod
+    def _apply_result(log, result, stats):
+        now = timezone.now()
+        log.attempts += 1
+        if result.success:
+            log.status = 'sent'
+            log.provider_message_id = result.provider_message_id
+            log.sent_at = now
+            log.error_message = ''
+            log.next_attempt_at = None
+            stats['sent'] += 1
+        elif result.retryable and log.attempts < settings.SMS_MAX_ATTEMPTS:
+            delay = min(settings.SMS_RETRY_MAX_SECONDS, settings.SMS_RETRY_BASE_SECONDS * 2 ** (log.attempts - 1))
+            # Jitter spreads retries of a failed batch instead of re-sending in lockstep
+            log.status = 'pending'
+            log.error_message = result.error
+            log.next_attempt_at = now + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+            stats['retrying'] += 1
+        else:
+            log.status = 'failed'
+            log.error_message = result.error
+            log.next_attempt_at = None
+            stats['failed'] += 1
 
 
 class NotificationService:
@@ -79,20 +257,76 @@ class NotificationService:
         )
     
     @staticmethod
-    def create_bulk_notifications(users, title, message, notification_type='info', tenant=None):
-        """Create notifications for multiple users."""
-        notifications = []
-        for user in users:
-            notifications.append(
-                Notification(
-                    user=user,
-                    tenant=tenant,
-                    title=title,
-                    message=message,
-                    notification_type=notification_type
+    def create_bulk_notifications(users, title, message, notification_type='info', tenant=None,
+                                  action_url='', batch_size=1000, dedupe_window=None, push=True):
+        """
+        Create the same notification for many users, chunk by chunk.
+        
+        ``users`` may be a User queryset (ids are streamed with ``.iterator()``),
+        or an iterable of users or user ids. Each chunk of ``batch_size`` is
+        inserted, counted and pushed on its own, so memory stays bounded by
+        one chunk. Users who already received an identical notification within
+        ``dedupe_window`` (default ``NOTIFICATION_DEDUPE_SECONDS``) are skipped.
+        Pass ``push=False`` when the caller publishes one tenant-wide event
+        instead of a push per user (see realtime.push_to_tenant).
+        Returns the number of notifications created.
+        """
+        if hasattr(users, 'values_list'):
+            user_ids = users.values_list('id', flat=True).order_by().iterator(chunk_size=batch_size)
+        else:
+            user_ids = (getattr(user, 'pk', user) for user in users)
+        if dedupe_window is None:
+            dedupe_window = timedelta(seconds=settings.NOTIFICATION_DEDUPE_SECONDS)
+        
+        created = 0
+        chunk = []
+        for user_id in user_ids:
+            chunk.append(user_id)
+            if len(chunk) >= batch_size:
+                created += NotificationService._create_notification_chunk(
+                    chunk, title, message, notification_type, tenant, action_url, dedupe_window, push
                 )
+                chunk = []
+        if chunk:
+            created += NotificationService._create_notification_chunk(
+                chunk, title, message, notification_type, tenant, action_url, dedupe_window, push
             )
-        return Notification.objects.bulk_create(notifications)
+        return created
+    
+    @staticmethod
+    def _create_notification_chunk(user_ids, title, message, notification_type, tenant, action_url, dedupe_window,
+                                   push=True):
+        already_notified = set()
+        if dedupe_window:
+            already_notified = set(Notification.objects.filter(
+                user_id__in=user_ids,
+                title=title,
+                message=message,
+                notification_type=notification_type,
+                created_at__gte=timezone.now() - dedupe_window,
+                is_deleted=False,
+            ).values_list('user_id', flat=True))
+        
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                tenant=tenant,
+                title=title,
+                message=message,
+                notification_type=notification_type,
+                action_url=action_url
+            )
+            for user_id in dict.fromkeys(user_ids)
+            if user_id not in already_notified
+        ])
+        
+        # bulk_create skips post_save, so count and push the new notifications here
+        def publish():
+            counters.increment('notifications', [notification.user_id for notification in notifications])
+            if push:
+                realtime.push_notifications(notifications)
+        transaction.on_commit(publish)
+        return len(notifications)
 
 
 # Singleton instances
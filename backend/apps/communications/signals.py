@@ -0,0 +1,44 @@
+"""
+Signals keeping unread counters and connected clients in step with
+single-row writes.
+
+Bulk inserts bypass these signals and count and push themselves
+(see NotificationService.create_bulk_notifications).
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import counters, realtime
+from .models import Notification, Message
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        def publish():
+            counters.increment('notifications', [instance.user_id])
+            realtime.push_notifications([instance])
+        transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        def publish():
+            counters.increment('messages', [instance.recipient_id])
+            realtime.push_message(instance)
+        transaction.on_commit(publish)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: counters.decrement('notifications', user_id))
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    if not instance.is_read:
+        recipient_id = instance.recipient_id
+        transaction.on_commit(lambda: counters.decrement('messages', recipient_id))
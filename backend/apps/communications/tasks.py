@@ -0,0 +1,47 @@
+"""
+Celery tasks for communications.
+"""
+from celery import shared_task
+from django.core.cache import cache
+from django.utils import timezone
+from . import counters, receipts
+from .models import SMSLog
+from .services import sms_service
+
+RETRY_LOCK_KEY = 'communications:sms:follow-up-scheduled'
+
+
+@shared_task
+def drain_sms_queue(batch_size=100, max_batches=50):
+    """Send queued SMS in rate-limited batches."""
+    stats = sms_service.drain(batch_size=batch_size, max_batches=max_batches)
+    
+    # Keep going while messages are due soon (throttled or backlogged)
+    next_due = SMSLog.objects.filter(
+        status='pending',
+        next_attempt_at__isnull=False
+    ).order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if next_due:
+        wait = max((next_due - timezone.now()).total_seconds(), 1)
+        # One follow-up run at a time, however many drains noticed the backlog
+        if wait < 30 and cache.add(RETRY_LOCK_KEY, 1, timeout=int(wait) + 1):
+            drain_sms_queue.apply_async(
+                kwargs={'batch_size': batch_size, 'max_batches': max_batches},
+                countdown=wait
+            )
+    
+    return f"SMS dispatched: {stats}"
+
+
+@shared_task
+def reconcile_unread_counters():
+    """Correct drifted unread counters against the database."""
+    corrected = counters.reconcile()
+    return f"Unread counters corrected: {corrected}"
+
+
+@shared_task
+def apply_delivery_receipts(batch_size=1000, max_batches=20):
+    """Apply buffered delivery receipts in batches."""
+    applied = receipts.drain_receipts(batch_size=batch_size, max_batches=max_batches)
+    return f"Delivery receipts applied: {applied}"
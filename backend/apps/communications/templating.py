@@ -0,0 +1,113 @@
+"""
+Compiled message templates.
+
+Template bodies use ``{{variable}}`` placeholders (``{variable}`` is also
+accepted for older communications templates). A template is compiled once
+into a ``str.format_map`` pattern and cached by model, id and
+``updated_at``, so editing a template invalidates its compiled form and
+rendering a recipient is a single C-level format call.
+"""
+import datetime
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r'{{\s*(\w+)\s*}}|{(\w+)}')
+
+DATE_FORMAT = '%d %b %Y'
+
+
+class TemplateError(ValueError):
+    """Raised for templates referencing unknown or missing variables."""
+
+
+def format_value(value):
+    """Human-readable form of a template value."""
+    if value is None:
+        return ''
+    if isinstance(value, Decimal):
+        return f"{value:,.2f}"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime(DATE_FORMAT)
+    return str(value)
+
+
+class CompiledTemplate:
+    """A template body compiled to a ``format_map`` pattern."""
+
+    def __init__(self, body):
+        self.variables = []
+        parts = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(body):
+            name = match.group(1) or match.group(2)
+            parts.append(self._escape(body[position:match.start()]))
+            parts.append('{' + name + '}')
+            if name not in self.variables:
+                self.variables.append(name)
+            position = match.end()
+        parts.append(self._escape(body[position:]))
+        self.pattern = ''.join(parts)
+
+    @staticmethod
+    def _escape(text):
+        return text.replace('{', '{{').replace('}', '}}')
+
+    def validate(self, available):
+        """Raise TemplateError if the template uses variables not in ``available``."""
+        unknown = [name for name in self.variables if name not in available]
+        if unknown:
+            raise TemplateError(f"Unknown template variables: {', '.join(unknown)}")
+
+    def render(self, context):
+        return self.pattern.format_map({name: format_value(context.get(name)) for name in self.variables})
+
+    def render_batch(self, contexts, common=None):
+        """
+        Render one message per context, in order.
+
+        ``common`` values apply to every message unless a context has its own
+        value for the name. Each distinct combination of used values is
+        formatted once.
+        """
+        common = common or {}
+        variables = self.variables
+        pattern = self.pattern
+        rendered = {}
+        messages = []
+        for context in contexts:
+            key = tuple(context[name] if name in context else common.get(name) for name in variables)
+            message = rendered.get(key)
+            if message is None:
+                message = rendered[key] = pattern.format_map(
+                    {name: format_value(value) for name, value in zip(variables, key)}
+                )
+            messages.append(message)
+        return messages
+
+
+@lru_cache(maxsize=512)
+def _compile(cache_key, body):
+    return CompiledTemplate(body)
+
+
+def compile_template(body, cache_key=None):
+    """
+    Compiled form of ``body``; pass ``cache_key`` to reuse it across calls.
+
+    Use ``get_compiled`` for MessageTemplate instances.
+    """
+    if cache_key is None:
+        return CompiledTemplate(body)
+    return _compile(cache_key, body)
+
+
+def get_compiled(template, field='body'):
+    """Compiled ``field`` of a MessageTemplate (either app's model)."""
+    cache_key = (template._meta.label, template.pk, field, template.updated_at)
+    return compile_template(getattr(template, field), cache_key)
+
+
+def declared_variables(variables):
+    """Names from a MessageTemplate ``variables`` list, with or without braces."""
+    return {str(name).strip('{} ') for name in (variables or [])}
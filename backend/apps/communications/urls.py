@@ -5,7 +5,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     NotificationViewSet, SMSLogViewSet,
-    MessageViewSet, MessageTemplateViewSet
+    MessageViewSet, MessageTemplateViewSet, UnreadCountsView,
+    SMSDeliveryReceiptView
 )
 
 router = DefaultRouter()
@@ -15,6 +16,8 @@ router.register(r'messages', MessageViewSet, basename='message')
 router.register(r'message-templates', MessageTemplateViewSet, basename='message-template')
 
 urlpatterns = [
+    path('unread-counts/', UnreadCountsView.as_view(), name='unread-counts'),
+    path('sms-receipts/<str:provider>/', SMSDeliveryReceiptView.as_view(), name='sms-receipts'),
     path('', include(router.urls)),
 ]
 
@@ -2,16 +2,21 @@
 Views for Communications app.
 """
 from django.db.models import Q
+from django.utils import timezone
 from rest_framework import viewsets, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from .models import Notification, SMSLog, Message, MessageTemplate
 from .serializers import (
     NotificationSerializer, SMSLogSerializer,
     MessageSerializer, MessageTemplateSerializer
 )
 from .services import sms_service, notification_service
+from . import counters
+from .providers import PROVIDERS, ReceiptError, get_provider
+from .receipts import buffer_receipts
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -29,17 +34,52 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_read(self, request, pk=None):
         """Mark notification as read."""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        # Conditional update so repeated clicks only decrement the badge once
+        if Notification.objects.filter(id=notification.id, is_read=False).update(
+            is_read=True, read_at=timezone.now()
+        ):
+            counters.decrement('notifications', request.user.id)
         return Response({'status': 'marked as read'})
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all notifications as read."""
-        self.get_queryset().update(is_read=True)
+        self.get_queryset().filter(is_read=False).update(is_read=True, read_at=timezone.now())
+        counters.reset('notifications', request.user.id)
         return Response({'status': 'all marked as read'})
 
 
+class UnreadCountsView(APIView):
+    """Unread notification and message counts for badges (served from Redis)."""
+    
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        return Response(counters.get_unread_counts(request.user.id))
+
+
+class SMSDeliveryReceiptView(APIView):
+    """
+    Provider delivery-receipt callbacks.
+    
+    Receipts are verified and buffered, then applied in batches by a
+    background task.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+    
+    def post(self, request, provider):
+        if provider not in PROVIDERS:
+            return Response({'error': 'Unknown provider'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            receipts = get_provider(provider).parse_receipts(request)
+        except ReceiptError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'received', 'count': buffer_receipts(receipts)})
+
+
 class SMSLogViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for SMSLog (read-only for admins)."""
     
@@ -74,68 +114,56 @@ class MessageViewSet(viewsets.ModelViewSet):
         """Mark message as read."""
         message = self.get_object()
         if message.recipient == request.user:
-            message.is_read = True
-            message.save()
+            if Message.objects.filter(id=message.id, is_read=False).update(
+                is_read=True, read_at=timezone.now()
+            ):
+                counters.decrement('messages', request.user.id)
             return Response({'status': 'marked as read'})
         return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
     
     @action(detail=False, methods=['get'])
     def conversations(self, request):
-        """Get all conversations (grouped by other user)."""
-        from django.db.models import Max, Count, Value, IntegerField
-        from django.db.models.functions import Coalesce
-        from django.contrib.auth import get_user_model
+        """
+        Get all conversations (grouped by other user), most recent first.
         
-        User = get_user_model()
-        user = request.user
+        Pass ``limit`` (and then ``cursor``) for a page of conversations as
+        ``{'results': [...], 'next_cursor': ...}``; without them the full
+        list is returned.
+        """
+        from .conversations import get_conversations
         
-        # Get all unique conversation partners with their latest message time
-        sent_messages = self.get_queryset().filter(sender=user)
-        received_messages = self.get_queryset().filter(recipient=user)
+        limit = request.query_params.get('limit')
+        cursor = request.query_params.get('cursor')
+        paginated = bool(limit or cursor)
         
-        # Combine all partner IDs
-        sent_partner_ids = sent_messages.values_list('recipient_id', flat=True).distinct()
-        received_partner_ids = received_messages.values_list('sender_id', flat=True).distinct()
-        all_partner_ids = set(list(sent_partner_ids) + list(received_partner_ids))
-        
-        if not all_partner_ids:
-            return Response([])
+        try:
+            limit = min(int(limit), 100) if limit else (50 if cursor else None)
+            if limit is not None and limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get partner users
-        partners = User.objects.filter(id__in=all_partner_ids)
+        try:
+            threads, next_cursor = get_conversations(request.user, limit=limit, cursor=cursor)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Build conversation list
         conversations = []
-        for partner in partners:
-            # Get messages between user and this partner
-            conversation_messages = self.get_queryset().filter(
-                Q(sender=user, recipient=partner) | Q(sender=partner, recipient=user)
-            )
-            
-            # Get last message
-            last_message = conversation_messages.order_by('-created_at').first()
-            
-            # Count unread messages (messages sent by partner to user that are unread)
-            unread_count = conversation_messages.filter(
-                sender=partner, recipient=user, is_read=False
-            ).count()
-            
+        for thread in threads:
+            partner = thread['partner']
+            last_message = thread['last_message']
             conversations.append({
                 'partner_id': partner.id,
-                'partner_name': partner.get_full_name() if hasattr(partner, 'get_full_name') else f"{partner.first_name or ''} {partner.last_name or ''}".strip() or partner.email,
+                'partner_name': partner.get_full_name(),
                 'partner_email': partner.email,
-                'partner_role': getattr(partner, 'role', None),
-                'last_message': MessageSerializer(last_message).data if last_message else None,
-                'unread_count': unread_count,
-                'last_message_time': last_message.created_at.isoformat() if last_message else None
+                'partner_role': partner.role,
+                'last_message': MessageSerializer(last_message).data,
+                'unread_count': thread['unread_count'],
+                'last_message_time': last_message.created_at.isoformat()
             })
         
-        # Sort by last message time (most recent first)
-        conversations.sort(
-            key=lambda x: x['last_message_time'] if x['last_message_time'] else '',
-            reverse=True
-        )
-        
+        if paginated:
+            return Response({'results': conversations, 'next_cursor': next_cursor})
         return Response(conversations)
     
     @action(detail=False, methods=['get'])
@@ -156,8 +184,8 @@ class MessageViewSet(viewsets.ModelViewSet):
         ).order_by('created_at')
         
         # Mark messages as read
-        from django.utils import timezone
-        messages.filter(recipient=user, is_read=False).update(is_read=True, read_at=timezone.now())
+        marked = messages.filter(recipient=user, is_read=False).update(is_read=True, read_at=timezone.now())
+        counters.decrement('messages', user.id, marked)
         
         serializer = self.get_serializer(messages, many=True)
         return Response(serializer.data)
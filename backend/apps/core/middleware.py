@@ -1,9 +1,15 @@
 """
 Custom middleware for request tracking and audit logging.
 """
+import logging
+import random
+import time
 from threading import local
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
+logger = logging.getLogger(__name__)
+
 _thread_locals = local()
 
 
@@ -37,3 +43,70 @@ class TenantMiddleware(MiddlewareMixin):
         else:
             request.tenant = None
         return None
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """Record latency and status of every request (see apps.core.request_metrics)."""
+    
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+    
+    def process_response(self, request, response):
+        from .query_profiler import view_name
+        from .request_metrics import collector
+        
+        started = getattr(request, '_metrics_started', None)
+        if started is None:
+            return response
+        
+        user = getattr(request, 'user', None)
+        collector.record(
+            view_name(request),
+            (time.perf_counter() - started) * 1000,
+            response.status_code,
+            user_id=user.id if user is not None and user.is_authenticated else None,
+        )
+        return response
+
+
+class QueryProfilerMiddleware(MiddlewareMixin):
+    """
+    Profile the SQL of a sample of requests (see apps.core.query_profiler).
+    
+    Enabled by QUERY_PROFILER_ENABLED; QUERY_PROFILER_SAMPLE_RATE is the
+    share of requests profiled. In DEBUG, profiled responses carry
+    X-DB-Queries and Server-Timing headers.
+    """
+    
+    def process_request(self, request):
+        from .query_profiler import profile_queries
+        
+        if not settings.QUERY_PROFILER_ENABLED or random.random() >= settings.QUERY_PROFILER_SAMPLE_RATE:
+            return None
+        request._query_profiler = profile_queries()
+        request._query_profile = request._query_profiler.__enter__()
+        return None
+    
+    def process_response(self, request, response):
+        from .query_profiler import store_profile, view_name
+        
+        profiler = getattr(request, '_query_profiler', None)
+        if profiler is None:
+            return response
+        profiler.__exit__(None, None, None)
+        del request._query_profiler
+        
+        profile = request._query_profile
+        view = view_name(request)
+        report = profile.report()
+        store_profile(view, report)
+        if profile.flagged:
+            logger.warning(
+                f"{view}: {profile.count} queries in {report['db_ms']}ms, "
+                f"{len(report['repeated'])} repeated shapes, {len(report['slow'])} slow"
+            )
+        
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(profile.count)
+            response['Server-Timing'] = f'db;dur={report["db_ms"]};desc="{profile.count} queries"'
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text="Tenant id, or 'platform' for platform-wide series", max_length=50)),
+                ('series', models.CharField(max_length=50)),
+                ('period', models.CharField(blank=True, help_text='e.g. the year for series that reset yearly', max_length=10)),
+                ('next_value', models.BigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'number_sequences',
+                'unique_together': {('scope', 'series', 'period')},
+            },
+        ),
+    ]
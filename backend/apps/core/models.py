@@ -42,5 +42,23 @@ class BaseModel(TimeStampedModel, SoftDeleteModel):
         abstract = True
 
 
-
+class NumberSequence(models.Model):
+    """
+    Counter behind a document number series (invoices, receipts, applications).
+    
+    Rows are advanced by apps.core.sequences, normally a block at a time.
+    """
+    
+    scope = models.CharField(max_length=50, help_text="Tenant id, or 'platform' for platform-wide series")
+    series = models.CharField(max_length=50)
+    period = models.CharField(max_length=10, blank=True, help_text="e.g. the year for series that reset yearly")
+    next_value = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'number_sequences'
+        unique_together = ['scope', 'series', 'period']
+    
+    def __str__(self):
+        return f"{self.series} [{self.scope}/{self.period or '-'}] next={self.next_value}"
 
@@ -0,0 +1,139 @@
+"""
+SQL query profiling and N+1 detection.
+
+``profile_queries()`` installs an execute wrapper on every database
+connection and records each statement's normalized shape (literals and
+``IN`` lists collapsed) and duration. A shape executed many times within one
+request is the signature of an N+1 loop. QueryProfilerMiddleware profiles a
+sample of requests, keeps recent reports per view in Redis for the
+superadmin query-profiles endpoint and, in DEBUG, adds ``X-DB-Queries`` and
+``Server-Timing`` headers. See apps.core.testing for query budgets.
+"""
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+import redis
+from django.conf import settings
+from django.db import connections
+
+from .rate_limit import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'queryprofile'
+VIEWS_KEY = f'{KEY_PREFIX}:views'
+SAMPLES_PER_VIEW = 20
+SAMPLE_TTL = 24 * 60 * 60
+MAX_SLOW_QUERIES = 10
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))+', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Shape of a statement: literals replaced, IN and VALUES lists collapsed."""
+    shape = _STRING_RE.sub('?', sql)
+    shape = _NUMBER_RE.sub('?', shape)
+    shape = _IN_LIST_RE.sub('IN (...)', shape)
+    shape = _VALUES_RE.sub(r'VALUES \1, ...', shape)
+    return _SPACE_RE.sub(' ', shape).strip()
+
+
+class QueryProfile:
+    """Execute wrapper accumulating per-shape counts and timings."""
+
+    def __init__(self, slow_ms=None, repeat_threshold=None):
+        self.slow_ms = settings.QUERY_PROFILER_SLOW_MS if slow_ms is None else slow_ms
+        self.repeat_threshold = (
+            settings.QUERY_PROFILER_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        )
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = defaultdict(lambda: [0, 0.0])
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.total_ms += elapsed
+            shape = self.shapes[normalize_sql(sql)]
+            shape[0] += 1
+            shape[1] += elapsed
+            if elapsed >= self.slow_ms and len(self.slow) < MAX_SLOW_QUERIES:
+                self.slow.append({'sql': sql[:1000], 'ms': round(elapsed, 1)})
+
+    @property
+    def repeated(self):
+        """Shapes executed at least ``repeat_threshold`` times, most frequent first."""
+        rows = [
+            {'sql': shape, 'count': count, 'ms': round(total, 1)}
+            for shape, (count, total) in self.shapes.items()
+            if count >= self.repeat_threshold
+        ]
+        return sorted(rows, key=lambda row: row['count'], reverse=True)
+
+    @property
+    def flagged(self):
+        return bool(self.slow or self.repeated)
+
+    def report(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 1),
+            'distinct': len(self.shapes),
+            'repeated': self.repeated,
+            'slow': self.slow,
+        }
+
+
+@contextmanager
+def profile_queries(slow_ms=None, repeat_threshold=None):
+    """Profile every query run on this thread's connections inside the block."""
+    profile = QueryProfile(slow_ms, repeat_threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        yield profile
+
+
+def store_profile(view, report, recorded_at=None):
+    """Keep the report among the view's recent samples (best effort)."""
+    sample = {**report, 'view': view, 'recorded_at': int(recorded_at or time.time())}
+    key = f'{KEY_PREFIX}:v:{view}'
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.lpush(key, json.dumps(sample))
+        pipe.ltrim(key, 0, SAMPLES_PER_VIEW - 1)
+        pipe.expire(key, SAMPLE_TTL)
+        pipe.zadd(VIEWS_KEY, {view: report['queries']}, gt=True)
+        pipe.expire(VIEWS_KEY, SAMPLE_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Query profile store failed: {e}")
+
+
+def profiled_views(limit=50):
+    """``[(view, max_queries), ...]`` with the heaviest views first."""
+    rows = get_redis().zrevrange(VIEWS_KEY, 0, limit - 1, withscores=True)
+    return [(view.decode(), int(score)) for view, score in rows]
+
+
+def view_profiles(view):
+    """Recent samples for ``view``, newest first."""
+    return [json.loads(item) for item in get_redis().lrange(f'{KEY_PREFIX}:v:{view}', 0, -1)]
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} /{match.route}" if match else 'unmatched'
@@ -0,0 +1,115 @@
+"""
+Redis-backed token buckets shared by all web and worker processes.
+
+Refill and take happen in a single Lua script, so concurrent callers never
+over-draw a bucket and each call costs one round trip.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_scripts = {}
+
+# KEYS[1] bucket hash; ARGV: rate/sec, capacity, requested, now (seconds)
+# Returns the number of tokens granted (0..requested).
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return granted
+"""
+
+REFUND_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or capacity)
+redis.call('HSET', KEYS[1], 'tokens', math.min(capacity, tokens + tonumber(ARGV[2])))
+return 1
+"""
+
+
+def get_redis():
+    """Shared Redis client for counters and rate limits."""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def _script(source):
+    if source not in _scripts:
+        _scripts[source] = get_redis().register_script(source)
+    return _scripts[source]
+
+
+class TokenBucket:
+    """
+    Token bucket refilling at ``rate`` tokens/second up to ``capacity``.
+
+    ``take(n)`` grants up to ``n`` tokens at once, so batch senders can ask
+    for a whole batch and send only what was granted. If Redis is
+    unreachable the bucket fails open and grants everything requested.
+    """
+
+    def __init__(self, key, rate, capacity=None):
+        self.key = f"ratelimit:{key}"
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+
+    def take(self, requested=1):
+        if requested <= 0:
+            return 0
+        try:
+            return int(_script(TAKE_SCRIPT)(keys=[self.key], args=[self.rate, self.capacity, requested, time.time()]))
+        except redis.RedisError as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return requested
+
+    def refund(self, tokens):
+        """Return unused tokens, e.g. when a second limiter granted fewer."""
+        if tokens <= 0:
+            return
+        try:
+            _script(REFUND_SCRIPT)(keys=[self.key], args=[self.capacity, tokens])
+        except redis.RedisError as e:
+            logger.warning(f"Rate limiter refund failed: {e}")
+
+
+def take_all(buckets, requested):
+    """
+    Take the same number of tokens from several buckets.
+
+    Grants the minimum any bucket allowed and refunds the excess to the
+    others, so e.g. a tenant limit and a provider limit are both honoured.
+    """
+    granted = []
+    allowed = requested
+    for bucket in buckets:
+        got = bucket.take(allowed)
+        granted.append((bucket, got))
+        allowed = min(allowed, got)
+        if allowed == 0:
+            break
+    for bucket, got in granted:
+        bucket.refund(got - allowed)
+    return allowed
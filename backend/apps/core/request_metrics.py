@@ -0,0 +1,249 @@
+"""
+Request latency and throughput metrics.
+
+Each process records requests into in-memory log-bucketed histograms
+(DDSketch style: bucket boundaries grow geometrically, so any quantile is
+accurate to within ``RELATIVE_ACCURACY`` and histograms merge by adding
+bucket counts). Every ``FLUSH_INTERVAL_SECONDS`` a background thread adds
+the process's counts into per-minute Redis hashes with HINCRBY, so all
+processes' data merge server-side and reading a window is a few HGETALLs.
+Whatever is left is flushed at interpreter exit.
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+import redis
+
+from .rate_limit import get_redis
+
+logger = logging.getLogger(__name__)
+
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_LATENCY_MS = 0.1
+
+FLUSH_INTERVAL_SECONDS = 5
+MINUTE_KEY_TTL = 2 * 60 * 60
+HOUR_KEY_TTL = 26 * 60 * 60
+USERS_KEY_TTL = 60 * 60
+
+KEY_PREFIX = 'reqmetrics'
+TOTAL = '*'
+
+
+def bucket_index(value_ms):
+    return math.ceil(math.log(max(value_ms, MIN_LATENCY_MS)) / LOG_GAMMA)
+
+
+def bucket_value(index):
+    """Representative latency of a bucket (within RELATIVE_ACCURACY)."""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+
+class Histogram:
+    """Mergeable latency histogram with request and error counts."""
+
+    __slots__ = ('count', 'errors', 'total_ms', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.buckets = defaultdict(int)
+
+    def add(self, latency_ms, error=False):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += latency_ms
+        self.buckets[bucket_index(latency_ms)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.total_ms += other.total_ms
+        for index, count in other.buckets.items():
+            self.buckets[index] += count
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return bucket_value(index)
+        return bucket_value(max(self.buckets))
+
+    def summary(self):
+        return {
+            'requests': self.count,
+            'errors': self.errors,
+            'error_rate': round(self.errors * 100 / self.count, 2) if self.count else 0.0,
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.50), 1),
+            'p95_ms': round(self.quantile(0.95), 1),
+            'p99_ms': round(self.quantile(0.99), 1),
+        }
+
+
+class RequestMetricsCollector:
+    """
+    Per-process buffer of request histograms, flushed to Redis by a daemon
+    thread every ``FLUSH_INTERVAL_SECONDS``, so an idle process still
+    publishes its last requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(Histogram)
+        self._users = set()
+        self._last_flush = time.monotonic()
+        self._pid = None
+
+    def record(self, view, latency_ms, status_code, user_id=None):
+        error = status_code >= 500
+        with self._lock:
+            if os.getpid() != self._pid:
+                # First request, or a forked worker: drop the parent's unflushed
+                # data and start this process's flusher (threads do not survive fork)
+                self._histograms.clear()
+                self._users.clear()
+                self._pid = os.getpid()
+                threading.Thread(target=self._flush_loop, name='request-metrics-flush', daemon=True).start()
+            self._histograms[view].add(latency_ms, error)
+            if user_id:
+                self._users.add(user_id)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(FLUSH_INTERVAL_SECONDS)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Request metrics flush failed: {e}")
+
+    def flush(self):
+        with self._lock:
+            histograms, self._histograms = self._histograms, defaultdict(Histogram)
+            users, self._users = self._users, set()
+            self._last_flush = time.monotonic()
+        if not histograms:
+            return
+
+        now = int(time.time())
+        minute_key = f"{KEY_PREFIX}:m:{now // 60 * 60}"
+        hour_key = f"{KEY_PREFIX}:h:{now // 3600 * 3600}"
+        users_key = f"{KEY_PREFIX}:u:{now // 60 * 60}"
+        total = Histogram()
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for view, histogram in histograms.items():
+                total.merge(histogram)
+                _write_histogram(pipe, minute_key, view, histogram)
+            _write_histogram(pipe, minute_key, TOTAL, total)
+            pipe.expire(minute_key, MINUTE_KEY_TTL)
+            pipe.hincrby(hour_key, 'requests', total.count)
+            pipe.hincrby(hour_key, 'errors', total.errors)
+            pipe.expire(hour_key, HOUR_KEY_TTL)
+            if users:
+                pipe.pfadd(users_key, *users)
+                pipe.expire(users_key, USERS_KEY_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Request metrics flush failed: {e}")
+
+
+def _write_histogram(pipe, key, view, histogram):
+    pipe.hincrby(key, f"{view}|count", histogram.count)
+    pipe.hincrby(key, f"{view}|errors", histogram.errors)
+    pipe.hincrbyfloat(key, f"{view}|sum", histogram.total_ms)
+    for index, count in histogram.buckets.items():
+        pipe.hincrby(key, f"{view}|b{index}", count)
+
+
+collector = RequestMetricsCollector()
+atexit.register(collector.flush)
+
+
+def read_histograms(minutes=5, now=None):
+    """Merged per-view histograms for the last ``minutes`` (``'*'`` is the total)."""
+    now = int(now or time.time())
+    current = now // 60 * 60
+    pipe = get_redis().pipeline(transaction=False)
+    for offset in range(minutes):
+        pipe.hgetall(f"{KEY_PREFIX}:m:{current - offset * 60}")
+
+    histograms = defaultdict(Histogram)
+    for fields in pipe.execute():
+        for field, value in fields.items():
+            view, _, metric = field.decode().rpartition('|')
+            histogram = histograms[view]
+            if metric == 'count':
+                histogram.count += int(value)
+            elif metric == 'errors':
+                histogram.errors += int(value)
+            elif metric == 'sum':
+                histogram.total_ms += float(value)
+            else:
+                histogram.buckets[int(metric[1:])] += int(value)
+    return histograms
+
+
+def read_request_totals(hours=24, now=None):
+    """``(requests, errors)`` over the last ``hours``."""
+    now = int(now or time.time())
+    current = now // 3600 * 3600
+    pipe = get_redis().pipeline(transaction=False)
+    for offset in range(hours):
+        pipe.hmget(f"{KEY_PREFIX}:h:{current - offset * 3600}", 'requests', 'errors')
+    requests = errors = 0
+    for request_count, error_count in pipe.execute():
+        requests += int(request_count or 0)
+        errors += int(error_count or 0)
+    return requests, errors
+
+
+def read_active_users(minutes=15, now=None):
+    """Distinct authenticated users seen in the last ``minutes`` (HyperLogLog estimate)."""
+    now = int(now or time.time())
+    current = now // 60 * 60
+    keys = [f"{KEY_PREFIX}:u:{current - offset * 60}" for offset in range(minutes)]
+    return get_redis().pfcount(*keys)
+
+
+def record_task_failure():
+    """Count a failed Celery task (connected to ``task_failure`` in educore.celery)."""
+    key = f"{KEY_PREFIX}:jobs-failed:{int(time.time()) // 3600 * 3600}"
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, HOUR_KEY_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Task failure counter unavailable: {e}")
+
+
+def read_task_failures(hours=24, now=None):
+    now = int(now or time.time())
+    current = now // 3600 * 3600
+    values = get_redis().mget([f"{KEY_PREFIX}:jobs-failed:{current - offset * 3600}" for offset in range(hours)])
+    return sum(int(value or 0) for value in values)
+
+
+def endpoint_breakdown(histograms, limit=20):
+    """Busiest endpoints with latency quantiles and error rates."""
+    rows = [
+        {'view': view, **histogram.summary()}
+        for view, histogram in histograms.items()
+        if view != TOTAL
+    ]
+    rows.sort(key=lambda row: row['requests'], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,169 @@
+"""
+Document number allocation (invoice, receipt and application numbers).
+
+Each series is a NumberSequence row per scope (tenant) and period (year).
+Numbers are handed out hi/lo style: a process reserves a block of values in
+one UPDATE and serves numbers from memory until the block runs out, so the
+sequence row is touched once per block rather than once per document.
+
+Block series never hand out the same number twice but may leave gaps when
+a process exits with part of a block unused. Series configured with
+``gap_free`` instead advance the row inside the caller's transaction, so a
+rolled-back document returns its number; this serialises writers of that
+series per tenant and should be kept for documents that legally require it.
+
+Series formats and block sizes can be overridden with the
+``NUMBER_SEQUENCES`` setting.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, InterfaceError, OperationalError
+from django.utils import timezone
+
+DEFAULT_SERIES = {
+    'fee_invoice': {
+        'format': 'INV-{tenant}-{year}-{number:06d}',
+        'period': 'year',
+        'block_size': 50,
+    },
+    'payment': {
+        'format': 'RCT-{tenant}-{year}-{number:06d}',
+        'period': 'year',
+        'block_size': 100,
+    },
+    'admission': {
+        'format': 'APP-{tenant}-{year}-{number:04d}',
+        'period': 'year',
+        'block_size': 10,
+    },
+    'subscription_invoice': {
+        'format': 'SUB-{year}-{number:06d}',
+        'period': 'year',
+        'block_size': 20,
+    },
+}
+
+PLATFORM_SCOPE = 'platform'
+
+# Reserves `size` values and returns the first, creating the row on first use
+RESERVE_SQL = """
+    INSERT INTO number_sequences (scope, series, period, next_value, updated_at)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON CONFLICT (scope, series, period)
+    DO UPDATE SET next_value = number_sequences.next_value + %s, updated_at = NOW()
+    RETURNING next_value - %s
+"""
+
+
+def get_series_config(series):
+    config = dict(DEFAULT_SERIES.get(series, {}))
+    config.update(getattr(settings, 'NUMBER_SEQUENCES', {}).get(series, {}))
+    if 'format' not in config:
+        raise KeyError(f'Unknown number series: {series}')
+    config.setdefault('period', '')
+    config.setdefault('block_size', 1)
+    config.setdefault('gap_free', False)
+    return config
+
+
+class SequenceAllocator:
+    """Per-process allocator holding one reserved block per series key."""
+
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def reserve(self, series, count=1, tenant=None, when=None):
+        """Return ``count`` formatted numbers for ``series``, in ascending order."""
+        if count < 1:
+            return []
+
+        config = get_series_config(series)
+        when = when or timezone.localdate()
+        scope = str(getattr(tenant, 'pk', tenant)) if tenant is not None else PLATFORM_SCOPE
+        period = str(when.year) if config['period'] == 'year' else ''
+        key = (scope, series, period)
+
+        if config['gap_free']:
+            # Inside the caller's transaction: a rollback gives the numbers back
+            start = self._reserve_block(connection, key, count)
+            values = range(start, start + count)
+        else:
+            values = self._take(key, count, config['block_size'])
+
+        return [
+            config['format'].format(number=value, tenant=scope, year=when.year, period=period)
+            for value in values
+        ]
+
+    def _take(self, key, count, block_size):
+        with self._lock:
+            current, limit = self._blocks.get(key, (0, 0))
+            taken = min(limit - current, count)
+            values = list(range(current, current + taken))
+            current += taken
+
+            shortfall = count - taken
+            if shortfall:
+                # One round trip covers the request and refills the block
+                size = shortfall + block_size
+                start = self._reserve_outside_transaction(key, size)
+                values.extend(range(start, start + shortfall))
+                current, limit = start + shortfall, start + size
+
+            self._blocks[key] = (current, limit)
+        return values
+
+    def _reserve_outside_transaction(self, key, size):
+        """
+        Reserve a block without joining the caller's transaction.
+
+        Inside an atomic block the row lock would otherwise be held until
+        the caller commits, serialising every writer of the series; a
+        separate autocommit connection releases it immediately.
+        """
+        if not connection.in_atomic_block:
+            return self._reserve_block(connection, key, size)
+
+        try:
+            return self._reserve_block(self._side_connection(), key, size)
+        except (InterfaceError, OperationalError):
+            self._close_side_connection()
+            return self._reserve_block(self._side_connection(), key, size)
+
+    @staticmethod
+    def _reserve_block(conn, key, size):
+        scope, series, period = key
+        with conn.cursor() as cursor:
+            cursor.execute(RESERVE_SQL, [scope, series, period, 1 + size, size, size])
+            return cursor.fetchone()[0]
+
+    def _side_connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = connections.create_connection(DEFAULT_DB_ALIAS)
+            self._local.connection = conn
+        return conn
+
+    def _close_side_connection(self):
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            try:
+                conn.close()
+            finally:
+                self._local.connection = None
+
+
+allocator = SequenceAllocator()
+
+
+def next_number(series, tenant=None, when=None):
+    """Allocate a single number, e.g. ``next_number('fee_invoice', tenant=tenant)``."""
+    return allocator.reserve(series, 1, tenant=tenant, when=when)[0]
+
+
+def reserve_numbers(series, count, tenant=None, when=None):
+    """Allocate ``count`` numbers with at most one database round trip."""
+    return allocator.reserve(series, count, tenant=tenant, when=when)
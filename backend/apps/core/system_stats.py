@@ -0,0 +1,80 @@
+"""
+Host resource readings from /proc (Linux).
+
+CPU usage is measured between consecutive calls: the previous /proc/stat
+sample is kept in Redis, so a periodic task reports the average over its
+interval rather than an instantaneous spike.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+
+import redis
+from django.conf import settings
+
+from .rate_limit import get_redis
+
+logger = logging.getLogger(__name__)
+
+CPU_SAMPLE_KEY = 'systemstats:cpu'
+
+
+def _read_cpu_times():
+    with open('/proc/stat') as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    return sum(fields), idle
+
+
+def cpu_usage(sample_key=CPU_SAMPLE_KEY):
+    """
+    CPU busy percentage since the previous call with the same
+    ``sample_key`` (or over a short sample).
+    """
+    try:
+        total, idle = _read_cpu_times()
+    except OSError:
+        return 0.0
+
+    previous = None
+    try:
+        client = get_redis()
+        raw = client.getset(sample_key, json.dumps([total, idle]))
+        previous = json.loads(raw) if raw else None
+    except redis.RedisError as e:
+        logger.warning(f"CPU sample store unavailable: {e}")
+
+    if not previous or previous[0] >= total:
+        time.sleep(0.25)
+        previous = (total, idle)
+        total, idle = _read_cpu_times()
+
+    total_delta = total - previous[0]
+    idle_delta = idle - previous[1]
+    if total_delta <= 0:
+        return 0.0
+    return round((1 - idle_delta / total_delta) * 100, 1)
+
+
+def memory_usage():
+    """Memory in use as a percentage of MemTotal (MemAvailable-based)."""
+    try:
+        meminfo = {}
+        with open('/proc/meminfo') as f:
+            for line in f:
+                name, value = line.split(':', 1)
+                meminfo[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        return 0.0
+    total = meminfo.get('MemTotal', 0)
+    available = meminfo.get('MemAvailable', meminfo.get('MemFree', 0))
+    return round((total - available) * 100 / total, 1) if total else 0.0
+
+
+def storage_usage():
+    """``(used_gb, total_gb)`` of the volume holding MEDIA_ROOT."""
+    path = settings.MEDIA_ROOT if os.path.exists(settings.MEDIA_ROOT) else settings.BASE_DIR
+    usage = shutil.disk_usage(path)
+    return round(usage.used / 1024 ** 3, 2), round(usage.total / 1024 ** 3, 2)
@@ -0,0 +1,47 @@
+"""
+Test helpers for query budgets.
+
+    with query_budget(5):
+        client.get('/api/students/')
+
+    assert_endpoint_budget(client, '/api/students/', max_queries=5)
+
+A block fails when it runs more queries than its budget or repeats one
+query shape ``repeat_threshold`` times (an N+1 loop); the failure message
+lists the offending shapes.
+"""
+from contextlib import contextmanager
+
+from .query_profiler import profile_queries
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block exceeds its query budget."""
+
+
+def _describe(profile):
+    lines = [f"{profile.count} queries in {profile.total_ms:.1f}ms"]
+    for row in profile.repeated:
+        lines.append(f"  {row['count']}x {row['sql']}")
+    for row in profile.slow:
+        lines.append(f"  slow ({row['ms']}ms) {row['sql']}")
+    return '\n'.join(lines)
+
+
+@contextmanager
+def query_budget(max_queries, repeat_threshold=None, allow_repeats=False):
+    """Fail if the block runs more than ``max_queries`` or an N+1 pattern."""
+    with profile_queries(repeat_threshold=repeat_threshold) as profile:
+        yield profile
+    if profile.count > max_queries:
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} exceeded: {_describe(profile)}")
+    if profile.repeated and not allow_repeats:
+        raise QueryBudgetExceeded(f"Repeated queries (N+1): {_describe(profile)}")
+
+
+def assert_endpoint_budget(client, url, max_queries, method='get', **kwargs):
+    """Request ``url`` with the test ``client`` under a query budget; returns the response."""
+    with query_budget(max_queries, repeat_threshold=kwargs.pop('repeat_threshold', None),
+                      allow_repeats=kwargs.pop('allow_repeats', False)):
+        response = getattr(client, method)(url, **kwargs)
+    return response
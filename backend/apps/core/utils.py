@@ -5,6 +5,26 @@ import csv
 import openpyxl
 from io import StringIO, BytesIO
 from typing import List, Dict
+from django.conf import settings
+
+
+def get_client_ip(request):
+    """
+    Client IP address of a request.
+    
+    REMOTE_ADDR, unless TRUSTED_PROXY_COUNT proxies sit in front of the app:
+    each appends the address it received from to X-Forwarded-For, so the
+    client is that many entries from the right. Anything further left is
+    client-supplied and never trusted.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if proxies <= 0:
+        return remote_addr
+    forwarded = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    if len(forwarded) < proxies:
+        return remote_addr
+    return forwarded[-proxies]
 
 
 def generate_csv(data: List[Dict], headers: List[str]) -> str:
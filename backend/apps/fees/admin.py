@@ -2,7 +2,7 @@
 Admin configuration for Fees app.
 """
 from django.contrib import admin
-from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan
+from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan, FeeAgingSnapshot, StatementImport, PaymentWebhookEvent
 
 
 @admin.register(FeeStructure)
@@ -32,5 +32,21 @@ class PaymentPlanAdmin(admin.ModelAdmin):
     list_filter = ['frequency', 'is_active']
 
 
+@admin.register(FeeAgingSnapshot)
+class FeeAgingSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['tenant', 'snapshot_date', 'outstanding_30_days', 'outstanding_60_days', 'outstanding_90_days', 'total_outstanding']
+    list_filter = ['tenant', 'snapshot_date']
 
 
+@admin.register(StatementImport)
+class StatementImportAdmin(admin.ModelAdmin):
+    list_display = ['file_name', 'tenant', 'source', 'status', 'total_lines', 'matched_lines', 'exception_lines', 'created_at']
+    list_filter = ['source', 'status', 'tenant']
+    readonly_fields = ['match_summary', 'exceptions']
+
+
+@admin.register(PaymentWebhookEvent)
+class PaymentWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'provider_transaction_id', 'provider_status', 'reference', 'amount', 'status', 'received_at']
+    list_filter = ['provider', 'status', 'is_success']
+    search_fields = ['provider_transaction_id', 'reference']
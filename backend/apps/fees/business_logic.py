@@ -0,0 +1,165 @@
+"""
+Business logic for fee invoices and payments.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q, F, Sum, Count
+from django.utils import timezone
+from .models import FeeInvoice, FeeAgingSnapshot
+
+OPEN_STATUSES = ['pending', 'partial', 'overdue']
+
+
+def recompute_invoice_statuses(today=None):
+    """
+    Recompute balance and status for every invoice across all tenants.
+
+    Mirrors the rules in FeeInvoice.save() with one set-based UPDATE per
+    transition, each touching only rows whose value actually changes.
+    Cancelled invoices are left alone.
+    """
+    today = today or timezone.localdate()
+    invoices = FeeInvoice.objects.filter(is_deleted=False).exclude(status='cancelled')
+    expected_balance = F('total_amount') - F('paid_amount') - F('discount_amount')
+
+    with transaction.atomic():
+        balances = invoices.exclude(balance=expected_balance).update(balance=expected_balance)
+
+        paid = invoices.filter(balance__lte=0).exclude(status='paid').update(status='paid')
+
+        partial = invoices.filter(
+            balance__gt=0, paid_amount__gt=0
+        ).exclude(status='partial').update(status='partial')
+
+        overdue = invoices.filter(
+            balance__gt=0, paid_amount__lte=0, due_date__lt=today
+        ).exclude(status='overdue').update(status='overdue')
+
+        pending = invoices.filter(
+            balance__gt=0, paid_amount__lte=0, due_date__gte=today
+        ).exclude(status='pending').update(status='pending')
+
+    return {
+        'balances_corrected': balances,
+        'paid': paid,
+        'partial': partial,
+        'overdue': overdue,
+        'pending': pending,
+    }
+
+
+def refresh_fee_aging_snapshots(today=None):
+    """
+    Build today's outstanding-fee aging snapshot for every tenant.
+
+    A single grouped aggregate produces all buckets for all tenants; the
+    results are upserted so the task can be re-run safely on the same day.
+    Active tenants without open invoices get a zero row, so their latest
+    snapshot never shows buckets that have since been paid off.
+    """
+    from apps.tenants.models import Tenant
+
+    today = today or timezone.localdate()
+    days_30 = today - timedelta(days=30)
+    days_60 = today - timedelta(days=60)
+
+    rows = FeeInvoice.objects.filter(
+        is_deleted=False,
+        status__in=OPEN_STATUSES,
+    ).values('tenant_id').annotate(
+        outstanding_current=Sum('balance', filter=Q(due_date__gte=today)),
+        outstanding_30_days=Sum('balance', filter=Q(due_date__gte=days_30, due_date__lt=today)),
+        outstanding_60_days=Sum('balance', filter=Q(due_date__gte=days_60, due_date__lt=days_30)),
+        outstanding_90_days=Sum('balance', filter=Q(due_date__lt=days_60)),
+        total_outstanding=Sum('balance'),
+        open_invoices=Count('id'),
+        overdue_invoices=Count('id', filter=Q(due_date__lt=today)),
+    ).order_by()
+
+    zero = Decimal('0.00')
+    snapshots = [
+        FeeAgingSnapshot(
+            tenant_id=row['tenant_id'],
+            snapshot_date=today,
+            outstanding_current=row['outstanding_current'] or zero,
+            outstanding_30_days=row['outstanding_30_days'] or zero,
+            outstanding_60_days=row['outstanding_60_days'] or zero,
+            outstanding_90_days=row['outstanding_90_days'] or zero,
+            total_outstanding=row['total_outstanding'] or zero,
+            open_invoices=row['open_invoices'],
+            overdue_invoices=row['overdue_invoices'],
+            calculated_at=timezone.now(),
+        )
+        for row in rows
+    ]
+    covered = {snapshot.tenant_id for snapshot in snapshots}
+    snapshots += [
+        FeeAgingSnapshot(
+            tenant_id=tenant_id,
+            snapshot_date=today,
+            outstanding_current=zero,
+            outstanding_30_days=zero,
+            outstanding_60_days=zero,
+            outstanding_90_days=zero,
+            total_outstanding=zero,
+            open_invoices=0,
+            overdue_invoices=0,
+            calculated_at=timezone.now(),
+        )
+        for tenant_id in Tenant.objects.filter(is_active=True, is_deleted=False).values_list('id', flat=True)
+        if tenant_id not in covered
+    ]
+
+    FeeAgingSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['tenant', 'snapshot_date'],
+        update_fields=[
+            'outstanding_current', 'outstanding_30_days', 'outstanding_60_days',
+            'outstanding_90_days', 'total_outstanding', 'open_invoices',
+            'overdue_invoices', 'calculated_at',
+        ],
+    )
+
+    return len(snapshots)
+
+
+def apply_invoice_payments(invoice_totals, today=None):
+    """
+    Add completed payment totals to invoices in bulk.
+
+    ``invoice_totals`` maps invoice id to the amount being posted. Rows are
+    locked, then balance and status follow the rules in FeeInvoice.save().
+    Must be called inside a transaction.
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    invoices = list(FeeInvoice.objects.select_for_update().filter(id__in=invoice_totals.keys()))
+
+    for invoice in invoices:
+        invoice.paid_amount += invoice_totals[invoice.id]
+        invoice.balance = invoice.total_amount - invoice.paid_amount - invoice.discount_amount
+        if invoice.balance <= 0:
+            invoice.status = 'paid'
+        elif invoice.paid_amount > 0:
+            invoice.status = 'partial'
+        elif invoice.due_date < today:
+            invoice.status = 'overdue'
+        else:
+            invoice.status = 'pending'
+        invoice.updated_at = now
+
+    FeeInvoice.objects.bulk_update(
+        invoices, ['paid_amount', 'balance', 'status', 'updated_at'], batch_size=1000
+    )
+    return invoices
+
+
+def get_latest_aging_snapshot(tenant, max_age_days=1):
+    """Return the tenant's most recent aging snapshot if it is fresh enough."""
+    cutoff = timezone.localdate() - timedelta(days=max_age_days)
+    return FeeAgingSnapshot.objects.filter(
+        tenant=tenant,
+        snapshot_date__gte=cutoff,
+    ).order_by('-snapshot_date').first()
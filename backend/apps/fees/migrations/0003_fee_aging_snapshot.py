@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:07
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_add_current_academic_year'),
+        ('fees', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeAgingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('outstanding_current', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Not yet due', max_digits=12)),
+                ('outstanding_30_days', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='1-30 days overdue', max_digits=12)),
+                ('outstanding_60_days', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='31-60 days overdue', max_digits=12)),
+                ('outstanding_90_days', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Over 60 days overdue', max_digits=12)),
+                ('total_outstanding', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('open_invoices', models.IntegerField(default=0)),
+                ('overdue_invoices', models.IntegerField(default=0)),
+                ('calculated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'fee_aging_snapshots',
+                'ordering': ['-snapshot_date'],
+                'get_latest_by': 'snapshot_date',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeinvoice',
+            index=models.Index(fields=['status', 'due_date'], name='fee_invoice_status_eeb8eb_idx'),
+        ),
+        migrations.AddField(
+            model_name='feeagingsnapshot',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_aging_snapshots', to='tenants.tenant'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feeagingsnapshot',
+            unique_together={('tenant', 'snapshot_date')},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:11
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tenants', '0002_add_current_academic_year'),
+        ('fees', '0003_fee_aging_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('file_name', models.CharField(max_length=255)),
+                ('source', models.CharField(choices=[('bank', 'Bank Statement'), ('ecocash', 'EcoCash'), ('onemoney', 'OneMoney'), ('other', 'Other')], default='bank', max_length=20)),
+                ('status', models.CharField(choices=[('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='processing', max_length=20)),
+                ('dry_run', models.BooleanField(default=False, help_text='Match only, do not post payments')),
+                ('total_lines', models.IntegerField(default=0)),
+                ('matched_lines', models.IntegerField(default=0)),
+                ('exception_lines', models.IntegerField(default=0)),
+                ('matched_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('match_summary', models.JSONField(blank=True, default=dict, help_text='Matched line counts by match method')),
+                ('exceptions', models.JSONField(blank=True, default=list, help_text='Unmatched, duplicate or invalid lines')),
+                ('error_message', models.TextField(blank=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('imported_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_imports', to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_imports', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'fee_statement_imports',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
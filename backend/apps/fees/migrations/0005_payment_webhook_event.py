@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_add_current_academic_year'),
+        ('fees', '0004_statement_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('paynow', 'Paynow'), ('ecocash', 'EcoCash'), ('fake', 'Fake Gateway')], max_length=20)),
+                ('provider_transaction_id', models.CharField(max_length=100)),
+                ('provider_status', models.CharField(blank=True, help_text='Status as reported by the gateway', max_length=50)),
+                ('is_success', models.BooleanField(default=False, help_text='Gateway reports the payment as paid')),
+                ('reference', models.CharField(blank=True, help_text='Merchant reference (invoice number)', max_length=100)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('received', 'Received'), ('applied', 'Applied'), ('duplicate', 'Duplicate'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='received', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='webhook_events', to='fees.feeinvoice')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='webhook_events', to='fees.payment')),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_webhook_events', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'payment_webhook_events',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'id'], name='payment_web_status_7d769a_idx')],
+                'unique_together': {('provider', 'provider_transaction_id', 'provider_status')},
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ Fee models: Fee Structures, Invoices, Payments.
 """
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 from apps.core.models import BaseModel
 
@@ -92,13 +93,18 @@ class FeeInvoice(BaseModel):
         indexes = [
             models.Index(fields=['student', 'status']),
             models.Index(fields=['tenant', 'status']),
+            models.Index(fields=['status', 'due_date']),
         ]
     
     def __str__(self):
         return f"{self.invoice_number} - {self.student.user.full_name}"
     
     def save(self, *args, **kwargs):
-        """Calculate balance on save."""
+        """Assign an invoice number and calculate balance on save."""
+        if not self.invoice_number:
+            from apps.core.sequences import next_number
+            self.invoice_number = next_number('fee_invoice', tenant=self.tenant_id, when=self.issue_date)
+        
         self.balance = self.total_amount - self.paid_amount - self.discount_amount
         
         # Update status
@@ -106,7 +112,7 @@ class FeeInvoice(BaseModel):
             self.status = 'paid'
         elif self.paid_amount > 0:
             self.status = 'partial'
-        elif self.due_date and self.due_date < models.functions.Now():
+        elif self.due_date and self.due_date < timezone.localdate():
             self.status = 'overdue'
         else:
             self.status = 'pending'
@@ -173,7 +179,11 @@ class Payment(BaseModel):
         return f"{self.payment_number} - {self.amount}"
     
     def save(self, *args, **kwargs):
-        """Update invoice paid amount on save."""
+        """Assign a receipt number and update invoice paid amount on save."""
+        if not self.payment_number:
+            from apps.core.sequences import next_number
+            self.payment_number = next_number('payment', tenant=self.tenant_id, when=self.payment_date)
+        
         super().save(*args, **kwargs)
         
         # Update invoice paid amount
@@ -210,5 +220,130 @@ class PaymentPlan(BaseModel):
         return f"Payment Plan - {self.invoice.invoice_number}"
 
 
+class FeeAgingSnapshot(models.Model):
+    """Per-tenant outstanding fee aging, recomputed nightly."""
+    
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='fee_aging_snapshots')
+    snapshot_date = models.DateField()
+    
+    # Outstanding balances by age past due date
+    outstanding_current = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="Not yet due")
+    outstanding_30_days = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="1-30 days overdue")
+    outstanding_60_days = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="31-60 days overdue")
+    outstanding_90_days = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), help_text="Over 60 days overdue")
+    total_outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    
+    open_invoices = models.IntegerField(default=0)
+    overdue_invoices = models.IntegerField(default=0)
+    
+    calculated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'fee_aging_snapshots'
+        ordering = ['-snapshot_date']
+        get_latest_by = 'snapshot_date'
+        unique_together = ['tenant', 'snapshot_date']
+    
+    def __str__(self):
+        return f"Fee aging - {self.tenant_id} - {self.snapshot_date}"
 
 
+class StatementImport(BaseModel):
+    """Bank or mobile-money statement imported for automatic payment matching."""
+    
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='statement_imports')
+    file_name = models.CharField(max_length=255)
+    source = models.CharField(
+        max_length=20,
+        choices=[
+            ('bank', 'Bank Statement'),
+            ('ecocash', 'EcoCash'),
+            ('onemoney', 'OneMoney'),
+            ('other', 'Other'),
+        ],
+        default='bank'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('processing', 'Processing'),
+            ('completed', 'Completed'),
+            ('failed', 'Failed'),
+        ],
+        default='processing'
+    )
+    dry_run = models.BooleanField(default=False, help_text="Match only, do not post payments")
+    
+    # Results
+    total_lines = models.IntegerField(default=0)
+    matched_lines = models.IntegerField(default=0)
+    exception_lines = models.IntegerField(default=0)
+    matched_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    match_summary = models.JSONField(default=dict, blank=True, help_text="Matched line counts by match method")
+    exceptions = models.JSONField(default=list, blank=True, help_text="Unmatched, duplicate or invalid lines")
+    error_message = models.TextField(blank=True)
+    
+    imported_by = models.ForeignKey(
+        'users.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='statement_imports'
+    )
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'fee_statement_imports'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.get_source_display()})"
+
+
+class PaymentWebhookEvent(models.Model):
+    """Raw payment gateway callback, persisted on receipt and applied asynchronously."""
+    
+    PROVIDERS = [
+        ('paynow', 'Paynow'),
+        ('ecocash', 'EcoCash'),
+        ('fake', 'Fake Gateway'),
+    ]
+    
+    provider = models.CharField(max_length=20, choices=PROVIDERS)
+    provider_transaction_id = models.CharField(max_length=100)
+    provider_status = models.CharField(max_length=50, blank=True, help_text="Status as reported by the gateway")
+    is_success = models.BooleanField(default=False, help_text="Gateway reports the payment as paid")
+    reference = models.CharField(max_length=100, blank=True, help_text="Merchant reference (invoice number)")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    
+    # Processing
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('received', 'Received'),
+            ('applied', 'Applied'),
+            ('duplicate', 'Duplicate'),
+            ('ignored', 'Ignored'),
+            ('failed', 'Failed'),
+        ],
+        default='received'
+    )
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, null=True, blank=True, related_name='payment_webhook_events')
+    invoice = models.ForeignKey(FeeInvoice, on_delete=models.SET_NULL, null=True, blank=True, related_name='webhook_events')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='webhook_events')
+    error_message = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'payment_webhook_events'
+        ordering = ['-received_at']
+        # Gateway retries of the same notification collapse onto one row
+        unique_together = ['provider', 'provider_transaction_id', 'provider_status']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} {self.provider_transaction_id} ({self.provider_status})"
@@ -2,7 +2,7 @@
 Serializers for Fees app.
 """
 from rest_framework import serializers
-from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan
+from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan, StatementImport
 
 
 class FeeStructureSerializer(serializers.ModelSerializer):
@@ -30,6 +30,7 @@ class FeeInvoiceSerializer(serializers.ModelSerializer):
         model = FeeInvoice
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at', 'balance', 'status')
+        extra_kwargs = {'invoice_number': {'required': False}}
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -43,6 +44,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
+        extra_kwargs = {'payment_number': {'required': False}}
 
 
 class PaymentPlanSerializer(serializers.ModelSerializer):
@@ -56,5 +58,16 @@ class PaymentPlanSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at')
 
 
-
-
+class StatementImportSerializer(serializers.ModelSerializer):
+    """Serializer for StatementImport."""
+    
+    imported_by_name = serializers.CharField(source='imported_by.full_name', read_only=True)
+    
+    class Meta:
+        model = StatementImport
+        fields = '__all__'
+        read_only_fields = (
+            'id', 'created_at', 'updated_at', 'tenant', 'file_name', 'status',
+            'total_lines', 'matched_lines', 'exception_lines', 'matched_amount',
+            'match_summary', 'exceptions', 'error_message', 'imported_by', 'processed_at',
+        )
@@ -0,0 +1,350 @@
+"""
+Bank and mobile-money statement import with automatic payment matching.
+
+A statement is streamed line by line and matched against in-memory indexes
+of the tenant's open invoices and already-recorded transaction references,
+so the whole file is processed with a fixed number of queries regardless of
+its length. Matched lines are posted as completed payments in bulk; anything
+that cannot be matched safely is returned in an exceptions report.
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.sequences import reserve_numbers
+from .models import FeeInvoice, Payment
+from .business_logic import OPEN_STATUSES, apply_invoice_payments
+
+# Header aliases found in EcoCash, OneMoney and common bank exports
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'value date', 'posting date', 'trans date', 'completion time'],
+    'amount': ['amount', 'credit', 'credit amount', 'paid in', 'received', 'deposit'],
+    'reference': ['reference', 'ref', 'transaction id', 'transaction reference', 'receipt no', 'receipt no.', 'txn id'],
+    'narration': ['narration', 'description', 'details', 'particulars', 'memo', 'remarks'],
+    'payer': ['payer', 'sender', 'from', 'account name', 'msisdn', 'customer'],
+}
+
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d', '%d %b %Y', '%d-%b-%Y']
+
+SOURCE_PAYMENT_METHODS = {
+    'bank': 'bank',
+    'ecocash': 'ecocash',
+    'onemoney': 'onemoney',
+    'other': 'other',
+}
+
+TOKEN_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9\-/]*')
+
+
+def _normalize_key(value):
+    """Uppercase and strip everything but letters and digits."""
+    return re.sub(r'[^A-Z0-9]', '', str(value).upper())
+
+
+def _digits(value):
+    """Digits of a value with leading zeros removed."""
+    return re.sub(r'\D', '', str(value)).lstrip('0')
+
+
+def _parse_amount(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    text = str(value).strip()
+    cleaned = re.sub(r'[^0-9.\-]', '', text)
+    try:
+        amount = Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    # Accounting notation for debits, e.g. "(150.00)"
+    return -abs(amount) if text.startswith('(') else amount
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    if not text:
+        return None
+    # Drop a trailing time component, e.g. "2024-03-01 14:22:05"
+    text = text.split(' ')[0] if re.match(r'^\d{4}-\d{2}-\d{2} ', text) else text
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _map_header(header):
+    """Map raw header cells to canonical column names."""
+    mapping = {}
+    for index, cell in enumerate(header):
+        name = str(cell or '').strip().lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in mapping:
+                mapping[column] = index
+    return mapping
+
+
+def iter_statement_rows(uploaded_file):
+    """
+    Yield ``(line_number, row_dict)`` from a CSV or XLSX statement.
+
+    Rows are read lazily; XLSX files are opened in read-only mode so large
+    workbooks are never fully loaded into memory.
+    """
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+
+    if name.endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            mapping = _map_header(header)
+            for line_number, values in enumerate(rows, start=2):
+                if not any(values):
+                    continue
+                yield line_number, {
+                    column: values[index] if index < len(values) else None
+                    for column, index in mapping.items()
+                }
+        finally:
+            workbook.close()
+        return
+
+    raw = getattr(uploaded_file, 'file', uploaded_file)
+    stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        mapping = _map_header(header)
+        for line_number, values in enumerate(reader, start=2):
+            if not any(v.strip() for v in values):
+                continue
+            yield line_number, {
+                column: values[index] if index < len(values) else None
+                for column, index in mapping.items()
+            }
+    finally:
+        stream.detach()
+
+
+class StatementMatcher:
+    """Matches statement lines against a tenant's open invoices in memory."""
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.invoices_by_number = {}
+        self.invoices_by_student = defaultdict(list)
+        self.students_by_digits = defaultdict(set)
+        self.invoices_by_balance = defaultdict(list)
+        self.remaining = {}
+        self.known_references = set()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        invoices = FeeInvoice.objects.filter(
+            tenant=self.tenant,
+            is_deleted=False,
+            status__in=OPEN_STATUSES,
+        ).select_related('student').only(
+            'id', 'invoice_number', 'balance', 'due_date', 'student__student_id'
+        ).order_by('due_date', 'id')
+
+        for invoice in invoices.iterator(chunk_size=2000):
+            self.invoices_by_number[_normalize_key(invoice.invoice_number)] = invoice
+            student_key = _normalize_key(invoice.student.student_id)
+            self.invoices_by_student[student_key].append(invoice)
+            digits = _digits(invoice.student.student_id)
+            if len(digits) >= 4:
+                self.students_by_digits[digits].add(student_key)
+            self.invoices_by_balance[invoice.balance].append(invoice)
+            self.remaining[invoice.id] = invoice.balance
+
+        references = Payment.objects.filter(
+            tenant=self.tenant,
+            is_deleted=False,
+        ).exclude(transaction_reference='').values_list('transaction_reference', flat=True)
+        self.known_references = {_normalize_key(ref) for ref in references.iterator(chunk_size=5000)}
+
+    def _first_open(self, invoices):
+        """Oldest invoice in the list that still has an unallocated balance."""
+        for invoice in invoices:
+            if self.remaining[invoice.id] > 0:
+                return invoice
+        return invoices[-1] if invoices else None
+
+    def match(self, text, amount):
+        """Return ``(invoice, method)`` for a line, or ``(None, reason)``."""
+        tokens = [_normalize_key(token) for token in TOKEN_RE.findall(text)]
+
+        # 1. Exact invoice number
+        for token in tokens:
+            invoice = self.invoices_by_number.get(token)
+            if invoice:
+                return invoice, 'invoice_number'
+
+        # 2. Exact student ID
+        for token in tokens:
+            invoices = self.invoices_by_student.get(token)
+            if invoices:
+                return self._first_open(invoices), 'student_id'
+
+        # 3. Fuzzy student ID: same digits, different prefix/separators
+        for token in tokens:
+            digits = _digits(token)
+            if len(digits) < 4:
+                continue
+            students = self.students_by_digits.get(digits)
+            if students and len(students) == 1:
+                return self._first_open(self.invoices_by_student[next(iter(students))]), 'student_id_fuzzy'
+
+        # 4. Amount: exactly one open invoice still owing this exact balance
+        candidates = [
+            invoice for invoice in self.invoices_by_balance.get(amount, [])
+            if self.remaining[invoice.id] == amount
+        ]
+        if len(candidates) == 1:
+            return candidates[0], 'amount'
+        if len(candidates) > 1:
+            return None, 'ambiguous_amount'
+
+        return None, 'unmatched'
+
+    def allocate(self, invoice, amount):
+        self.remaining[invoice.id] -= amount
+
+
+def _exception(line_number, row, reason, **extra):
+    entry = {
+        'line': line_number,
+        'reason': reason,
+        'date': str(row.get('date') or ''),
+        'amount': str(row.get('amount') or ''),
+        'reference': str(row.get('reference') or ''),
+        'narration': str(row.get('narration') or ''),
+    }
+    entry.update(extra)
+    return entry
+
+
+def import_statement(statement, uploaded_file, user=None):
+    """
+    Parse, match and (unless ``statement.dry_run``) post a statement.
+
+    Updates ``statement`` with counts, a per-method match summary and the
+    exceptions report, and returns it.
+    """
+    matcher = StatementMatcher(statement.tenant)
+    payment_method = SOURCE_PAYMENT_METHODS.get(statement.source, 'other')
+    seen_references = set()
+    matched = []
+    exceptions = []
+    summary = defaultdict(int)
+    total_lines = 0
+
+    for line_number, row in iter_statement_rows(uploaded_file):
+        total_lines += 1
+        amount = _parse_amount(row.get('amount'))
+        payment_date = _parse_date(row.get('date'))
+        reference = str(row.get('reference') or '').strip()
+
+        if amount is None or payment_date is None:
+            exceptions.append(_exception(line_number, row, 'invalid_line'))
+            continue
+        if amount <= 0:
+            # Debits and reversals are not fee receipts
+            exceptions.append(_exception(line_number, row, 'not_a_credit'))
+            continue
+
+        reference_key = _normalize_key(reference)
+        if reference_key and (reference_key in matcher.known_references or reference_key in seen_references):
+            exceptions.append(_exception(line_number, row, 'duplicate_reference'))
+            continue
+
+        text = ' '.join(str(row.get(column) or '') for column in ('reference', 'narration', 'payer'))
+        invoice, method = matcher.match(text, amount)
+        if invoice is None:
+            exceptions.append(_exception(line_number, row, method))
+            continue
+
+        if reference_key:
+            seen_references.add(reference_key)
+        overpaid = amount > matcher.remaining[invoice.id]
+        matcher.allocate(invoice, amount)
+        summary[method] += 1
+        matched.append({
+            'line': line_number,
+            'invoice': invoice,
+            'amount': amount,
+            'payment_date': payment_date,
+            'reference': reference[:100],
+            'method': method,
+        })
+        if overpaid:
+            exceptions.append(_exception(
+                line_number, row, 'overpayment',
+                invoice_number=invoice.invoice_number, posted=not statement.dry_run
+            ))
+
+    if not statement.dry_run and matched:
+        _post_payments(statement, matched, payment_method, user)
+
+    statement.total_lines = total_lines
+    statement.matched_lines = len(matched)
+    statement.exception_lines = sum(1 for entry in exceptions if entry['reason'] != 'overpayment')
+    statement.matched_amount = sum((line['amount'] for line in matched), Decimal('0.00'))
+    statement.match_summary = dict(summary)
+    statement.exceptions = exceptions
+    statement.status = 'completed'
+    statement.processed_at = timezone.now()
+    statement.save()
+    return statement
+
+
+def _post_payments(statement, matched, payment_method, user):
+    """Create matched payments and roll their totals onto invoices in bulk."""
+    from apps.schooladmin.business_logic import PaymentReconciliationService
+
+    remarks = f"Imported from statement {statement.file_name}"
+    numbers = reserve_numbers('payment', len(matched), tenant=statement.tenant_id)
+    payments = [
+        Payment(
+            invoice=line['invoice'],
+            tenant=statement.tenant,
+            payment_number=number,
+            amount=line['amount'],
+            payment_date=line['payment_date'],
+            payment_method=payment_method,
+            transaction_reference=line['reference'],
+            status='completed',
+            received_by=user,
+            gateway_response={'statement_import': statement.id, 'match': line['method']},
+            remarks=remarks,
+        )
+        for line, number in zip(matched, numbers)
+    ]
+
+    totals = defaultdict(Decimal)
+    for line in matched:
+        totals[line['invoice'].id] += line['amount']
+
+    with transaction.atomic():
+        Payment.objects.bulk_create(payments, batch_size=1000)
+        PaymentReconciliationService.invalidate_payments(payments)
+        apply_invoice_payments(totals)
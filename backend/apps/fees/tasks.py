@@ -0,0 +1,43 @@
+"""
+Celery tasks for fee management.
+"""
+from celery import shared_task
+from django.db import transaction
+from .business_logic import recompute_invoice_statuses, refresh_fee_aging_snapshots
+from .models import PaymentWebhookEvent
+
+
+@shared_task
+def recompute_fee_invoices():
+    """Recompute invoice balances/statuses and aging snapshots (runs nightly)."""
+    counts = recompute_invoice_statuses()
+    snapshots = refresh_fee_aging_snapshots()
+    
+    return f"Invoices updated: {counts}; aging snapshots: {snapshots}"
+
+
+@shared_task
+def process_payment_webhooks(batch_size=500, max_batches=20):
+    """Apply received gateway callbacks in batches."""
+    from .webhooks import apply_webhook_events
+    
+    totals = {}
+    for _ in range(max_batches):
+        with transaction.atomic():
+            # skip_locked lets several workers drain the queue side by side
+            events = list(
+                PaymentWebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status='received')
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                break
+            counts = apply_webhook_events(events)
+        
+        for key, value in counts.items():
+            totals[key] = totals.get(key, 0) + value
+    else:
+        # Still backlogged; continue in a fresh task rather than hogging this worker
+        process_payment_webhooks.delay(batch_size=batch_size, max_batches=max_batches)
+    
+    return f"Webhook events processed: {totals}"
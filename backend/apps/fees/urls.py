@@ -5,7 +5,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     FeeStructureViewSet, FeeInvoiceViewSet,
-    PaymentViewSet, PaymentPlanViewSet
+    PaymentViewSet, PaymentPlanViewSet, StatementImportViewSet,
+    PaymentWebhookView
 )
 
 router = DefaultRouter()
@@ -13,8 +14,10 @@ router.register(r'structures', FeeStructureViewSet, basename='fee-structure')
 router.register(r'invoices', FeeInvoiceViewSet, basename='fee-invoice')
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'payment-plans', PaymentPlanViewSet, basename='payment-plan')
+router.register(r'statement-imports', StatementImportViewSet, basename='statement-import')
 
 urlpatterns = [
+    path('webhooks/<str:provider>/', PaymentWebhookView.as_view(), name='payment-webhook'),
     path('', include(router.urls)),
 ]
 
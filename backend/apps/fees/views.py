@@ -4,13 +4,19 @@ Views for Fees app.
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
 from django.db.models import Sum, Q
-from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan
+from django.http import HttpResponse
+import csv
+from apps.core.permissions import IsTenantAdmin
+from .models import FeeStructure, FeeInvoice, Payment, PaymentPlan, StatementImport
 from .serializers import (
     FeeStructureSerializer, FeeInvoiceSerializer,
-    PaymentSerializer, PaymentPlanSerializer
+    PaymentSerializer, PaymentPlanSerializer, StatementImportSerializer
 )
+from .statements import import_statement
+from .webhooks import ingest_webhook, WebhookError
 
 
 class FeeStructureViewSet(viewsets.ModelViewSet):
@@ -129,5 +135,86 @@ class PaymentPlanViewSet(viewsets.ModelViewSet):
         return self.queryset.none()
 
 
+class StatementImportViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for bank and mobile-money statement imports."""
+    
+    queryset = StatementImport.objects.filter(is_deleted=False)
+    serializer_class = StatementImportSerializer
+    permission_classes = [IsAuthenticated, IsTenantAdmin]
+    
+    def get_queryset(self):
+        """Filter by tenant."""
+        user = self.request.user
+        if user.tenant:
+            return self.queryset.filter(tenant=user.tenant)
+        return self.queryset.none()
+    
+    @action(detail=False, methods=['post'])
+    def upload(self, request):
+        """Import a CSV or XLSX statement and auto-match it against open invoices."""
+        user = request.user
+        if not user.tenant:
+            return Response({'error': 'No tenant associated'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not uploaded_file.name.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+            return Response({'error': 'Statement must be a CSV or XLSX file'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        source = request.data.get('source', 'bank')
+        if source not in dict(StatementImport._meta.get_field('source').choices):
+            return Response({'error': f'Unknown source: {source}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        statement = StatementImport.objects.create(
+            tenant=user.tenant,
+            file_name=uploaded_file.name,
+            source=source,
+            dry_run=str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes'),
+            imported_by=user,
+        )
+        
+        try:
+            import_statement(statement, uploaded_file, user=user)
+        except Exception as e:
+            statement.status = 'failed'
+            statement.error_message = str(e)
+            statement.save(update_fields=['status', 'error_message', 'updated_at'])
+            return Response({'error': f'Statement import failed: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = self.get_serializer(statement)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def exceptions(self, request, pk=None):
+        """Download the exceptions report as CSV."""
+        statement = self.get_object()
+        
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="statement_{statement.id}_exceptions.csv"'
+        
+        columns = ['line', 'reason', 'date', 'amount', 'reference', 'narration', 'invoice_number']
+        writer = csv.DictWriter(response, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(statement.exceptions)
+        return response
 
 
+class PaymentWebhookView(APIView):
+    """
+    Payment gateway callback intake.
+    
+    Verifies and stores the raw event, then acknowledges immediately;
+    events are applied to invoices by a background task.
+    """
+    
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+    
+    def post(self, request, provider):
+        try:
+            ingest_webhook(provider, request.body, request.headers)
+        except WebhookError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'received'})
@@ -0,0 +1,346 @@
+"""
+Payment gateway webhook ingestion.
+
+The intake endpoint only verifies a callback, stores it as a
+PaymentWebhookEvent keyed by the provider's transaction id and returns.
+Events are applied to invoices in batches by a Celery task, which
+de-duplicates gateway retries and payments already recorded by other paths
+(e.g. statement imports) before posting.
+"""
+import hashlib
+import hmac
+import json
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.core.sequences import reserve_numbers
+from .models import FeeInvoice, Payment, PaymentWebhookEvent
+from .business_logic import apply_invoice_payments
+
+SCHEDULE_LOCK_KEY = 'fees:webhooks:drain-scheduled'
+# A burst of callbacks enqueues at most one consumer run per window
+SCHEDULE_WINDOW_SECONDS = 2
+
+
+class WebhookError(Exception):
+    """Raised when a callback fails verification or cannot be parsed."""
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _hmac_sha256(secret, body):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class PaynowWebhook:
+    """Paynow status update (form-encoded, SHA512 hash with the integration key)."""
+
+    name = 'paynow'
+    payment_method = 'paynow'
+    SUCCESS_STATUSES = {'paid', 'awaiting delivery', 'delivered'}
+
+    def parse(self, body, headers):
+        fields = parse_qsl(body.decode('utf-8'), keep_blank_values=True)
+        received_hash = ''
+        values = []
+        for key, value in fields:
+            if key.lower() == 'hash':
+                received_hash = value
+            else:
+                values.append(value)
+
+        key = settings.PAYNOW_INTEGRATION_KEY
+        if not key:
+            raise WebhookError('Paynow integration key is not configured')
+        expected = hashlib.sha512((''.join(values) + key).encode('utf-8')).hexdigest().upper()
+        if not hmac.compare_digest(expected, received_hash.upper()):
+            raise WebhookError('Invalid Paynow hash')
+
+        data = dict(fields)
+        status = data.get('status', '')
+        return {
+            'provider_transaction_id': data.get('paynowreference', ''),
+            'provider_status': status,
+            'is_success': status.lower() in self.SUCCESS_STATUSES,
+            'reference': data.get('reference', ''),
+            'amount': _amount(data.get('amount')),
+            'payload': data,
+        }
+
+
+class EcoCashWebhook:
+    """
+    EcoCash merchant payment notification (JSON).
+
+    EcoCash does not sign notifications, so the callback URL must be
+    registered with a shared secret that is sent back as an HMAC-SHA256
+    of the body in ``X-EcoCash-Signature``.
+    """
+
+    name = 'ecocash'
+    payment_method = 'ecocash'
+
+    def parse(self, body, headers):
+        secret = settings.ECOCASH_WEBHOOK_SECRET
+        if not secret:
+            raise WebhookError('EcoCash webhook secret is not configured')
+        if not hmac.compare_digest(_hmac_sha256(secret, body), headers.get('X-EcoCash-Signature', '')):
+            raise WebhookError('Invalid EcoCash signature')
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise WebhookError('Malformed EcoCash payload')
+
+        charged = data.get('paymentAmount') or {}
+        amount = charged.get('totalAmountCharged') or (charged.get('charginginformation') or {}).get('amount')
+        status = data.get('transactionOperationStatus', '')
+        return {
+            'provider_transaction_id': data.get('ecocashReference') or data.get('serverReferenceCode', ''),
+            'provider_status': status,
+            'is_success': status.upper() == 'COMPLETED',
+            'reference': data.get('referenceCode', ''),
+            'amount': _amount(amount),
+            'payload': data,
+        }
+
+
+class FakeGatewayWebhook:
+    """Callback format of the local fake gateway (JSON, HMAC-SHA256 signed)."""
+
+    name = 'fake'
+    payment_method = 'other'
+
+    def parse(self, body, headers):
+        if not settings.FAKE_GATEWAY_ENABLED or not settings.FAKE_GATEWAY_SECRET:
+            raise WebhookError('Fake gateway is disabled')
+        if not hmac.compare_digest(
+            _hmac_sha256(settings.FAKE_GATEWAY_SECRET, body), headers.get('X-Fake-Signature', '')
+        ):
+            raise WebhookError('Invalid fake gateway signature')
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise WebhookError('Malformed fake gateway payload')
+
+        status = data.get('status', '')
+        return {
+            'provider_transaction_id': data.get('transaction_id', ''),
+            'provider_status': status,
+            'is_success': status == 'paid',
+            'reference': data.get('reference', ''),
+            'amount': _amount(data.get('amount')),
+            'payload': data,
+        }
+
+
+PROVIDERS = {
+    handler.name: handler
+    for handler in (PaynowWebhook(), EcoCashWebhook(), FakeGatewayWebhook())
+}
+
+
+class FakeGateway:
+    """
+    Local stand-in for a payment gateway.
+
+    Builds signed callbacks for the ``fake`` provider, e.g. in tests::
+
+        body, headers = FakeGateway().callback('INV-2024-0001', '150.00')
+        client.post('/api/fees/webhooks/fake/', body, content_type='application/json', **headers)
+    """
+
+    def __init__(self, secret=None):
+        self.secret = secret or settings.FAKE_GATEWAY_SECRET
+
+    def callback(self, reference, amount, status='paid', transaction_id=None):
+        body = json.dumps({
+            'transaction_id': transaction_id or f"FAKE-{uuid.uuid4().hex[:12].upper()}",
+            'reference': reference,
+            'amount': str(amount),
+            'status': status,
+        }).encode()
+        return body, {'HTTP_X_FAKE_SIGNATURE': _hmac_sha256(self.secret, body)}
+
+    def paynow_callback(self, reference, amount, integration_key, status='Paid', paynow_reference=None):
+        """Form-encoded Paynow status update hashed with ``integration_key``."""
+        fields = [
+            ('reference', reference),
+            ('paynowreference', paynow_reference or str(uuid.uuid4().int)[:8]),
+            ('amount', str(amount)),
+            ('status', status),
+            ('pollurl', 'https://www.paynow.co.zw/Interface/CheckPayment/?guid=fake'),
+        ]
+        digest = hashlib.sha512(
+            (''.join(value for _, value in fields) + integration_key).encode('utf-8')
+        ).hexdigest().upper()
+        return urlencode(fields + [('hash', digest)]).encode()
+
+
+def ingest_webhook(provider, body, headers):
+    """
+    Verify and persist a callback.
+
+    Retries of the same notification are absorbed by the unique key and
+    never reach the consumer twice.
+    """
+    handler = PROVIDERS.get(provider)
+    if handler is None:
+        raise WebhookError(f'Unknown provider: {provider}')
+
+    event = handler.parse(body, headers)
+    if not event['provider_transaction_id']:
+        raise WebhookError('Missing provider transaction id')
+
+    PaymentWebhookEvent.objects.bulk_create(
+        [PaymentWebhookEvent(provider=provider, **event)],
+        ignore_conflicts=True,
+    )
+    schedule_webhook_processing()
+
+
+def schedule_webhook_processing():
+    """Enqueue the consumer at most once per window; beat picks up anything missed."""
+    from .tasks import process_payment_webhooks
+
+    try:
+        if not cache.add(SCHEDULE_LOCK_KEY, 1, timeout=SCHEDULE_WINDOW_SECONDS):
+            return
+    except Exception:
+        return
+    process_payment_webhooks.apply_async(countdown=SCHEDULE_WINDOW_SECONDS / 2)
+
+
+def lock_transaction_references(references):
+    """
+    Hold a transaction-scoped advisory lock per transaction reference.
+
+    Events are unique per (provider, transaction, status), so one payment's
+    "Paid" and "Delivered" callbacks are separate rows that two workers can
+    lock side by side. The advisory lock makes the second worker wait until
+    the first commits before it checks what is already recorded. Locks are
+    taken in sorted order, so concurrent batches cannot deadlock.
+    """
+    if not references or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(pg_advisory_xact_lock(hashtextextended('fees.payment:' || ref, 0))) "
+            "FROM (SELECT ref FROM unnest(%s::text[]) AS ref ORDER BY ref) AS refs",
+            [sorted(references)]
+        )
+
+
+def apply_webhook_events(events):
+    """
+    Apply a locked batch of received events. Must be called inside a transaction.
+
+    One query each for invoices and already-recorded references, one bulk
+    insert of payments, one bulk invoice update and one bulk event update.
+    """
+    from apps.schooladmin.business_logic import PaymentReconciliationService
+
+    now = timezone.now()
+    counts = defaultdict(int)
+
+    success = []
+    for event in events:
+        event.processed_at = now
+        if event.is_success:
+            success.append(event)
+        else:
+            event.status = 'ignored'
+
+    transaction_ids = {event.provider_transaction_id for event in success}
+    lock_transaction_references(transaction_ids)
+    recorded = set(
+        Payment.objects.filter(
+            transaction_reference__in=transaction_ids,
+            status='completed',
+        ).values_list('transaction_reference', flat=True)
+    )
+    invoices = {
+        invoice.invoice_number: invoice
+        for invoice in FeeInvoice.objects.filter(
+            invoice_number__in={event.reference for event in success},
+            is_deleted=False,
+        )
+    }
+
+    to_post = []
+    for event in success:
+        invoice = invoices.get(event.reference)
+        if event.provider_transaction_id in recorded:
+            event.status = 'duplicate'
+        elif invoice is None:
+            event.status = 'failed'
+            event.error_message = f'Unknown invoice reference: {event.reference}'
+        elif event.amount is None or event.amount <= 0:
+            event.status = 'failed'
+            event.error_message = 'Missing or invalid amount'
+        else:
+            event.status = 'applied'
+            event.invoice = invoice
+            event.tenant_id = invoice.tenant_id
+            to_post.append(event)
+        recorded.add(event.provider_transaction_id)
+
+    by_tenant = defaultdict(list)
+    for event in to_post:
+        by_tenant[event.tenant_id].append(event)
+    numbers = {}
+    for tenant_id, tenant_events in by_tenant.items():
+        numbers.update(zip(
+            (event.id for event in tenant_events),
+            reserve_numbers('payment', len(tenant_events), tenant=tenant_id),
+        ))
+
+    payments = [
+        Payment(
+            invoice=event.invoice,
+            tenant_id=event.tenant_id,
+            payment_number=numbers[event.id],
+            amount=event.amount,
+            payment_date=timezone.localdate(event.received_at),
+            payment_method=PROVIDERS[event.provider].payment_method,
+            transaction_reference=event.provider_transaction_id,
+            gateway_response=event.payload,
+            status='completed',
+            remarks=f"{event.get_provider_display()} callback",
+        )
+        for event in to_post
+    ]
+
+    totals = defaultdict(Decimal)
+    for event in to_post:
+        totals[event.invoice.id] += event.amount
+
+    with transaction.atomic():
+        Payment.objects.bulk_create(payments, batch_size=1000)
+        PaymentReconciliationService.invalidate_payments(payments)
+        for event, payment in zip(to_post, payments):
+            event.payment = payment
+        if totals:
+            apply_invoice_payments(totals)
+        PaymentWebhookEvent.objects.bulk_update(
+            events,
+            ['status', 'processed_at', 'tenant', 'invoice', 'payment', 'error_message'],
+            batch_size=1000,
+        )
+
+    for event in events:
+        counts[event.status] += 1
+    return dict(counts)
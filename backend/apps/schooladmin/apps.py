@@ -5,6 +5,9 @@ class SchooladminConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.schooladmin'
     verbose_name = 'School Administration'
+    
+    def ready(self):
+        import apps.schooladmin.signals  # noqa
 
 
 
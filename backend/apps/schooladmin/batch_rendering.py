@@ -0,0 +1,495 @@
+"""
+Batch PDF rendering for report cards, fee statements and fee invoices.
+
+All data for a batch is fetched up front with a handful of grouped queries
+and flattened into plain dicts. Rendering then fans out over a process pool;
+each worker builds its paragraph/table styles (and registers any custom
+font) once in its initializer instead of once per document. Output is one
+PDF per document plus a ZIP per class, or (``bundle='pdf'``) one merged PDF
+per class. Rendered PDFs are streamed to storage and the archives are
+spooled to temporary files, so a batch is never held in memory.
+
+A daemonic process cannot start a pool, and prefork Celery workers are
+daemonic: with BATCH_RENDER_QUEUE set, render_document_batch is routed to a
+queue whose worker runs with ``--pool=solo``. Anywhere a pool cannot start,
+rendering falls back to the calling process, with a warning.
+
+Only the collectors touch the ORM, and they import models lazily, so the
+worker side of this module can be imported by spawned processes without
+Django being set up.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+
+logger = logging.getLogger(__name__)
+
+# Built once per worker process by _init_worker
+_STYLES = None
+
+
+# ============================================================================
+# Data collection (main process)
+# ============================================================================
+
+def _money(value):
+    return f"${value or 0:,.2f}"
+
+
+def _class_name(class_obj):
+    return class_obj.name if class_obj else 'Unassigned'
+
+
+def collect_report_cards(tenant, term, class_ids=None):
+    """Report card documents for a term: one query for cards, one for subject averages."""
+    from django.db.models import Avg, Count
+    from apps.assessments.models import ReportCard, Grade
+
+    cards = ReportCard.objects.filter(
+        class_obj__tenant=tenant,
+        term=term,
+        is_deleted=False,
+    ).select_related('student__user', 'class_obj', 'term', 'academic_year').order_by('class_obj__level', 'class_obj__name', 'position')
+    if class_ids:
+        cards = cards.filter(class_obj_id__in=class_ids)
+
+    subject_rows = Grade.objects.filter(
+        student_id__in=cards.values('student_id'),
+        assessment__term=term,
+        is_deleted=False,
+    ).values('student_id', 'assessment__subject__name').annotate(
+        average=Avg('percentage'),
+        assessments=Count('id'),
+    ).order_by('assessment__subject__name')
+
+    subjects = defaultdict(list)
+    for row in subject_rows:
+        subjects[row['student_id']].append([
+            row['assessment__subject__name'],
+            str(row['assessments']),
+            f"{row['average'] or 0:.1f}%",
+        ])
+
+    documents = []
+    for card in cards:
+        student = card.student
+        documents.append({
+            'kind': 'report_card',
+            'group': _class_name(card.class_obj),
+            'filename': f"{student.student_id}_report_card.pdf",
+            'data': {
+                'school': tenant.name,
+                'student_name': student.user.full_name,
+                'student_id': student.student_id,
+                'class_name': _class_name(card.class_obj),
+                'term': card.term.name,
+                'academic_year': card.academic_year.name,
+                'subjects': subjects.get(student.id, []),
+                'average_score': f"{card.average_score:.1f}%",
+                'overall_grade': card.overall_grade or '-',
+                'position': f"{card.position} of {card.total_students}" if card.position else '-',
+                'class_teacher_comment': card.class_teacher_comment,
+                'principal_comment': card.principal_comment,
+            },
+        })
+    return documents
+
+
+def _collect_invoices(tenant, academic_year=None, class_ids=None):
+    """Invoices and their completed payments, in two queries."""
+    from apps.fees.models import FeeInvoice, Payment
+
+    invoices = FeeInvoice.objects.filter(
+        tenant=tenant,
+        is_deleted=False,
+    ).exclude(status='cancelled').select_related(
+        'student__user', 'student__current_class', 'term', 'academic_year'
+    ).order_by('student__current_class__name', 'student__student_id', 'issue_date')
+    if academic_year:
+        invoices = invoices.filter(academic_year=academic_year)
+    if class_ids:
+        invoices = invoices.filter(student__current_class_id__in=class_ids)
+
+    payments = defaultdict(list)
+    payment_rows = Payment.objects.filter(
+        invoice__in=invoices.values('id'),
+        status='completed',
+        is_deleted=False,
+    ).values_list('invoice_id', 'payment_number', 'payment_date', 'payment_method', 'amount').order_by('payment_date')
+    for invoice_id, number, paid_on, method, amount in payment_rows:
+        payments[invoice_id].append([number, paid_on.strftime('%d %b %Y'), method.title(), _money(amount)])
+
+    return list(invoices), payments
+
+
+def collect_fee_invoices(tenant, academic_year=None, class_ids=None):
+    """One document per open or settled invoice."""
+    invoices, payments = _collect_invoices(tenant, academic_year, class_ids)
+
+    return [
+        {
+            'kind': 'fee_invoice',
+            'group': _class_name(invoice.student.current_class),
+            'filename': f"{invoice.invoice_number}.pdf",
+            'data': {
+                'school': tenant.name,
+                'invoice_number': invoice.invoice_number,
+                'student_name': invoice.student.user.full_name,
+                'student_id': invoice.student.student_id,
+                'class_name': _class_name(invoice.student.current_class),
+                'term': invoice.term.name if invoice.term else '',
+                'issue_date': invoice.issue_date.strftime('%d %b %Y'),
+                'due_date': invoice.due_date.strftime('%d %b %Y'),
+                'status': invoice.get_status_display(),
+                'total': _money(invoice.total_amount),
+                'discount': _money(invoice.discount_amount) if invoice.discount_amount else '',
+                'paid': _money(invoice.paid_amount),
+                'balance': _money(invoice.balance),
+                'payments': payments.get(invoice.id, []),
+            },
+        }
+        for invoice in invoices
+    ]
+
+
+def collect_fee_statements(tenant, academic_year=None, class_ids=None):
+    """One statement per student covering all of their invoices and payments."""
+    invoices, payments = _collect_invoices(tenant, academic_year, class_ids)
+
+    by_student = OrderedDict()
+    for invoice in invoices:
+        by_student.setdefault(invoice.student_id, []).append(invoice)
+
+    documents = []
+    for student_invoices in by_student.values():
+        student = student_invoices[0].student
+        lines = []
+        total = paid = balance = 0
+        for invoice in student_invoices:
+            total += invoice.total_amount
+            paid += invoice.paid_amount
+            balance += invoice.balance
+            lines.append([
+                invoice.invoice_number,
+                invoice.due_date.strftime('%d %b %Y'),
+                _money(invoice.total_amount),
+                _money(invoice.paid_amount),
+                _money(invoice.balance),
+            ])
+        documents.append({
+            'kind': 'fee_statement',
+            'group': _class_name(student.current_class),
+            'filename': f"{student.student_id}_fee_statement.pdf",
+            'data': {
+                'school': tenant.name,
+                'student_name': student.user.full_name,
+                'student_id': student.student_id,
+                'class_name': _class_name(student.current_class),
+                'invoices': lines,
+                'payments': [row for invoice in student_invoices for row in payments.get(invoice.id, [])],
+                'total': _money(total),
+                'paid': _money(paid),
+                'balance': _money(balance),
+            },
+        })
+    return documents
+
+
+COLLECTORS = {
+    'report_cards': collect_report_cards,
+    'fee_statements': collect_fee_statements,
+    'fee_invoices': collect_fee_invoices,
+}
+
+
+# ============================================================================
+# Rendering (worker processes)
+# ============================================================================
+
+def _init_worker(font_path=None):
+    """Build styles and register fonts once per worker process."""
+    global _STYLES
+
+    font = 'Helvetica'
+    bold_font = 'Helvetica-Bold'
+    if font_path and os.path.exists(font_path):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        pdfmetrics.registerFont(TTFont('ReportFont', font_path))
+        font = bold_font = 'ReportFont'
+
+    base = getSampleStyleSheet()
+    _STYLES = {
+        'title': ParagraphStyle(
+            'BatchTitle', parent=base['Heading1'], fontName=bold_font,
+            fontSize=16, textColor=colors.HexColor('#1976D2'), alignment=1, spaceAfter=6,
+        ),
+        'subtitle': ParagraphStyle(
+            'BatchSubtitle', parent=base['Normal'], fontName=font,
+            fontSize=10, textColor=colors.grey, alignment=1, spaceAfter=12,
+        ),
+        'heading': ParagraphStyle('BatchHeading', parent=base['Heading3'], fontName=bold_font),
+        'normal': ParagraphStyle('BatchNormal', parent=base['Normal'], fontName=font, fontSize=10),
+        'details': TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTNAME', (0, 0), (0, -1), bold_font),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        'grid': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1976D2')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), bold_font),
+            ('FONTNAME', (0, 1), (-1, -1), font),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ]),
+    }
+
+
+def _header(data, title):
+    return [
+        Paragraph(escape(data['school']), _STYLES['title']),
+        Paragraph(title, _STYLES['subtitle']),
+    ]
+
+
+def _details(rows):
+    table = Table(rows, colWidths=[1.8*inch, 4.2*inch])
+    table.setStyle(_STYLES['details'])
+    return [table, Spacer(1, 0.2*inch)]
+
+
+def _grid(header, rows, empty_message):
+    if not rows:
+        return [Paragraph(empty_message, _STYLES['normal']), Spacer(1, 0.2*inch)]
+    table = Table([header] + rows, repeatRows=1)
+    table.setStyle(_STYLES['grid'])
+    return [table, Spacer(1, 0.2*inch)]
+
+
+def _report_card_flowables(data):
+    elements = _header(data, f"Report Card - {data['term']} {data['academic_year']}")
+    elements += _details([
+        ['Student:', data['student_name']],
+        ['Student ID:', data['student_id']],
+        ['Class:', data['class_name']],
+        ['Average:', data['average_score']],
+        ['Overall Grade:', data['overall_grade']],
+        ['Position:', data['position']],
+    ])
+    elements += _grid(['Subject', 'Assessments', 'Average'], data['subjects'], 'No grades recorded this term.')
+    for label, key in (("Class Teacher's Comment", 'class_teacher_comment'), ("Principal's Comment", 'principal_comment')):
+        if data[key]:
+            elements.append(Paragraph(label, _STYLES['heading']))
+            elements.append(Paragraph(escape(data[key]), _STYLES['normal']))
+    return elements
+
+
+def _fee_invoice_flowables(data):
+    elements = _header(data, f"Fee Invoice {data['invoice_number']}")
+    rows = [
+        ['Student:', f"{data['student_name']} ({data['student_id']})"],
+        ['Class:', data['class_name']],
+        ['Term:', data['term']],
+        ['Issue Date:', data['issue_date']],
+        ['Due Date:', data['due_date']],
+        ['Status:', data['status']],
+        ['Total:', data['total']],
+    ]
+    if data['discount']:
+        rows.append(['Discount:', data['discount']])
+    rows += [['Paid:', data['paid']], ['Balance Due:', data['balance']]]
+    elements += _details(rows)
+    elements += _grid(['Receipt', 'Date', 'Method', 'Amount'], data['payments'], 'No payments received.')
+    return elements
+
+
+def _fee_statement_flowables(data):
+    elements = _header(data, 'Fee Statement')
+    elements += _details([
+        ['Student:', f"{data['student_name']} ({data['student_id']})"],
+        ['Class:', data['class_name']],
+        ['Total Billed:', data['total']],
+        ['Total Paid:', data['paid']],
+        ['Balance Due:', data['balance']],
+    ])
+    elements.append(Paragraph('Invoices', _STYLES['heading']))
+    elements += _grid(['Invoice', 'Due', 'Amount', 'Paid', 'Balance'], data['invoices'], 'No invoices.')
+    elements.append(Paragraph('Payments', _STYLES['heading']))
+    elements += _grid(['Receipt', 'Date', 'Method', 'Amount'], data['payments'], 'No payments received.')
+    return elements
+
+
+FLOWABLE_BUILDERS = {
+    'report_card': _report_card_flowables,
+    'fee_invoice': _fee_invoice_flowables,
+    'fee_statement': _fee_statement_flowables,
+}
+
+
+def _build_pdf(elements):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=54, leftMargin=54, topMargin=54, bottomMargin=36)
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_document(document):
+    """Render one document; returns ``(group, filename, pdf_bytes)``."""
+    elements = FLOWABLE_BUILDERS[document['kind']](document['data'])
+    return document['group'], document['filename'], _build_pdf(elements)
+
+
+def render_merged(item):
+    """Render a ``(group, documents)`` pair into one PDF, one document per page run."""
+    group, documents = item
+    elements = []
+    for index, document in enumerate(documents):
+        if index:
+            elements.append(PageBreak())
+        elements += FLOWABLE_BUILDERS[document['kind']](document['data'])
+    return group, f"{group}.pdf", _build_pdf(elements)
+
+
+# ============================================================================
+# Orchestration
+# ============================================================================
+
+def _safe_name(value):
+    return ''.join(ch if ch.isalnum() or ch in '-_. ' else '_' for ch in value).strip() or 'unnamed'
+
+
+def _start_pool(workers, font_path):
+    """A rendering process pool, or None (with a warning) when this process cannot start one."""
+    if multiprocessing.current_process().daemon:
+        logger.warning(
+            "Batch rendering in a daemonic process (e.g. a prefork Celery worker) cannot "
+            "start a process pool; rendering serially. Route it to a --pool=solo worker."
+        )
+        return None
+    from django.db import connections
+    # Forked workers must not inherit open database sockets
+    connections.close_all()
+    try:
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(font_path,))
+    except (OSError, NotImplementedError) as e:
+        logger.warning(f"Could not start a {workers}-process rendering pool, rendering serially: {e}")
+        return None
+
+
+def _run(render, items, workers, font_path):
+    """
+    Yield ``render(item)`` for each item, in order, from a process pool.
+
+    Falls back to this process if no pool can be started, or for the items
+    left when the pool breaks part way.
+    """
+    done = 0
+    pool = _start_pool(workers, font_path) if workers > 1 and len(items) > 1 else None
+    if pool:
+        chunksize = max(1, len(items) // (workers * 4))
+        try:
+            with pool:
+                for result in pool.map(render, items, chunksize=chunksize):
+                    yield result
+                    done += 1
+            return
+        except (OSError, AssertionError, BrokenProcessPool, NotImplementedError) as e:
+            logger.warning(
+                f"Rendering pool failed after {done} of {len(items)} items, rendering the rest serially: {e}"
+            )
+
+    _init_worker(font_path)
+    for item in items[done:]:
+        yield render(item)
+
+
+def render_batch(documents, output_dir, bundle='zip', workers=None, storage=None):
+    """
+    Render ``documents`` and write them under ``output_dir``.
+
+    Layout: ``<output_dir>/<group>/<filename>`` for each document and
+    ``<output_dir>/<group>.zip`` per group, or with ``bundle='pdf'`` only
+    ``<output_dir>/<group>.pdf`` per group (each document is rendered once,
+    into its group's PDF); ``<output_dir>.zip`` holds the whole batch.
+    Returns paths and throughput figures.
+    """
+    from django.conf import settings
+    from django.core.files import File
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    storage = storage or default_storage
+    workers = workers or getattr(settings, 'BATCH_RENDER_WORKERS', None) or os.cpu_count() or 1
+    font_path = getattr(settings, 'REPORT_FONT_PATH', None)
+
+    grouped = OrderedDict()
+    for document in documents:
+        grouped.setdefault(_safe_name(document['group']), []).append(document)
+        document['group'] = _safe_name(document['group'])
+        document['filename'] = _safe_name(document['filename'])
+
+    def save_spooled(name, spool):
+        spool.seek(0)
+        return storage.save(name, File(spool, name=os.path.basename(name)))
+
+    started = time.monotonic()
+    files = []
+    bundles = {}
+    with tempfile.TemporaryFile() as batch_spool:
+        with zipfile.ZipFile(batch_spool, 'w', zipfile.ZIP_DEFLATED) as batch_zip:
+            if bundle == 'pdf':
+                for group, filename, pdf in _run(render_merged, list(grouped.items()), workers, font_path):
+                    bundles[group] = storage.save(f"{output_dir}/{filename}", ContentFile(pdf))
+                    batch_zip.writestr(filename, pdf)
+            else:
+                spools = {}
+                try:
+                    for group, filename, pdf in _run(render_document, documents, workers, font_path):
+                        files.append(storage.save(f"{output_dir}/{group}/{filename}", ContentFile(pdf)))
+                        batch_zip.writestr(f"{group}/{filename}", pdf)
+                        if group not in spools:
+                            spool = tempfile.TemporaryFile()
+                            spools[group] = (spool, zipfile.ZipFile(spool, 'w', zipfile.ZIP_DEFLATED))
+                        spools[group][1].writestr(filename, pdf)
+                    for group, (spool, group_zip) in spools.items():
+                        group_zip.close()
+                        bundles[group] = save_spooled(f"{output_dir}/{group}.zip", spool)
+                finally:
+                    for spool, group_zip in spools.values():
+                        group_zip.close()
+                        spool.close()
+        render_seconds = time.monotonic() - started
+        archive_size = batch_spool.seek(0, os.SEEK_END)
+        archive = save_spooled(f"{output_dir}.zip", batch_spool)
+
+    total_seconds = time.monotonic() - started
+    return {
+        'documents': len(documents),
+        'files': files,
+        'bundles': bundles,
+        'archive': archive,
+        'archive_size': archive_size,
+        'workers': workers,
+        'render_seconds': round(render_seconds, 2),
+        'total_seconds': round(total_seconds, 2),
+        'documents_per_second': round(len(documents) / render_seconds, 1) if render_seconds else None,
+    }
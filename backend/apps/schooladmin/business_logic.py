@@ -11,7 +11,7 @@ from apps.attendance.models import Attendance, PeriodAttendance
 from apps.assessments.models import Grade, Assessment, ReportCard
 from apps.fees.models import FeeInvoice, Payment
 from apps.academics.models import Class, Stream, AcademicYear
-from .models import DashboardMetrics, AttendanceAlert, ExamCycle
+from .models import DashboardMetrics, AttendanceAlert, ExamCycle, ReconciliationSnapshot
 
 
 class DashboardMetricsCalculator:
@@ -131,26 +131,34 @@ class DashboardMetricsCalculator:
         
         fee_collection_vs_target = Decimal(fee_collection_year / total_invoices * 100) if total_invoices > 0 else Decimal('0.00')
         
-        # Outstanding fees aging
-        outstanding_fees_30_days = FeeInvoice.objects.filter(
-            tenant=tenant,
-            status__in=['pending', 'partial', 'overdue'],
-            due_date__gte=today - timedelta(days=30),
-            due_date__lt=today
-        ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
-        
-        outstanding_fees_60_days = FeeInvoice.objects.filter(
-            tenant=tenant,
-            status__in=['pending', 'partial', 'overdue'],
-            due_date__gte=today - timedelta(days=60),
-            due_date__lt=today - timedelta(days=30)
-        ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
+        # Outstanding fees aging (read from the nightly snapshot when available)
+        from apps.fees.business_logic import get_latest_aging_snapshot
+        aging = get_latest_aging_snapshot(tenant)
         
-        outstanding_fees_90_days = FeeInvoice.objects.filter(
-            tenant=tenant,
-            status__in=['pending', 'partial', 'overdue'],
-            due_date__lt=today - timedelta(days=60)
-        ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
+        if aging:
+            outstanding_fees_30_days = aging.outstanding_30_days
+            outstanding_fees_60_days = aging.outstanding_60_days
+            outstanding_fees_90_days = aging.outstanding_90_days
+        else:
+            outstanding_fees_30_days = FeeInvoice.objects.filter(
+                tenant=tenant,
+                status__in=['pending', 'partial', 'overdue'],
+                due_date__gte=today - timedelta(days=30),
+                due_date__lt=today
+            ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
+            
+            outstanding_fees_60_days = FeeInvoice.objects.filter(
+                tenant=tenant,
+                status__in=['pending', 'partial', 'overdue'],
+                due_date__gte=today - timedelta(days=60),
+                due_date__lt=today - timedelta(days=30)
+            ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
+            
+            outstanding_fees_90_days = FeeInvoice.objects.filter(
+                tenant=tenant,
+                status__in=['pending', 'partial', 'overdue'],
+                due_date__lt=today - timedelta(days=60)
+            ).aggregate(total=Sum('balance'))['total'] or Decimal('0.00')
         
         # System Usage
         teachers_active_today = User.objects.filter(
@@ -708,3 +716,181 @@ class MinistryExportGenerator:
         
         return export
 
+
+class PaymentReconciliationService:
+    """
+    Reconcile expected vs received fees from daily closing snapshots.
+    
+    A posting, edit or delete that touches a day already snapshotted drops the
+    tenant's snapshots from that day on (see invalidate() and signals.py), so
+    reconcile() covers those days with its delta query and the next build
+    re-derives them, however far back the change was dated.
+    """
+    
+    @staticmethod
+    def _expected_by_day(tenant, start_date, end_date):
+        """Invoice totals grouped by due date for (start_date, end_date]."""
+        invoices = FeeInvoice.objects.filter(tenant=tenant, due_date__lte=end_date)
+        if start_date:
+            invoices = invoices.filter(due_date__gt=start_date)
+        rows = invoices.values('due_date').annotate(total=Sum('total_amount')).order_by()
+        return {row['due_date']: row['total'] or Decimal('0.00') for row in rows}
+    
+    @staticmethod
+    def _received_by_day(tenant, start_date, end_date):
+        """Completed payment totals grouped by day and method for (start_date, end_date]."""
+        payments = Payment.objects.filter(tenant=tenant, status='completed', payment_date__lte=end_date)
+        if start_date:
+            payments = payments.filter(payment_date__gt=start_date)
+        rows = payments.values('payment_date', 'payment_method').annotate(total=Sum('amount')).order_by()
+        
+        by_day = {}
+        for row in rows:
+            methods = by_day.setdefault(row['payment_date'], {})
+            methods[row['payment_method']] = row['total'] or Decimal('0.00')
+        return by_day
+    
+    @staticmethod
+    def invalidate(tenant_id, from_date):
+        """Drop the tenant's snapshots on or after ``from_date``."""
+        ReconciliationSnapshot.objects.filter(tenant_id=tenant_id, snapshot_date__gte=from_date).delete()
+    
+    @staticmethod
+    def invalidate_payments(payments):
+        """Invalidate from each tenant's earliest payment date (for bulk inserts, which skip signals)."""
+        earliest = {}
+        for payment in payments:
+            day = earliest.get(payment.tenant_id)
+            if day is None or payment.payment_date < day:
+                earliest[payment.tenant_id] = payment.payment_date
+        for tenant_id, day in earliest.items():
+            PaymentReconciliationService.invalidate(tenant_id, day)
+    
+    @staticmethod
+    def build_snapshots(tenant, through_date=None):
+        """
+        Extend the tenant's daily snapshots up to ``through_date`` (default: yesterday).
+        
+        Starts after the latest snapshot still standing, so only invalidated
+        and new days are recomputed.
+        """
+        through_date = through_date or timezone.localdate() - timedelta(days=1)
+        
+        anchor = ReconciliationSnapshot.objects.filter(
+            tenant=tenant,
+            snapshot_date__lte=through_date
+        ).order_by('-snapshot_date').first()
+        start_date = anchor.snapshot_date if anchor else None
+        
+        expected = PaymentReconciliationService._expected_by_day(tenant, start_date, through_date)
+        received = PaymentReconciliationService._received_by_day(tenant, start_date, through_date)
+        
+        if start_date is None:
+            activity_days = list(expected) + list(received)
+            if not activity_days:
+                return 0
+            day = min(activity_days)
+        else:
+            day = start_date + timedelta(days=1)
+        
+        expected_to_date = anchor.expected_to_date if anchor else Decimal('0.00')
+        received_to_date = anchor.received_to_date if anchor else Decimal('0.00')
+        breakdown_to_date = {
+            method: Decimal(amount) for method, amount in (anchor.breakdown_to_date if anchor else {}).items()
+        }
+        
+        snapshots = []
+        now = timezone.now()
+        while day <= through_date:
+            day_expected = expected.get(day, Decimal('0.00'))
+            day_methods = received.get(day, {})
+            day_received = sum(day_methods.values(), Decimal('0.00'))
+            
+            expected_to_date += day_expected
+            received_to_date += day_received
+            for method, amount in day_methods.items():
+                breakdown_to_date[method] = breakdown_to_date.get(method, Decimal('0.00')) + amount
+            
+            snapshots.append(ReconciliationSnapshot(
+                tenant=tenant,
+                snapshot_date=day,
+                expected_amount=day_expected,
+                received_amount=day_received,
+                expected_to_date=expected_to_date,
+                received_to_date=received_to_date,
+                breakdown_to_date={method: str(amount) for method, amount in breakdown_to_date.items()},
+                calculated_at=now,
+            ))
+            day += timedelta(days=1)
+        
+        ReconciliationSnapshot.objects.bulk_create(
+            snapshots,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['tenant', 'snapshot_date'],
+            update_fields=[
+                'expected_amount', 'received_amount', 'expected_to_date',
+                'received_to_date', 'breakdown_to_date', 'calculated_at',
+            ],
+        )
+        return len(snapshots)
+    
+    @staticmethod
+    def reconcile(tenant, reconciliation_date):
+        """
+        Return expected/received totals up to ``reconciliation_date``.
+        
+        Uses the closest snapshot on or before the date plus a delta query
+        over the days after it, instead of aggregating the full history.
+        """
+        snapshot = ReconciliationSnapshot.objects.filter(
+            tenant=tenant,
+            snapshot_date__lte=reconciliation_date
+        ).order_by('-snapshot_date').first()
+        start_date = snapshot.snapshot_date if snapshot else None
+        
+        expected = snapshot.expected_to_date if snapshot else Decimal('0.00')
+        received = snapshot.received_to_date if snapshot else Decimal('0.00')
+        breakdown = {
+            method: Decimal(amount) for method, amount in (snapshot.breakdown_to_date if snapshot else {}).items()
+        }
+        
+        if start_date is None or start_date < reconciliation_date:
+            expected += sum(
+                PaymentReconciliationService._expected_by_day(tenant, start_date, reconciliation_date).values(),
+                Decimal('0.00')
+            )
+            delta = PaymentReconciliationService._received_by_day(tenant, start_date, reconciliation_date)
+            for day_methods in delta.values():
+                for method, amount in day_methods.items():
+                    received += amount
+                    breakdown[method] = breakdown.get(method, Decimal('0.00')) + amount
+        
+        return {
+            'expected_amount': expected,
+            'received_amount': received,
+            'difference': expected - received,
+            'breakdown': {method: float(amount) for method, amount in breakdown.items()},
+        }
+    
+    @staticmethod
+    def timeseries(tenant, start_date, end_date):
+        """Daily reconciliation series between two dates (inclusive)."""
+        snapshots = ReconciliationSnapshot.objects.filter(
+            tenant=tenant,
+            snapshot_date__gte=start_date,
+            snapshot_date__lte=end_date
+        ).order_by('snapshot_date')
+        
+        return [
+            {
+                'date': snapshot.snapshot_date,
+                'expected_amount': float(snapshot.expected_amount),
+                'received_amount': float(snapshot.received_amount),
+                'expected_to_date': float(snapshot.expected_to_date),
+                'received_to_date': float(snapshot.received_to_date),
+                'difference': float(snapshot.expected_to_date - snapshot.received_to_date),
+                'breakdown': {method: float(amount) for method, amount in snapshot.breakdown_to_date.items()},
+            }
+            for snapshot in snapshots
+        ]
@@ -0,0 +1,378 @@
+"""
+Delivery engine for CommunicationCampaign.
+
+The audience is resolved to a single set-based query that yields one row per
+distinct contact (DISTINCT ON), streamed from a server-side cursor in
+chunks. Each chunk is rendered, logged with one bulk insert, handed to the
+channel sender and counted with atomic F() increments, so only one chunk of
+recipients is ever held in memory.
+"""
+import logging
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import get_connection, EmailMessage
+from django.db.models import F, Min, OuterRef, Subquery, Sum, Value as V, CharField, DateField, DecimalField
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.utils import timezone
+
+from apps.communications.templating import compile_template, get_compiled
+from .models import CommunicationCampaign, CommunicationLog
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+# Campaign type -> delivery channel
+CAMPAIGN_CHANNELS = {
+    'sms': 'sms',
+    'emergency': 'sms',
+    'whatsapp': 'whatsapp',
+    'email': 'email',
+    'announcement': 'in_app',
+}
+
+RECIPIENT_FIELDS = ['recipient_id', 'recipient_name', 'contact', 'student_name', 'class_name']
+
+# Per-student fee variables, only queried when the template uses them
+FEE_FIELDS = ['balance', 'due_date']
+
+COMMON_FIELDS = ['school_name', 'campaign_name']
+
+
+def _full_name(prefix):
+    return Concat(
+        f'{prefix}first_name', V(' '), f'{prefix}last_name',
+        output_field=CharField()
+    )
+
+
+def _contact(channel, phone_field, user_prefix):
+    if channel == 'email':
+        return F(f'{user_prefix}email')
+    if channel == 'in_app':
+        return Cast(f'{user_prefix}id', output_field=CharField())
+    return F(phone_field)
+
+
+class AudienceResolver:
+    """Turns a campaign's target audience into a distinct-contact queryset."""
+
+    STUDENT_AUDIENCES = {'all_students', 'all_parents', 'specific_class', 'specific_students'}
+
+    def __init__(self, campaign, variables=()):
+        self.campaign = campaign
+        self.tenant = campaign.tenant
+        self.channel = CAMPAIGN_CHANNELS.get(campaign.campaign_type, 'sms')
+        self.fee_fields = [name for name in FEE_FIELDS if name in variables]
+
+    @property
+    def available_variables(self):
+        """Template variables this audience can fill."""
+        available = set(RECIPIENT_FIELDS) | set(COMMON_FIELDS)
+        if self.campaign.target_audience in self.STUDENT_AUDIENCES:
+            available |= set(FEE_FIELDS)
+        return available
+
+    def resolve(self):
+        """Return ``(recipient_type, queryset of recipient dicts)``."""
+        audience = self.campaign.target_audience
+        target_ids = [target for target in (self.campaign.target_list or []) if str(target).isdigit()]
+
+        if audience == 'all_students':
+            return 'student', self._students(self._active_students())
+        if audience == 'all_parents':
+            return 'parent', self._guardians(self._active_students())
+        if audience == 'specific_class':
+            return 'parent', self._guardians(self._active_students().filter(current_class_id__in=target_ids))
+        if audience == 'specific_students':
+            return 'parent', self._guardians(self._active_students().filter(id__in=target_ids))
+        if audience == 'all_teachers':
+            return 'teacher', self._users(role__in=['teacher'])
+        if audience == 'all_staff':
+            return 'staff', self._users(role__in=['admin', 'teacher'])
+        if audience == 'custom':
+            return 'staff', self._users(id__in=target_ids)
+        raise ValueError(f'Unsupported target audience: {audience}')
+
+    def _fee_annotations(self, student_ref):
+        from apps.fees.business_logic import OPEN_STATUSES
+        from apps.fees.models import FeeInvoice
+
+        open_invoices = FeeInvoice.objects.filter(
+            student_id=OuterRef(student_ref), status__in=OPEN_STATUSES, is_deleted=False
+        ).order_by().values('student_id')
+        annotations = {
+            'balance': Coalesce(
+                Subquery(open_invoices.annotate(total=Sum('balance')).values('total')[:1]),
+                V(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            'due_date': Subquery(
+                open_invoices.annotate(earliest=Min('due_date')).values('earliest')[:1],
+                output_field=DateField()
+            ),
+        }
+        return {name: annotations[name] for name in self.fee_fields}
+
+    def _active_students(self):
+        from apps.students.models import Student
+        return Student.objects.filter(tenant=self.tenant, status='active', is_deleted=False)
+
+    def _distinct(self, queryset, *tiebreak):
+        return queryset.exclude(contact__isnull=True).exclude(contact='').values(
+            *RECIPIENT_FIELDS, *self.fee_fields
+        ).order_by('contact', *tiebreak).distinct('contact')
+
+    def _students(self, students):
+        queryset = students.annotate(
+            recipient_id=F('user_id'),
+            recipient_name=_full_name('user__'),
+            contact=_contact(self.channel, 'phone', 'user__'),
+            student_name=_full_name('user__'),
+            class_name=F('current_class__name'),
+            **self._fee_annotations('id'),
+        )
+        return self._distinct(queryset, 'id')
+
+    def _guardians(self, students):
+        from apps.students.models import StudentGuardian
+        queryset = StudentGuardian.objects.filter(
+            student__in=students,
+            guardian__is_deleted=False,
+            is_deleted=False,
+        ).annotate(
+            recipient_id=F('guardian__user_id'),
+            recipient_name=_full_name('guardian__user__'),
+            contact=_contact(self.channel, 'guardian__phone', 'guardian__user__'),
+            student_name=_full_name('student__user__'),
+            class_name=F('student__current_class__name'),
+            **self._fee_annotations('student_id'),
+        )
+        # A parent of several children is contacted once, about the primary child
+        return self._distinct(queryset, '-is_primary', 'id')
+
+    def _users(self, **filters):
+        from apps.users.models import User
+        queryset = User.objects.filter(tenant=self.tenant, is_active=True, **filters).annotate(
+            recipient_id=F('id'),
+            recipient_name=_full_name(''),
+            contact=_contact(self.channel, 'phone', ''),
+            student_name=V('', output_field=CharField()),
+            class_name=V('', output_field=CharField()),
+        )
+        return self._distinct(queryset, 'id')
+
+
+class ChannelSender:
+    """Hands a chunk of logged messages to a delivery channel."""
+
+    def send(self, campaign, logs):
+        """Returns ``(sent, delivered, failed)`` counts and sets log statuses."""
+        raise NotImplementedError
+
+
+class SMSChannelSender(ChannelSender):
+    """Queues the chunk on the outbound SMS queue (delivery is asynchronous)."""
+
+    def send(self, campaign, logs):
+        from apps.communications.services import sms_service
+
+        now = timezone.now()
+        sms_service.send_bulk_sms(
+            ((log.recipient_contact, log.message, {'communication_log_id': log.id}) for log in logs),
+            tenant=campaign.tenant,
+        )
+        for log in logs:
+            log.status = 'sent'
+            log.sent_at = now
+        return len(logs), 0, 0
+
+
+class EmailChannelSender(ChannelSender):
+    """Sends the chunk over a single SMTP connection."""
+
+    def send(self, campaign, logs):
+        now = timezone.now()
+        sent = failed = 0
+        connection = get_connection()
+        try:
+            connection.open()
+            for log in logs:
+                try:
+                    EmailMessage(
+                        log.subject, log.message, settings.DEFAULT_FROM_EMAIL,
+                        [log.recipient_contact], connection=connection
+                    ).send()
+                    log.status = 'sent'
+                    log.sent_at = now
+                    sent += 1
+                except Exception as e:
+                    log.status = 'failed'
+                    log.error_message = str(e)
+                    failed += 1
+        except Exception as e:
+            logger.error(f"Email connection failed for campaign {campaign.id}: {e}")
+            for log in logs:
+                if log.status == 'pending':
+                    log.status = 'failed'
+                    log.error_message = str(e)
+                    failed += 1
+        finally:
+            connection.close()
+        return sent, 0, failed
+
+
+class InAppChannelSender(ChannelSender):
+    """Creates in-app notifications; these are delivered as soon as they exist."""
+
+    def send(self, campaign, logs):
+        from apps.communications import counters, realtime
+        from apps.communications.models import Notification
+
+        now = timezone.now()
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=log.recipient_id,
+                tenant=campaign.tenant,
+                title=log.subject or campaign.name,
+                message=log.message,
+                notification_type='info',
+            )
+            for log in logs
+        ])
+        counters.increment('notifications', [log.recipient_id for log in logs])
+        realtime.push_notifications(notifications)
+        for log in logs:
+            log.status = 'delivered'
+            log.sent_at = now
+            log.delivered_at = now
+        return len(logs), len(logs), 0
+
+
+class UnavailableChannelSender(ChannelSender):
+    """Channel without a delivery integration; fails the chunk explicitly."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, campaign, logs):
+        for log in logs:
+            log.status = 'failed'
+            log.error_message = f"No delivery integration for channel: {self.channel}"
+        return 0, 0, len(logs)
+
+
+def get_channel_sender(channel):
+    return {
+        'sms': SMSChannelSender,
+        'email': EmailChannelSender,
+        'in_app': InAppChannelSender,
+    }.get(channel, lambda: UnavailableChannelSender(channel))()
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def compile_campaign_message(campaign):
+    """Compiled message of a campaign (its template's body, else its own content)."""
+    if campaign.template:
+        return get_compiled(campaign.template)
+    return compile_template(
+        campaign.message_content, ('campaign', campaign.pk, campaign.updated_at)
+    )
+
+
+def compile_campaign_subject(campaign):
+    """Compiled subject of a campaign's template, or None to use the campaign name."""
+    template = campaign.template
+    if template and template.subject:
+        return get_compiled(template, 'subject')
+    return None
+
+
+def validate_campaign(campaign):
+    """
+    Raise TemplateError if the message or subject uses variables the
+    audience cannot fill; returns the compiled ``(message, subject)``.
+    """
+    available = AudienceResolver(campaign).available_variables
+    compiled = compile_campaign_message(campaign)
+    compiled.validate(available)
+    subject = compile_campaign_subject(campaign)
+    if subject:
+        subject.validate(available)
+    return compiled, subject
+
+
+def deliver_campaign(campaign, chunk_size=CHUNK_SIZE):
+    """
+    Resolve, render, log and send a campaign chunk by chunk.
+
+    Contacts whose log already left 'pending' are skipped and pending logs
+    (written before a worker died mid-send) are sent again, so a retried
+    delivery resumes where a failed one stopped.
+    """
+    compiled, compiled_subject = validate_campaign(campaign)
+    variables = set(compiled.variables) | set(compiled_subject.variables if compiled_subject else ())
+    resolver = AudienceResolver(campaign, variables=variables)
+    recipient_type, recipients = resolver.resolve()
+    channel = resolver.channel
+    sender = get_channel_sender(channel)
+
+    common = {'school_name': campaign.tenant.name, 'campaign_name': campaign.name}
+
+    CommunicationCampaign.objects.filter(id=campaign.id).update(total_recipients=recipients.count())
+
+    for chunk in _chunks(recipients.iterator(chunk_size=chunk_size), chunk_size):
+        existing = CommunicationLog.objects.filter(
+            campaign=campaign,
+            recipient_contact__in=[row['contact'] for row in chunk],
+        )
+        pending = [log for log in existing if log.status == 'pending']
+        already_logged = {log.recipient_contact for log in existing}
+        chunk = [row for row in chunk if row['contact'] not in already_logged]
+        if not chunk and not pending:
+            continue
+
+        messages = compiled.render_batch(chunk, common)
+        if compiled_subject:
+            subjects = compiled_subject.render_batch(chunk, common)
+        else:
+            subjects = [campaign.name] * len(chunk)
+        logs = CommunicationLog.objects.bulk_create([
+            CommunicationLog(
+                tenant=campaign.tenant,
+                campaign=campaign,
+                channel=channel,
+                recipient_type=recipient_type,
+                recipient_id=row['recipient_id'],
+                recipient_name=(row['recipient_name'] or '')[:200],
+                recipient_contact=row['contact'],
+                subject=subject[:200],
+                message=message,
+            )
+            for row, subject, message in zip(chunk, subjects, messages)
+        ]) + pending
+
+        sent, delivered, failed = sender.send(campaign, logs)
+        CommunicationLog.objects.bulk_update(
+            logs, ['status', 'sent_at', 'delivered_at', 'error_message']
+        )
+        CommunicationCampaign.objects.filter(id=campaign.id).update(
+            sent_count=F('sent_count') + sent,
+            delivered_count=F('delivered_count') + delivered,
+            failed_count=F('failed_count') + failed,
+        )
+
+    CommunicationCampaign.objects.filter(id=campaign.id).update(
+        status='completed',
+        completed_at=timezone.now(),
+    )
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:09
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_add_current_academic_year'),
+        ('schooladmin', '0002_eventinvitation_reporttemplate_ministryexportformat_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('expected_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Invoices falling due on this day', max_digits=14)),
+                ('received_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Completed payments on this day', max_digits=14)),
+                ('expected_to_date', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('received_to_date', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('breakdown_to_date', models.JSONField(default=dict, help_text='Running received totals by payment method')),
+                ('calculated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reconciliation_snapshots', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'reconciliation_snapshots',
+                'ordering': ['-snapshot_date'],
+                'get_latest_by': 'snapshot_date',
+                'unique_together': {('tenant', 'snapshot_date')},
+            },
+        ),
+    ]
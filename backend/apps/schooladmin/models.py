@@ -641,6 +641,33 @@ class PaymentReconciliation(BaseModel):
         return f"Reconciliation - {self.reconciliation_date}"
 
 
+class ReconciliationSnapshot(models.Model):
+    """Daily closing totals per tenant, built incrementally for reconciliation."""
+    
+    tenant = models.ForeignKey('tenants.Tenant', on_delete=models.CASCADE, related_name='reconciliation_snapshots')
+    snapshot_date = models.DateField()
+    
+    # Activity on this day
+    expected_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), help_text="Invoices falling due on this day")
+    received_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), help_text="Completed payments on this day")
+    
+    # Running totals up to and including this day
+    expected_to_date = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    received_to_date = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    breakdown_to_date = models.JSONField(default=dict, help_text="Running received totals by payment method")
+    
+    calculated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'reconciliation_snapshots'
+        ordering = ['-snapshot_date']
+        get_latest_by = 'snapshot_date'
+        unique_together = ['tenant', 'snapshot_date']
+    
+    def __str__(self):
+        return f"Reconciliation snapshot - {self.tenant_id} - {self.snapshot_date}"
+
+
 # ============================================================================
 # 8. STAFF & HUMAN CAPITAL MANAGEMENT
 # ============================================================================
@@ -1010,7 +1037,7 @@ class CommunicationLog(BaseModel):
     )
     
     # Provider response
-    provider_message_id = models.CharField(max_length=200, blank=True)
+    provider_message_id = models.CharField(max_length=200, blank=True, db_index=True)
     provider_response = models.JSONField(default=dict, null=True, blank=True)
     error_message = models.TextField(blank=True)
     
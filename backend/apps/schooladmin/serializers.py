@@ -2,6 +2,7 @@
 Serializers for School Admin app.
 """
 from rest_framework import serializers
+from apps.communications.serializers import TemplateVariablesMixin
 from .models import (
     SchoolProfile, AcademicConfiguration, AdmissionApplication,
     StudentDocument, StudentLifecycleEvent, TimetableVersion, TimetableSlotEnhanced,
@@ -303,7 +304,7 @@ class CommunicationChannelSerializer(serializers.ModelSerializer):
         }
 
 
-class MessageTemplateSerializer(serializers.ModelSerializer):
+class MessageTemplateSerializer(TemplateVariablesMixin, serializers.ModelSerializer):
     """Serializer for Message Template."""
     
     tenant_name = serializers.CharField(source='tenant.name', read_only=True)
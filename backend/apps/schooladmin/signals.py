@@ -0,0 +1,52 @@
+"""
+Signals keeping reconciliation snapshots in step with single-row writes to
+invoices and payments.
+
+A save that changes what a snapshot counts invalidates the tenant's
+snapshots from the earliest day involved (the old and the new date, so
+moving a payment to another day is covered). Bulk inserts bypass these
+signals and invalidate themselves (see
+PaymentReconciliationService.invalidate_payments).
+"""
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+from apps.fees.models import FeeInvoice, Payment
+from .business_logic import PaymentReconciliationService
+
+# Model -> (day field, fields the snapshots are built from)
+RECONCILED_FIELDS = {
+    FeeInvoice: ('due_date', ('tenant', 'due_date', 'total_amount')),
+    Payment: ('payment_date', ('tenant', 'payment_date', 'amount', 'status', 'payment_method')),
+}
+
+
+def _invalidate(rows, day_field):
+    earliest = {}
+    for row in rows:
+        day = row[day_field]
+        if day and (row['tenant'] not in earliest or day < earliest[row['tenant']]):
+            earliest[row['tenant']] = day
+    for tenant_id, day in earliest.items():
+        PaymentReconciliationService.invalidate(tenant_id, day)
+
+
+@receiver(pre_save, sender=FeeInvoice)
+@receiver(pre_save, sender=Payment)
+def invalidate_reconciliation_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    day_field, fields = RECONCILED_FIELDS[sender]
+    if raw or (update_fields is not None and not set(update_fields) & set(fields)):
+        return
+    current = {field: getattr(instance, sender._meta.get_field(field).attname) for field in fields}
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+        if previous == current:
+            return
+    _invalidate([row for row in (previous, current) if row], day_field)
+
+
+@receiver(post_delete, sender=FeeInvoice)
+@receiver(post_delete, sender=Payment)
+def invalidate_reconciliation_on_delete(sender, instance, **kwargs):
+    day_field, fields = RECONCILED_FIELDS[sender]
+    _invalidate([{'tenant': instance.tenant_id, day_field: getattr(instance, day_field)}], day_field)
@@ -0,0 +1,111 @@
+"""
+Celery tasks for School Admin operations.
+"""
+from celery import shared_task
+from django.utils import timezone
+from apps.tenants.models import Tenant
+from .business_logic import PaymentReconciliationService
+from .models import GeneratedReport
+
+
+@shared_task
+def build_reconciliation_snapshots():
+    """Extend daily reconciliation snapshots for every active tenant (runs nightly)."""
+    built = 0
+    for tenant in Tenant.objects.filter(is_active=True).iterator():
+        built += PaymentReconciliationService.build_snapshots(tenant)
+    
+    return f"Reconciliation snapshots written: {built}"
+
+
+@shared_task
+def render_document_batch(report_id):
+    """Render a batch of report cards, fee statements or fee invoices for a GeneratedReport."""
+    from apps.academics.models import AcademicYear, Term
+    from .batch_rendering import COLLECTORS, render_batch
+    
+    report = GeneratedReport.objects.select_related('tenant').get(id=report_id)
+    params = report.parameters
+    tenant = report.tenant
+    
+    try:
+        kind = params['kind']
+        class_ids = params.get('class_ids') or None
+        if kind == 'report_cards':
+            term = Term.objects.get(id=params['term'], academic_year__tenant=tenant)
+            documents = COLLECTORS[kind](tenant, term, class_ids=class_ids)
+        else:
+            academic_year = None
+            if params.get('academic_year'):
+                academic_year = AcademicYear.objects.get(id=params['academic_year'], tenant=tenant)
+            documents = COLLECTORS[kind](tenant, academic_year=academic_year, class_ids=class_ids)
+        
+        result = render_batch(
+            documents,
+            output_dir=f"reports/generated/batches/{report.id}",
+            bundle=params.get('bundle', 'zip'),
+        )
+    except Exception as e:
+        report.status = 'failed'
+        report.parameters = {**params, 'error': str(e)}
+        report.save(update_fields=['status', 'parameters', 'updated_at'])
+        raise
+    
+    report.file.name = result['archive']
+    report.file_size = result['archive_size']
+    report.record_count = result['documents']
+    report.generation_time_seconds = result['total_seconds']
+    report.parameters = {
+        **params,
+        'bundles': result['bundles'],
+        'workers': result['workers'],
+        'render_seconds': result['render_seconds'],
+        'documents_per_second': result['documents_per_second'],
+    }
+    report.status = 'completed'
+    report.generated_at = timezone.now()
+    report.save()
+    
+    return f"Rendered {result['documents']} documents ({result['documents_per_second']}/s)"
+
+
+@shared_task
+def send_campaign(campaign_id):
+    """Deliver a communication campaign to its resolved audience."""
+    from .campaigns import deliver_campaign
+    from .models import CommunicationCampaign
+    
+    campaign = CommunicationCampaign.objects.select_related('tenant', 'template').get(id=campaign_id)
+    if campaign.status != 'sending':
+        return f"Campaign {campaign_id} is {campaign.status}, not sending"
+    
+    try:
+        deliver_campaign(campaign)
+    except Exception:
+        CommunicationCampaign.objects.filter(id=campaign_id).update(status='failed')
+        raise
+    
+    campaign.refresh_from_db()
+    return f"Campaign {campaign_id}: {campaign.sent_count} sent, {campaign.failed_count} failed"
+
+
+@shared_task
+def dispatch_scheduled_campaigns():
+    """Start campaigns whose scheduled time has passed (runs every minute)."""
+    from .models import CommunicationCampaign
+    
+    due = list(
+        CommunicationCampaign.objects.filter(
+            status='scheduled', scheduled_at__lte=timezone.now()
+        ).values_list('id', flat=True)
+    )
+    started = 0
+    for campaign_id in due:
+        # Conditional update so overlapping runs start each campaign once
+        if CommunicationCampaign.objects.filter(id=campaign_id, status='scheduled').update(
+            status='sending', sent_at=timezone.now()
+        ):
+            send_campaign.delay(campaign_id)
+            started += 1
+    
+    return f"Scheduled campaigns started: {started}"
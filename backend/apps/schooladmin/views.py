@@ -9,7 +9,7 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Count, Sum, Max
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 
 from apps.core.permissions import IsTenantAdmin
 from .models import (
@@ -161,16 +161,10 @@ class AdmissionApplicationViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Set tenant and generate application number."""
-        tenant = self.request.user.tenant
-        serializer.save(tenant=tenant)
+        from apps.core.sequences import next_number
         
-        # Generate application number if not provided
-        instance = serializer.instance
-        if not instance.application_number:
-            year = timezone.now().year
-            count = AdmissionApplication.objects.filter(tenant=tenant, application_date__year=year).count()
-            instance.application_number = f"APP-{year}-{count+1:04d}"
-            instance.save()
+        tenant = self.request.user.tenant
+        serializer.save(tenant=tenant, application_number=next_number('admission', tenant=tenant))
     
     @action(detail=True, methods=['post'])
     def move_stage(self, request, pk=None):
@@ -511,29 +505,13 @@ class PaymentReconciliationViewSet(viewsets.ModelViewSet):
         tenant = self.request.user.tenant
         reconciliation_date = serializer.validated_data.get('reconciliation_date', timezone.now().date())
         
-        # Calculate expected and received amounts
-        from apps.fees.models import FeeInvoice, Payment
-        
-        expected = FeeInvoice.objects.filter(
-            tenant=tenant,
-            due_date__lte=reconciliation_date
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        received = Payment.objects.filter(
-            tenant=tenant,
-            payment_date__lte=reconciliation_date,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        difference = expected - received
-        
-        # Breakdown by payment method
-        breakdown = Payment.objects.filter(
-            tenant=tenant,
-            payment_date__lte=reconciliation_date,
-            status='completed'
-        ).values('payment_method').annotate(total=Sum('amount'))
-        breakdown = {item['payment_method']: float(item['total']) for item in breakdown}
+        # Closest daily snapshot plus the delta since it
+        from .business_logic import PaymentReconciliationService
+        totals = PaymentReconciliationService.reconcile(tenant, reconciliation_date)
+        expected = totals['expected_amount']
+        received = totals['received_amount']
+        difference = totals['difference']
+        breakdown = totals['breakdown']
         
         status_value = 'reconciled' if abs(difference) < 1 else 'discrepancy'
         
@@ -546,6 +524,35 @@ class PaymentReconciliationViewSet(viewsets.ModelViewSet):
             status=status_value,
             reconciled_by=self.request.user
         )
+    
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """Daily expected vs received totals from reconciliation snapshots."""
+        from .business_logic import PaymentReconciliationService
+        
+        end_date = request.query_params.get('end_date')
+        start_date = request.query_params.get('start_date')
+        try:
+            end_date = date.fromisoformat(end_date) if end_date else timezone.now().date()
+            start_date = date.fromisoformat(start_date) if start_date else end_date - timedelta(days=30)
+        except ValueError:
+            return Response(
+                {'error': 'Dates must be in YYYY-MM-DD format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date must be before end_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        series = PaymentReconciliationService.timeseries(request.user.tenant, start_date, end_date)
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'results': series,
+        })
 
 
 # ============================================================================
@@ -90,16 +90,37 @@ class CommunicationCampaignViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def send(self, request, pk=None):
-        """Send a campaign."""
+        """Start delivering a campaign in the background."""
+        from apps.communications.templating import TemplateError
+        from .campaigns import validate_campaign
+        from .tasks import send_campaign
+        
         campaign = self.get_object()
-        campaign.status = 'sending'
-        campaign.sent_at = timezone.now()
-        campaign.save()
-        campaign.status = 'completed'
-        campaign.completed_at = timezone.now()
-        campaign.save()
+        if campaign.status not in ('draft', 'scheduled', 'failed'):
+            return Response(
+                {'error': f'Campaign cannot be sent while {campaign.status}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            validate_campaign(campaign)
+        except TemplateError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Conditional update so a double-submitted send starts one delivery
+        started = CommunicationCampaign.objects.filter(
+            id=campaign.id, status=campaign.status
+        ).update(status='sending', sent_at=timezone.now())
+        if not started:
+            return Response(
+                {'error': 'Campaign is already being sent'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        send_campaign.delay(campaign.id)
+        campaign.refresh_from_db()
         serializer = self.get_serializer(campaign)
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
 class CommunicationLogViewSet(viewsets.ReadOnlyModelViewSet):
@@ -213,6 +234,52 @@ class GeneratedReportViewSet(viewsets.ModelViewSet):
         report.save()
         serializer = self.get_serializer(report)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Queue batch rendering of report cards, fee statements or fee invoices."""
+        from .tasks import render_document_batch
+        
+        kind = request.data.get('kind')
+        batch_types = {
+            'report_cards': ('academic', 'Report Cards'),
+            'fee_statements': ('financial', 'Fee Statements'),
+            'fee_invoices': ('financial', 'Fee Invoices'),
+        }
+        if kind not in batch_types:
+            return Response(
+                {'error': f"kind must be one of: {', '.join(batch_types)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if kind == 'report_cards' and not request.data.get('term'):
+            return Response({'error': 'term is required for report cards'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        bundle = request.data.get('bundle', 'zip')
+        if bundle not in ('zip', 'pdf'):
+            return Response({'error': "bundle must be 'zip' or 'pdf'"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report_type, label = batch_types[kind]
+        report = GeneratedReport.objects.create(
+            tenant=request.user.tenant,
+            report_name=f"{label} - {timezone.now().strftime('%Y-%m-%d %H:%M')}",
+            report_type=report_type,
+            format='pdf',
+            file='',
+            file_size=0,
+            parameters={
+                'kind': kind,
+                'term': request.data.get('term'),
+                'academic_year': request.data.get('academic_year'),
+                'class_ids': request.data.get('class_ids') or [],
+                'bundle': bundle,
+            },
+            status='generating',
+            generated_by=request.user,
+        )
+        render_document_batch.delay(report.id)
+        
+        serializer = self.get_serializer(report)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
 class AnalyticsQueryViewSet(viewsets.ModelViewSet):
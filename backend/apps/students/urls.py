@@ -5,7 +5,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     StudentViewSet, GuardianViewSet,
-    StudentGuardianViewSet, EnrollmentViewSet
+    StudentGuardianViewSet, EnrollmentViewSet, PartnerStudentViewSet
 )
 
 router = DefaultRouter()
@@ -13,6 +13,7 @@ router.register(r'students', StudentViewSet, basename='student')
 router.register(r'guardians', GuardianViewSet, basename='guardian')
 router.register(r'student-guardians', StudentGuardianViewSet, basename='student-guardian')
 router.register(r'enrollments', EnrollmentViewSet, basename='enrollment')
+router.register(r'partner/students', PartnerStudentViewSet, basename='partner-student')
 
 urlpatterns = [
     path('', include(router.urls)),
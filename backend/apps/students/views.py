@@ -4,6 +4,7 @@ Views for Students app.
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from apps.core.permissions import IsTeacher
+from apps.superadmin.api_keys import APIKeyAuthentication, HasAPIKeyScope
 from .models import Student, Guardian, StudentGuardian, Enrollment
 from .serializers import (
     StudentSerializer, GuardianSerializer,
@@ -44,6 +45,24 @@ class StudentViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class PartnerStudentViewSet(viewsets.ReadOnlyModelViewSet):
+    """Read-only student directory for partner integrations, authenticated by tenant API key."""
+    
+    queryset = Student.objects.filter(is_deleted=False)
+    serializer_class = StudentSerializer
+    authentication_classes = [APIKeyAuthentication]
+    permission_classes = [HasAPIKeyScope]
+    required_scopes = ['students:read']
+    
+    def get_queryset(self):
+        """The key's tenant only, optionally by class."""
+        queryset = self.queryset.filter(tenant_id=self.request.user.tenant_id)
+        class_id = self.request.query_params.get('class')
+        if class_id:
+            queryset = queryset.filter(current_class_id=class_id)
+        return queryset
+
+
 class GuardianViewSet(viewsets.ModelViewSet):
     """ViewSet for Guardian."""
     
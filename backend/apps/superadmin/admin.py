@@ -5,8 +5,9 @@ from .models import (
     ImpersonationSession, FeatureFlag, SystemHealth,
     GlobalUser, APIKey, PaymentGateway, PaymentTransaction,
     Lead, Backup, Content, ContentSubscription, Contract,
-    GlobalAnnouncement, KnowledgeBaseArticle, OnboardingChecklist
+    GlobalAnnouncement, AnnouncementDelivery, KnowledgeBaseArticle, OnboardingChecklist
 )
+from .audit_search import search_query
 
 
 @admin.register(SubscriptionPlan)
@@ -55,6 +56,12 @@ class AuditLogAdmin(admin.ModelAdmin):
     search_fields = ['user__email', 'resource_name', 'description']
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'created_at'
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Full-text index instead of ILIKE scans over every partition
+        if not search_term:
+            return queryset, False
+        return queryset.filter(search_vector=search_query(search_term)), False
 
 
 @admin.register(ImpersonationSession)
@@ -160,6 +167,14 @@ class GlobalAnnouncementAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(AnnouncementDelivery)
+class AnnouncementDeliveryAdmin(admin.ModelAdmin):
+    list_display = ['announcement', 'tenant', 'status', 'in_app_count', 'email_count', 'sms_count', 'completed_at']
+    list_filter = ['status']
+    search_fields = ['announcement__title', 'tenant__name']
+    readonly_fields = ['created_at', 'updated_at']
+
+
 @admin.register(KnowledgeBaseArticle)
 class KnowledgeBaseArticleAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'is_public', 'is_internal', 'view_count', 'author']
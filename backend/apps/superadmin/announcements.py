@@ -0,0 +1,232 @@
+"""
+Global announcement delivery.
+
+Publishing moves an announcement to 'queued' once (see
+GlobalAnnouncementViewSet.publish), and send_announcement takes it from
+'queued' to 'sending', so a double click or a retried request never fans
+out twice. The fan-out is one Celery sub-task per tenant (see
+apps.superadmin.tasks.send_announcement). Each tenant's delivery is tracked
+by an AnnouncementDelivery row and proceeds channel by channel, in user id
+order, checkpointing the last user delivered to per channel: in-app and
+SMS chunks are queued in the same transaction as their checkpoint, email
+checkpoints after every granted batch and on failure. A resumed delivery
+continues after the checkpoint instead of resending. An empty email bucket
+re-schedules the tenant's sub-task with a countdown rather than sleeping.
+"""
+import logging
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.core.rate_limit import TokenBucket
+from .models import AnnouncementDelivery, GlobalAnnouncement, Tenant
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BATCH_SIZE = 100
+USER_BATCH_SIZE = 1000
+# A queued/sending announcement with no progress for this long may be re-published
+STALE_AFTER = timedelta(hours=1)
+
+
+class DeliveryThrottled(Exception):
+    """The email bucket is empty; retry the tenant's delivery after ``wait`` seconds."""
+
+    def __init__(self, wait):
+        super().__init__(f"Email rate limit reached, retry in {wait:.1f}s")
+        self.wait = wait
+
+
+def delivery_in_flight(announcement):
+    """Whether a delivery run is queued or still making progress."""
+    if announcement.delivery_status not in ('queued', 'sending'):
+        return False
+    cutoff = timezone.now() - STALE_AFTER
+    return announcement.updated_at >= cutoff or announcement.deliveries.filter(updated_at__gte=cutoff).exists()
+
+
+def target_tenant_ids(announcement):
+    if announcement.target_tenants.exists():
+        tenants = announcement.target_tenants.filter(is_active=True, is_deleted=False)
+    else:
+        tenants = Tenant.objects.filter(is_active=True, is_deleted=False)
+    return list(tenants.values_list('id', flat=True))
+
+
+def prepare_deliveries(announcement):
+    """
+    Create missing AnnouncementDelivery rows and return the tenant ids still
+    to deliver (everything not yet completed).
+    """
+    tenant_ids = target_tenant_ids(announcement)
+    AnnouncementDelivery.objects.bulk_create(
+        [AnnouncementDelivery(announcement=announcement, tenant_id=tenant_id) for tenant_id in tenant_ids],
+        ignore_conflicts=True,
+    )
+    return list(
+        AnnouncementDelivery.objects.filter(
+            announcement=announcement, tenant_id__in=tenant_ids
+        ).exclude(status='completed').values_list('tenant_id', flat=True)
+    )
+
+
+def _recipients(announcement, tenant_id):
+    from apps.users.models import User
+
+    users = User.objects.filter(tenant_id=tenant_id, is_active=True)
+    if announcement.target_roles:
+        users = users.filter(role__in=announcement.target_roles)
+    return users
+
+
+def _user_batches(users, fields, size):
+    """``[(id, *fields), ...]`` chunks of ``users`` in id order (keyset paged)."""
+    users = users.order_by('id')
+    last_id = None
+    while True:
+        page = users.filter(id__gt=last_id) if last_id is not None else users
+        batch = list(page.values_list('id', *fields)[:size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def _deliver_in_app(announcement, tenant, users, checkpoint):
+    """
+    Notifications in bulk. When the whole tenant is targeted, connected
+    users get one tenant-wide event instead of a push each.
+    """
+    from apps.communications import realtime
+    from apps.communications.services import notification_service
+
+    tenant_wide = not announcement.target_roles
+    created = 0
+    for batch in _user_batches(users, (), USER_BATCH_SIZE):
+        with transaction.atomic():
+            count = notification_service.create_bulk_notifications(
+                [user_id for user_id, in batch], announcement.title, announcement.message,
+                tenant=tenant, push=not tenant_wide
+            )
+            checkpoint(batch[-1][0], count)
+        created += count
+    if tenant_wide and created:
+        realtime.push_to_tenant(tenant.id, 'announcement', {
+            'id': announcement.id,
+            'title': announcement.title,
+            'message': announcement.message,
+        })
+
+
+def _deliver_sms(announcement, tenant, users, checkpoint):
+    from apps.communications.services import sms_service
+
+    for batch in _user_batches(users.exclude(phone=''), ('phone',), USER_BATCH_SIZE):
+        with transaction.atomic():
+            queued = sms_service.send_bulk_sms(
+                [phone for _, phone in batch], announcement.message, tenant=tenant
+            )
+            checkpoint(batch[-1][0], queued)
+
+
+def _deliver_email(announcement, tenant, users, checkpoint):
+    """Send over one SMTP connection, paced by the platform email bucket."""
+    bucket = TokenBucket('email:platform', settings.EMAIL_RATE_PER_SECOND, settings.EMAIL_RATE_BURST)
+    with get_connection() as connection:
+        for batch in _user_batches(users.exclude(email=''), ('email',), EMAIL_BATCH_SIZE):
+            while batch:
+                granted = bucket.take(len(batch))
+                if not granted:
+                    raise DeliveryThrottled(len(batch) / settings.EMAIL_RATE_PER_SECOND)
+                sent, last_id = 0, None
+                try:
+                    for user_id, address in batch[:granted]:
+                        connection.send_messages([
+                            EmailMessage(announcement.title, announcement.message, settings.DEFAULT_FROM_EMAIL, [address])
+                        ])
+                        sent, last_id = sent + 1, user_id
+                finally:
+                    # Also on failure, so a retry resumes after the last message that went out
+                    if last_id is not None:
+                        checkpoint(last_id, sent)
+                batch = batch[granted:]
+
+
+CHANNELS = (
+    ('in_app', 'send_in_app', 'in_app_count', _deliver_in_app),
+    ('email', 'send_email', 'email_count', _deliver_email),
+    ('sms', 'send_sms', 'sms_count', _deliver_sms),
+)
+
+
+def _checkpoint(delivery, channel, count_field, last_user_id, count):
+    delivery.progress = {**delivery.progress, channel: last_user_id}
+    setattr(delivery, count_field, getattr(delivery, count_field) + count)
+    delivery.save(update_fields=['progress', count_field, 'updated_at'])
+
+
+def deliver_to_tenant(announcement, tenant_id):
+    """
+    Deliver ``announcement`` to one tenant, skipping channels already done
+    and resuming each unfinished channel after its checkpoint. Raises
+    DeliveryThrottled when the email rate limit is exhausted.
+    """
+    delivery = AnnouncementDelivery.objects.select_related('tenant').get(
+        announcement=announcement, tenant_id=tenant_id
+    )
+    if delivery.status == 'completed':
+        return delivery
+
+    delivery.status = 'in_progress'
+    delivery.started_at = delivery.started_at or timezone.now()
+    delivery.error_message = ''
+    delivery.save(update_fields=['status', 'started_at', 'error_message', 'updated_at'])
+
+    users = _recipients(announcement, tenant_id)
+    for channel, flag, count_field, deliver in CHANNELS:
+        if not getattr(announcement, flag) or channel in delivery.completed_channels:
+            continue
+        last_user_id = delivery.progress.get(channel)
+        pending = users.filter(id__gt=last_user_id) if last_user_id else users
+        try:
+            deliver(announcement, delivery.tenant, pending, partial(_checkpoint, delivery, channel, count_field))
+        except DeliveryThrottled:
+            raise
+        except Exception as e:
+            logger.error(f"Announcement {announcement.id} {channel} delivery to tenant {tenant_id} failed: {e}")
+            delivery.status = 'failed'
+            delivery.error_message = f"{channel}: {e}"
+            delivery.save(update_fields=['status', 'error_message', 'updated_at'])
+            return delivery
+        delivery.completed_channels = delivery.completed_channels + [channel]
+        delivery.save(update_fields=['completed_channels', 'updated_at'])
+
+    delivery.status = 'completed'
+    delivery.completed_at = timezone.now()
+    delivery.save(update_fields=['status', 'completed_at', 'updated_at'])
+    return delivery
+
+
+def aggregate_delivery_stats(announcement_id):
+    """Roll per-tenant delivery rows up into the announcement and settle its delivery status."""
+    totals = AnnouncementDelivery.objects.filter(announcement_id=announcement_id).aggregate(
+        in_app=Sum('in_app_count'),
+        email=Sum('email_count'),
+        sms=Sum('sms_count'),
+        tenants=Count('id'),
+        tenants_completed=Count('id', filter=Q(status='completed')),
+        tenants_failed=Count('id', filter=Q(status='failed')),
+    )
+    stats = {key: value or 0 for key, value in totals.items()}
+    GlobalAnnouncement.objects.filter(id=announcement_id).update(
+        sent_count=stats['in_app'] + stats['email'] + stats['sms'],
+        delivery_stats=stats,
+        delivery_status='completed' if stats['tenants_completed'] == stats['tenants'] else 'partial',
+        updated_at=timezone.now(),
+    )
+    return stats
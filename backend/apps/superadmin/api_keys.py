@@ -0,0 +1,374 @@
+"""
+Tenant API key authentication, rate limiting and usage accounting.
+
+Partner-facing views (e.g. apps.students.views.PartnerStudentViewSet) opt in with::
+
+    authentication_classes = [APIKeyAuthentication]
+    permission_classes = [HasAPIKeyScope]
+    required_scopes = ['students:read']
+
+APIKeyAuthentication resolves the presented key through an in-process LRU
+keyed by its SHA-256 digest (entries expire after API_KEY_CACHE_TTL seconds,
+so revocations reach every process), so a hot key costs no database query.
+APIKeyRateThrottle (a default throttle class) checks the key's per-minute,
+per-hour and per-day token buckets in one Lua call, so either all three
+windows admit the request or none is charged. The same call counts the
+request in Redis; ``flush_api_key_usage`` writes the counts and last-used
+times to APIKey in one batched UPDATE per run.
+"""
+import hashlib
+import ipaddress
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.db.models import Case, DateTimeField, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import exceptions, permissions
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.throttling import BaseThrottle
+
+from apps.core.rate_limit import get_redis
+from apps.core.utils import get_client_ip
+
+logger = logging.getLogger(__name__)
+
+KEYWORD = 'Api-Key'
+HEADER = 'HTTP_X_API_KEY'
+USAGE_KEY = 'apikeys:usage'
+LAST_USED_KEY = 'apikeys:last_used'
+FLUSH_BATCH_SIZE = 500
+# (suffix, window seconds, APIKey field)
+WINDOWS = (
+    ('m', 60, 'rate_limit_per_minute'),
+    ('h', 3600, 'rate_limit_per_hour'),
+    ('d', 86400, 'rate_limit_per_day'),
+)
+
+# KEYS: one bucket hash per window, then the usage and last-used hashes
+# ARGV: now (seconds), key id, then rate/sec and capacity per bucket
+# Returns {1 if admitted else 0, seconds until every bucket has a token}
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local buckets = #KEYS - 2
+local tokens = {}
+local wait = 0
+for i = 1, buckets do
+    local rate = tonumber(ARGV[1 + 2 * i])
+    local capacity = tonumber(ARGV[2 + 2 * i])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1])
+    local ts = tonumber(state[2])
+    if level == nil then
+        level = capacity
+        ts = now
+    end
+    level = math.min(capacity, level + math.max(0, now - ts) * rate)
+    if level < 1 then
+        wait = math.max(wait, (1 - level) / rate)
+    end
+    tokens[i] = level
+end
+
+local admitted = wait == 0
+for i = 1, buckets do
+    local rate = tonumber(ARGV[1 + 2 * i])
+    local capacity = tonumber(ARGV[2 + 2 * i])
+    if admitted then
+        tokens[i] = tokens[i] - 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tokens[i], 'ts', now)
+    redis.call('EXPIRE', KEYS[i], math.ceil(capacity / rate) + 60)
+end
+
+if admitted then
+    redis.call('HINCRBY', KEYS[buckets + 1], ARGV[2], 1)
+    redis.call('HSET', KEYS[buckets + 2], ARGV[2], ARGV[1])
+    return {1, '0'}
+end
+return {0, tostring(wait)}
+"""
+
+# Moves the live usage hashes aside for flushing, unless a failed flush
+# left some behind; returns 1 if there is anything to flush
+CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 1
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('RENAME', KEYS[1], KEYS[3])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[4])
+end
+return 1
+"""
+
+_scripts = {}
+
+
+def _script(source):
+    if source not in _scripts:
+        _scripts[source] = get_redis().register_script(source)
+    return _scripts[source]
+
+
+def hash_key(raw_key):
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class APIKeyRecord:
+    """What a request needs from an APIKey, detached from the database."""
+
+    id: int
+    name: str
+    tenant: object
+    is_active: bool
+    expires_at: object
+    networks: tuple
+    scopes: frozenset
+    # (suffix, window seconds, limit) for each enforced window
+    limits: tuple
+
+    @property
+    def tenant_id(self):
+        return self.tenant.pk
+
+    @classmethod
+    def from_model(cls, api_key):
+        networks = []
+        for entry in api_key.allowed_ips or []:
+            try:
+                networks.append(ipaddress.ip_network(str(entry).strip(), strict=False))
+            except ValueError:
+                logger.warning(f"Ignoring invalid allowed_ips entry {entry!r} on API key {api_key.pk}")
+        return cls(
+            id=api_key.pk,
+            name=api_key.name,
+            tenant=api_key.tenant,
+            is_active=api_key.is_active,
+            expires_at=api_key.expires_at,
+            networks=tuple(networks),
+            scopes=frozenset(api_key.scopes or []),
+            limits=tuple(
+                (suffix, seconds, getattr(api_key, field))
+                for suffix, seconds, field in WINDOWS
+                if getattr(api_key, field) > 0
+            ),
+        )
+
+    def allows_ip(self, ip):
+        if not self.networks:
+            return True
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    def has_scopes(self, required):
+        return '*' in self.scopes or set(required) <= self.scopes
+
+
+class KeyCache:
+    """Thread-safe LRU of key digest -> APIKeyRecord (or None for unknown keys)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        """``(hit, record)``."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return False, None
+            record, loaded_at = entry
+            if time.monotonic() - loaded_at > settings.API_KEY_CACHE_TTL:
+                del self._entries[digest]
+                return False, None
+            self._entries.move_to_end(digest)
+            return True, record
+
+    def put(self, digest, record):
+        with self._lock:
+            self._entries[digest] = (record, time.monotonic())
+            self._entries.move_to_end(digest)
+            while len(self._entries) > settings.API_KEY_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def evict(self, key_id):
+        with self._lock:
+            for digest in [d for d, (record, _) in self._entries.items() if record and record.id == key_id]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+key_cache = KeyCache()
+
+
+def lookup(raw_key):
+    """The APIKeyRecord for a presented key, or None."""
+    from .models import APIKey
+
+    digest = hash_key(raw_key)
+    hit, record = key_cache.get(digest)
+    if hit:
+        return record
+    api_key = APIKey.objects.select_related('tenant').filter(key=raw_key, is_deleted=False).first()
+    record = APIKeyRecord.from_model(api_key) if api_key else None
+    key_cache.put(digest, record)
+    return record
+
+
+class APIKeyUser:
+    """``request.user`` for API key requests: the key's tenant, no user account."""
+
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    role = 'api'
+    pk = id = None
+
+    def __init__(self, record):
+        self.api_key = record
+        self.tenant = record.tenant
+        self.tenant_id = record.tenant_id
+
+    def __str__(self):
+        return f"API key {self.api_key.name}"
+
+
+class APIKeyAuthentication(BaseAuthentication):
+    """``Authorization: Api-Key <key>`` or ``X-API-Key: <key>``."""
+
+    def authenticate(self, request):
+        raw_key = self.get_raw_key(request)
+        if raw_key is None:
+            return None
+
+        record = lookup(raw_key)
+        if record is None or not record.is_active:
+            raise exceptions.AuthenticationFailed('Invalid API key.')
+        if record.expires_at and record.expires_at <= timezone.now():
+            raise exceptions.AuthenticationFailed('API key has expired.')
+        if not record.tenant.is_active:
+            raise exceptions.AuthenticationFailed('Tenant is inactive.')
+        if not record.allows_ip(get_client_ip(request)):
+            raise exceptions.AuthenticationFailed('API key is not allowed from this IP address.')
+        return APIKeyUser(record), record
+
+    def get_raw_key(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        parts = header.split()
+        if len(parts) == 2 and parts[0].lower() == KEYWORD.lower():
+            return parts[1]
+        return request.META.get(HEADER) or None
+
+    def authenticate_header(self, request):
+        return KEYWORD
+
+
+class HasAPIKeyScope(permissions.BasePermission):
+    """API key requests need every scope in the view's ``required_scopes``."""
+
+    def has_permission(self, request, view):
+        record = request.auth
+        if not isinstance(record, APIKeyRecord):
+            return bool(request.user and request.user.is_authenticated)
+        required = getattr(view, 'required_scopes', None)
+        if not required:
+            # A view that names no scopes is not open to API keys
+            return False
+        return record.has_scopes(required)
+
+
+def record_usage(record):
+    """Count a request for a key no bucket applies to (TAKE_SCRIPT counts the rest)."""
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        pipeline.hincrby(USAGE_KEY, record.id, 1)
+        pipeline.hset(LAST_USED_KEY, record.id, time.time())
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning(f"API key usage not recorded: {e}")
+
+
+class APIKeyRateThrottle(BaseThrottle):
+    """
+    Per-key minute/hour/day token buckets, checked and charged atomically.
+
+    Keys with no limits are only counted. Other requests pass untouched.
+    Fails open if Redis is unreachable.
+    """
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        record = request.auth
+        if not isinstance(record, APIKeyRecord):
+            return True
+        if not record.limits:
+            record_usage(record)
+            return True
+
+        keys, args = [], [time.time(), record.id]
+        for suffix, seconds, limit in record.limits:
+            keys.append(f'ratelimit:apikey:{record.id}:{suffix}')
+            args.extend([limit / seconds, limit])
+        keys.extend([USAGE_KEY, LAST_USED_KEY])
+        try:
+            admitted, wait = _script(TAKE_SCRIPT)(keys=keys, args=args)
+        except redis.RedisError as e:
+            logger.warning(f"API key rate limiter unavailable, allowing request: {e}")
+            return True
+        if admitted:
+            return True
+        self.retry_after = float(wait)
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+def flush_usage():
+    """Apply the request counts gathered in Redis to APIKey; returns keys updated."""
+    from .models import APIKey
+
+    client = get_redis()
+    flushing = [f'{USAGE_KEY}:flushing', f'{LAST_USED_KEY}:flushing']
+    if not _script(CLAIM_SCRIPT)(keys=[USAGE_KEY, LAST_USED_KEY] + flushing):
+        return 0
+
+    counts = {int(key_id): int(count) for key_id, count in client.hgetall(flushing[0]).items()}
+    last_used = {
+        int(key_id): datetime.fromtimestamp(float(ts), tz=dt_timezone.utc)
+        for key_id, ts in client.hgetall(flushing[1]).items()
+    }
+    ids = sorted(counts)
+    for start in range(0, len(ids), FLUSH_BATCH_SIZE):
+        batch = ids[start:start + FLUSH_BATCH_SIZE]
+        # Queryset update: no save() signals, so no audit log entry per flush
+        APIKey.objects.filter(id__in=batch).update(
+            usage_count=F('usage_count') + Case(
+                *[When(id=key_id, then=Value(counts[key_id])) for key_id in batch],
+                default=Value(0), output_field=IntegerField()
+            ),
+            last_used_at=Case(
+                *[When(id=key_id, then=Value(last_used[key_id])) for key_id in batch if key_id in last_used],
+                default=F('last_used_at'), output_field=DateTimeField()
+            ),
+        )
+    client.delete(*flushing)
+    return len(ids)
@@ -0,0 +1,485 @@
+"""
+Per-tenant logical backups.
+
+A backup is a tar archive of:
+
+* ``data/<app_label.model>/<n>.copy.gz`` - the tenant's rows of each
+  tenant-scoped table in PostgreSQL COPY text format, gzip-compressed and
+  split into members of about ``CHUNK_BYTES`` (uncompressed) each;
+* ``media/<name>`` - files referenced by the rows' FileFields;
+* ``manifest.json`` - tables in dependency order with their columns, row
+  counts and per-member SHA-256, plus the media list and applied migrations.
+
+Tables are exported in parallel, pg_dump style: the coordinating connection
+opens a REPEATABLE READ transaction and exports its snapshot, and each
+worker thread imports it, so every table is read at the same instant. Rows
+stream from ``COPY (SELECT ...) TO STDOUT`` into temporary chunk files, so
+memory stays flat regardless of tenant size.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, connections, models, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+CHUNK_BYTES = 64 * 1024 * 1024
+COPY_BUFFER_BYTES = 1024 * 1024
+
+# Tenant-scoped by FK but owned by the platform, not the tenant: a restore must
+# not rewind them (audit trail, impersonation history, billing, support, keys)
+EXCLUDED_MODELS = {
+    'superadmin.Backup',
+    'superadmin.AuditLog',
+    'superadmin.ImpersonationSession',
+    'superadmin.TenantSubscription',
+    'superadmin.Invoice',
+    'superadmin.PaymentTransaction',
+    'superadmin.SupportTicket',
+    'superadmin.TicketReply',
+    'superadmin.APIKey',
+    'superadmin.Contract',
+    'superadmin.ContentSubscription',
+    'superadmin.AnnouncementDelivery',
+    'superadmin.OnboardingChecklist',
+    'superadmin.FeatureFlag_enabled_tenants',
+    'superadmin.GlobalAnnouncement_target_tenants',
+    'superadmin.PaymentGateway_enabled_tenants',
+}
+
+
+# ============================================================================
+# Tenant-scoped models
+# ============================================================================
+
+def _relations(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is not model
+    ]
+
+
+def tenant_scopes():
+    """
+    ``{model: lookup}`` for every tenant-scoped model, where
+    ``filter(**{lookup: tenant_id})`` selects the tenant's rows.
+
+    A model is scoped by its ``tenant`` FK, or by a non-nullable FK to a
+    scoped model (e.g. Term via ``academic_year__tenant_id``).
+    """
+    from apps.tenants.models import Tenant
+
+    candidates = [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.app_config.name.startswith('apps.')
+        and model._meta.label not in EXCLUDED_MODELS and model._meta.managed
+    ]
+    scopes = {Tenant: 'id'}
+    for model in candidates:
+        tenant_fields = [
+            field for field in _relations(model)
+            if field.related_model is Tenant and field.name == 'tenant'
+        ]
+        if tenant_fields:
+            scopes[model] = f'{tenant_fields[0].name}_id'
+
+    # Breadth-first, so each model takes its shortest path to the tenant
+    while True:
+        known = dict(scopes)
+        for model in candidates:
+            if model in known:
+                continue
+            for field in _relations(model):
+                if not field.null and field.related_model in known:
+                    parent = known[field.related_model]
+                    scopes[model] = f'{field.name}__{parent}' if parent != 'id' else f'{field.name}_id'
+                    break
+        if len(scopes) == len(known):
+            return scopes
+
+
+def dependency_order(models_):
+    """
+    Models ordered so FK targets come first. Cycles (e.g. Tenant <->
+    AcademicYear) are broken at nullable FKs; Django creates PostgreSQL FKs
+    DEFERRABLE INITIALLY DEFERRED, so a restore in one transaction accepts
+    the remaining forward references.
+    """
+    remaining = set(models_)
+    required = {
+        model: {field.related_model for field in _relations(model) if field.related_model in remaining}
+        for model in remaining
+    }
+    hard = {
+        model: {field.related_model for field in _relations(model)
+                if field.related_model in remaining and not field.null}
+        for model in remaining
+    }
+    dependents = {model: sum(model in deps for deps in required.values()) for model in remaining}
+    ordered = []
+    while remaining:
+        ready = sorted(
+            (model for model in remaining if not required[model] & remaining),
+            key=lambda model: model._meta.label,
+        )
+        if not ready:
+            # Stuck on a cycle: take the model whose unmet FKs are all nullable,
+            # fewest of them first, then the one most others depend on
+            breakable = [model for model in remaining if not hard[model] & remaining] or list(remaining)
+            ready = [min(breakable, key=lambda model: (
+                len(required[model] & remaining), -dependents[model], model._meta.label
+            ))]
+        ordered.extend(ready)
+        remaining.difference_update(ready)
+    return ordered
+
+
+def _file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+# ============================================================================
+# Archive members
+# ============================================================================
+
+class HashingWriter:
+    """File wrapper computing size and SHA-256 of everything written."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+class HashingReader:
+    """File wrapper computing the SHA-256 of everything read."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class _ChunkedCopyWriter:
+    """
+    COPY output sink that writes gzip chunk files of about ``chunk_bytes``
+    (uncompressed), splitting only at row boundaries.
+    """
+
+    def __init__(self, directory, chunk_bytes):
+        self.directory = directory
+        self.chunk_bytes = chunk_bytes
+        self.chunks = []
+        self.rows = 0
+        self._buffer = []
+        self._buffered = 0
+        self._file = None
+        self._gzip = None
+        self._written = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.rows += data.count(b'\n')
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= COPY_BUFFER_BYTES:
+            self._flush_buffer()
+        return len(data)
+
+    def _flush_buffer(self):
+        if not self._buffer:
+            return
+        data = b''.join(self._buffer)
+        self._buffer, self._buffered = [], 0
+        if self._gzip is None:
+            path = os.path.join(self.directory, f'{len(self.chunks):05d}.copy.gz')
+            self._file = HashingWriter(open(path, 'wb'))
+            self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', mtime=0)
+            self.chunks.append({'path': path, 'rows': 0})
+        self._gzip.write(data)
+        self._written += len(data)
+        self.chunks[-1]['rows'] += data.count(b'\n')
+        if self._written >= self.chunk_bytes and data.endswith(b'\n'):
+            self._close_chunk()
+
+    def _close_chunk(self):
+        self._gzip.close()
+        self._file.fileobj.close()
+        self.chunks[-1].update(sha256=self._file.sha256.hexdigest(), bytes=self._file.size)
+        self._gzip = self._file = None
+        self._written = 0
+
+    def close(self):
+        self._flush_buffer()
+        if self._gzip is not None:
+            self._close_chunk()
+
+
+# ============================================================================
+# Export
+# ============================================================================
+
+def _table_queryset(model, lookup, tenant_id, since=None):
+    queryset = model._base_manager.filter(**{lookup: tenant_id})
+    if since is not None and any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        queryset = queryset.filter(updated_at__gte=since)
+    return queryset.order_by()
+
+
+def _export_table(model, lookup, tenant_id, since, snapshot_id, directory):
+    """Worker: COPY one table's tenant rows to chunk files under ``directory``."""
+    columns = [field.column for field in model._meta.concrete_fields]
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    table_dir = os.path.join(directory, model._meta.label_lower)
+    os.makedirs(table_dir, exist_ok=True)
+    writer = _ChunkedCopyWriter(table_dir, CHUNK_BYTES)
+    started = time.monotonic()
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if snapshot_id:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                    cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot_id])
+                sql, params = _table_queryset(model, lookup, tenant_id, since).values_list(*attnames).query.sql_with_params()
+                select = cursor.cursor.mogrify(sql, params).decode()
+                cursor.copy_expert(f'COPY ({select}) TO STDOUT', writer)
+        writer.close()
+    finally:
+        connections.close_all()
+    return {
+        'model': model._meta.label_lower,
+        'table': model._meta.db_table,
+        'columns': columns,
+        'rows': writer.rows,
+        'chunks': writer.chunks,
+        'seconds': round(time.monotonic() - started, 2),
+    }
+
+
+def _media_names(scopes, tenant_id, since):
+    """Distinct non-empty FileField values in the tenant's rows."""
+    names = set()
+    for model, lookup in scopes.items():
+        fields = _file_fields(model)
+        if not fields:
+            continue
+        queryset = _table_queryset(model, lookup, tenant_id, since)
+        for values in queryset.values_list(*[field.attname for field in fields]).iterator(chunk_size=2000):
+            names.update(value for value in values if value)
+    return sorted(names)
+
+
+def _add_file(archive, name, path):
+    info = archive.gettarinfo(path, arcname=name)
+    info.mtime = 0
+    with open(path, 'rb') as f:
+        archive.addfile(info, f)
+
+
+def _add_media(archive, name, storage):
+    """Stream one stored file into the archive; returns its manifest entry or None if missing."""
+    try:
+        size = storage.size(name)
+        source = storage.open(name, 'rb')
+    except Exception as e:
+        logger.warning(f"Backup skipped missing media file {name}: {e}")
+        return None
+    with source:
+        reader = HashingReader(source)
+        info = tarfile.TarInfo(f'media/{name}')
+        info.size = size
+        archive.addfile(info, reader)
+    return {'name': name, 'bytes': size, 'sha256': reader.sha256.hexdigest()}
+
+
+def _export_snapshot():
+    """Start a REPEATABLE READ transaction on this connection and export its snapshot."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        cursor.execute('SELECT pg_export_snapshot()')
+        return cursor.fetchone()[0]
+
+
+def _schema_versions():
+    latest = {}
+    for app_label, name in MigrationRecorder(connection).applied_migrations():
+        latest[app_label] = max(latest.get(app_label, ''), name)
+    return latest
+
+
+def write_backup(tenant_id, fileobj, backup_type='full', since=None, workers=None):
+    """
+    Write a tenant backup archive to ``fileobj``.
+
+    ``backup_type`` is 'full', 'database', 'files' or 'incremental' (rows and
+    files changed since ``since``). Returns the manifest.
+    """
+    workers = workers or settings.BACKUP_WORKERS
+    include_data = backup_type != 'files'
+    include_media = backup_type != 'database'
+    incremental_since = since if backup_type == 'incremental' else None
+
+    scopes = tenant_scopes()
+    order = dependency_order(scopes)
+    manifest = {
+        'format': FORMAT_VERSION,
+        'tenant_id': tenant_id,
+        'backup_type': backup_type,
+        'since': incremental_since.isoformat() if incremental_since else None,
+        'created_at': timezone.now().isoformat(),
+        'tables': [],
+        'media': [],
+    }
+
+    work_dir = tempfile.mkdtemp(prefix=f'backup-{tenant_id}-')
+    try:
+        with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+            with transaction.atomic():
+                snapshot_id = _export_snapshot()
+                manifest['schema'] = _schema_versions()
+
+                if include_data:
+                    tables = {}
+                    # Workers read the coordinator's snapshot, so it stays open until they finish
+                    with ThreadPoolExecutor(max_workers=workers) as pool:
+                        futures = [
+                            pool.submit(_export_table, model, scopes[model], tenant_id,
+                                        incremental_since, snapshot_id, work_dir)
+                            for model in order
+                        ]
+                        for future in as_completed(futures):
+                            table = future.result()
+                            members = []
+                            for chunk in table.pop('chunks'):
+                                name = f"data/{table['model']}/{os.path.basename(chunk['path'])}"
+                                _add_file(archive, name, chunk['path'])
+                                os.remove(chunk['path'])
+                                members.append({'name': name, 'rows': chunk['rows'],
+                                                'bytes': chunk['bytes'], 'sha256': chunk['sha256']})
+                            table['members'] = members
+                            tables[table['model']] = table
+                    manifest['tables'] = [tables[model._meta.label_lower] for model in order]
+
+                media_names = _media_names(scopes, tenant_id, incremental_since) if include_media else []
+
+            for name in media_names:
+                entry = _add_media(archive, name, default_storage)
+                if entry:
+                    manifest['media'].append(entry)
+                else:
+                    manifest.setdefault('missing_media', []).append(name)
+
+            data = json.dumps(manifest, indent=1).encode()
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(data)
+            archive.addfile(info, _BytesReader(data))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return manifest
+
+
+class _BytesReader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.data) if size < 0 else self.position + size
+        chunk = self.data[self.position:end].tobytes()
+        self.position += len(chunk)
+        return chunk
+
+
+_backup_storage = None
+
+
+def backup_storage():
+    """
+    Private storage for backup archives and audit archives (BACKUP_STORAGE).
+
+    Kept apart from MEDIA storage so archives, which hold password hashes and
+    student data, are never reachable at a public URL.
+    """
+    global _backup_storage
+    if _backup_storage is None:
+        config = settings.BACKUP_STORAGE
+        _backup_storage = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _backup_storage
+
+
+def _storage_location(storage):
+    return 'local' if isinstance(storage, FileSystemStorage) else type(storage).__name__
+
+
+def create_backup(backup):
+    """
+    Run ``backup``: write the archive to a temporary file, store it, and
+    record path, size, SHA-256 and the manifest summary on the Backup row.
+    """
+    from .models import Backup
+
+    since = previous = None
+    if backup.backup_type == 'incremental':
+        previous = Backup.objects.filter(
+            tenant_id=backup.tenant_id, status='completed'
+        ).exclude(id=backup.id).order_by('-started_at').first()
+        since = previous.started_at if previous else None
+
+    with tempfile.TemporaryFile() as raw:
+        writer = HashingWriter(raw)
+        manifest = write_backup(backup.tenant_id, writer, backup.backup_type, since=since)
+        raw.seek(0)
+        storage = backup_storage()
+        name = storage.save(f'backups/{backup.tenant_id}/{backup.id}.tar', File(raw))
+
+    backup.file_path = name
+    backup.file_size_mb = round(writer.size / (1024 * 1024), 3)
+    backup.storage_location = _storage_location(storage)
+    backup.metadata = {
+        **backup.metadata,
+        'format': FORMAT_VERSION,
+        'sha256': writer.sha256.hexdigest(),
+        'bytes': writer.size,
+        'since': manifest['since'],
+        'base_backup_id': previous.id if previous else None,
+        'tables': {table['model']: table['rows'] for table in manifest['tables']},
+        'rows': sum(table['rows'] for table in manifest['tables']),
+        'media_files': len(manifest['media']),
+        'missing_media': len(manifest.get('missing_media', [])),
+    }
+    return backup
@@ -1,16 +1,54 @@
 """
 WebSocket consumers for real-time updates.
 """
+import asyncio
 import json
+import time
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from channels.auth import get_user
 from apps.superadmin.models import SystemHealth, AuditLog
 from apps.tenants.models import Tenant
+from . import monitoring
+
+
+def health_payload(health):
+    """SystemHealth row as sent to monitoring clients."""
+    return {
+        'response_time_avg': health.response_time_avg,
+        'response_time_p50': health.response_time_p50,
+        'response_time_p95': health.response_time_p95,
+        'response_time_p99': health.response_time_p99,
+        'error_rate': health.error_rate,
+        'cpu_usage': health.cpu_usage,
+        'memory_usage': health.memory_usage,
+        'storage_used_gb': health.storage_used_gb,
+        'storage_total_gb': health.storage_total_gb,
+        'active_users': health.active_users,
+        'api_requests_24h': health.api_requests_24h,
+        'background_jobs_queued': health.background_jobs_queued,
+        'background_jobs_failed': health.background_jobs_failed,
+        'endpoints': health.endpoint_metrics,
+    }
 
 
 class SystemMonitoringConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for real-time system monitoring."""
+    """
+    WebSocket consumer for real-time system monitoring.
+    
+    Receives metric deltas from apps.superadmin.monitoring and forwards the
+    subscribed topics. Deltas arriving within MIN_SEND_INTERVAL of the last
+    send are merged and sent together, so a burst costs the client one
+    frame; a gap in the delta sequence triggers a full resync.
+    
+    Client messages:
+        {"type": "subscribe", "topics": ["latency", "errors"]}
+        {"type": "unsubscribe", "topics": ["endpoints"]}
+    """
+    
+    MIN_SEND_INTERVAL = 2.0
+    # Refresh the producer's "dashboards connected" flag at most this often
+    ACTIVE_REFRESH_INTERVAL = 30.0
     
     async def connect(self):
         """Accept connection and add to monitoring group."""
@@ -22,7 +60,13 @@ class SystemMonitoringConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        self.group_name = 'system_monitoring'
+        self.group_name = monitoring.GROUP_NAME
+        self.topics = set(monitoring.ALL_TOPICS)
+        self.pending = {}
+        self.last_seq = None
+        self.last_sent = 0.0
+        self.last_active_refresh = 0.0
+        self.flush_task = None
         
         await self.channel_layer.group_add(
             self.group_name,
@@ -30,66 +74,135 @@ class SystemMonitoringConsumer(AsyncWebsocketConsumer):
         )
         
         await self.accept()
-        
-        # Send initial system health data
-        health_data = await self.get_latest_health()
-        await self.send(text_data=json.dumps({
-            'type': 'system_health',
-            'data': health_data
-        }))
+        await self.refresh_active()
+        await self.send_snapshot(self.topics)
     
     async def disconnect(self, close_code):
         """Remove from group on disconnect."""
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
     
     async def receive(self, text_data):
-        """Handle messages from client."""
-        text_data_json = json.loads(text_data)
+        """Handle topic subscriptions from client."""
+        try:
+            text_data_json = json.loads(text_data)
+        except ValueError:
+            return
         message_type = text_data_json.get('type')
+        topics = set(text_data_json.get('topics') or []) & set(monitoring.ALL_TOPICS)
         
         if message_type == 'subscribe':
-            # Client wants to subscribe to specific updates
-            await self.channel_layer.group_add(
-                f"monitoring_{message_type}",
-                self.channel_name
-            )
-    
-    async def system_health_update(self, event):
-        """Send system health update to WebSocket."""
+            added = topics - self.topics
+            self.topics |= topics
+            await self.send_snapshot(added)
+        elif message_type == 'unsubscribe':
+            self.topics -= topics
+            for topic in topics:
+                self.pending.pop(topic, None)
+        else:
+            return
         await self.send(text_data=json.dumps({
-            'type': 'system_health',
-            'data': event['data']
+            'type': 'subscriptions',
+            'topics': sorted(self.topics)
         }))
     
+    async def monitoring_delta(self, event):
+        """Merge a metrics delta into the pending frame."""
+        await self.refresh_active()
+        seq = event['seq']
+        in_order = self.last_seq is None or seq == self.last_seq + 1
+        self.last_seq = seq
+        if not in_order:
+            await self.send_snapshot(self.topics)
+            return
+        
+        for topic, values in event['topics'].items():
+            if topic not in self.topics:
+                continue
+            if isinstance(values, dict):
+                self.pending.setdefault(topic, {}).update(values)
+            else:
+                self.pending[topic] = values
+        await self.schedule_flush()
+    
+    async def system_health_update(self, event):
+        """Send recorded system health to WebSocket."""
+        if 'health' in self.topics:
+            await self.send(text_data=json.dumps({
+                'type': 'system_health',
+                'data': event['data']
+            }))
+    
     async def audit_log_update(self, event):
         """Send audit log update to WebSocket."""
+        if 'audit' in self.topics:
+            await self.send(text_data=json.dumps({
+                'type': 'audit_log',
+                'data': event['data']
+            }))
+    
+    async def schedule_flush(self):
+        if not self.pending or self.flush_task is not None:
+            return
+        wait = self.last_sent + self.MIN_SEND_INTERVAL - time.monotonic()
+        if wait <= 0:
+            await self.flush()
+        else:
+            self.flush_task = asyncio.ensure_future(self.flush_later(wait))
+    
+    async def flush_later(self, wait):
+        await asyncio.sleep(wait)
+        self.flush_task = None
+        await self.flush()
+    
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        self.last_sent = time.monotonic()
         await self.send(text_data=json.dumps({
-            'type': 'audit_log',
-            'data': event['data']
+            'type': 'metrics_delta',
+            'seq': self.last_seq,
+            'data': pending
         }))
     
+    async def send_snapshot(self, topics):
+        """Send the full current state of ``topics``."""
+        if not topics:
+            return
+        state, health = await self.get_snapshot()
+        if state:
+            self.last_seq = state['seq']
+            data = {topic: values for topic, values in state['metrics'].items() if topic in topics}
+            for topic in data:
+                self.pending.pop(topic, None)
+            await self.send(text_data=json.dumps({
+                'type': 'metrics_snapshot',
+                'seq': state['seq'],
+                'data': data
+            }))
+        if 'health' in topics:
+            await self.send(text_data=json.dumps({
+                'type': 'system_health',
+                'data': health
+            }))
+    
+    async def refresh_active(self):
+        now = time.monotonic()
+        if now - self.last_active_refresh >= self.ACTIVE_REFRESH_INTERVAL:
+            self.last_active_refresh = now
+            await database_sync_to_async(monitoring.mark_active)()
+    
     @database_sync_to_async
-    def get_latest_health(self):
-        """Get latest system health data."""
+    def get_snapshot(self):
+        """Latest broadcast state and system health data."""
         health = SystemHealth.objects.first()
-        if health:
-            return {
-                'response_time_avg': getattr(health, 'response_time_avg', 0),
-                'response_time_p95': getattr(health, 'response_time_p95', 0),
-                'error_rate': getattr(health, 'error_rate', 0),
-                'cpu_usage': getattr(health, 'cpu_usage', 0),
-                'memory_usage': getattr(health, 'memory_usage', 0),
-                'storage_used_gb': getattr(health, 'storage_used_gb', 0),
-                'storage_total_gb': getattr(health, 'storage_total_gb', 0),
-                'active_users': getattr(health, 'active_users', 0),
-                'api_requests_24h': getattr(health, 'api_requests_24h', 0),
-                'background_jobs_queued': getattr(health, 'background_jobs_queued', 0),
-                'background_jobs_failed': getattr(health, 'background_jobs_failed', 0),
-            }
-        return {}
+        return monitoring.get_state(), health_payload(health) if health else {}
 
 
 class PlatformUpdatesConsumer(AsyncWebsocketConsumer):
@@ -141,4 +254,11 @@ class PlatformUpdatesConsumer(AsyncWebsocketConsumer):
             'type': 'ticket_update',
             'data': event['data']
         }))
+    
+    async def metrics_update(self, event):
+        """Send changed platform metrics (value and delta) to WebSocket."""
+        await self.send(text_data=json.dumps({
+            'type': 'metrics_update',
+            'data': event['data']
+        }))
 
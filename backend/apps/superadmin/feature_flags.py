@@ -0,0 +1,162 @@
+"""
+Feature flag evaluation.
+
+All flags and their targeting are loaded into one immutable in-process
+snapshot, so checking a flag is a dictionary lookup and a set membership
+test with no database access. Writes to flags, their targeting or tenant
+subscriptions bump a version token in the cache (see signals.py); each
+process compares its snapshot against that token at most every
+FEATURE_FLAGS_CHECK_INTERVAL seconds and rebuilds it when it changed.
+
+Percentage rollouts hash the flag key with the tenant id, so a tenant's
+bucket is stable across processes and restarts, raising the percentage only
+ever adds tenants, and different flags roll out to different tenants first.
+"""
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'feature_flags:version'
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+@dataclass(frozen=True)
+class FlagRule:
+    """Targeting of one flag, resolved to tenant ids."""
+
+    key: str
+    is_enabled: bool
+    rollout_percentage: int
+    tenant_ids: frozenset
+
+    def evaluate(self, tenant_id):
+        if not self.is_enabled:
+            return False
+        if self.rollout_percentage >= 100:
+            return True
+        if tenant_id is None:
+            return False
+        if tenant_id in self.tenant_ids:
+            return True
+        return rollout_bucket(self.key, tenant_id) < self.rollout_percentage
+
+
+@dataclass(frozen=True)
+class FlagSnapshot:
+    """Every flag rule as of one version token."""
+
+    version: str
+    rules: MappingProxyType
+
+    def is_enabled(self, key, tenant_id):
+        rule = self.rules.get(key)
+        return rule.evaluate(tenant_id) if rule else False
+
+    def flags_for(self, tenant_id):
+        return {key: rule.evaluate(tenant_id) for key, rule in self.rules.items()}
+
+
+def rollout_bucket(key, tenant_id):
+    """Stable bucket in [0, 100) for a flag/tenant pair, in 0.01 steps."""
+    digest = hashlib.sha1(f'{key}:{tenant_id}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % 10000 / 100
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First process after a cache flush; racing processes agree via add
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def load_snapshot(version):
+    """Build a snapshot from the database (three queries)."""
+    from .models import FeatureFlag, TenantSubscription
+
+    flags = list(FeatureFlag.objects.filter(is_deleted=False).prefetch_related('enabled_tenants', 'enabled_plans'))
+    plan_tenants = {}
+    plan_ids = {plan.id for flag in flags for plan in flag.enabled_plans.all()}
+    if plan_ids:
+        # Only current subscriptions; lapsed tenants lose plan-gated flags
+        subscriptions = TenantSubscription.objects.filter(
+            plan_id__in=plan_ids, status__in=('trial', 'active'), is_deleted=False
+        )
+        for tenant_id, plan_id in subscriptions.values_list('tenant_id', 'plan_id'):
+            plan_tenants.setdefault(plan_id, set()).add(tenant_id)
+
+    rules = {}
+    for flag in flags:
+        tenant_ids = {tenant.id for tenant in flag.enabled_tenants.all()}
+        for plan in flag.enabled_plans.all():
+            tenant_ids |= plan_tenants.get(plan.id, set())
+        rules[flag.key] = FlagRule(
+            key=flag.key,
+            is_enabled=flag.is_enabled,
+            rollout_percentage=flag.rollout_percentage,
+            tenant_ids=frozenset(tenant_ids),
+        )
+    return FlagSnapshot(version=version, rules=MappingProxyType(rules))
+
+
+def get_snapshot():
+    """The current snapshot, rebuilt only when the cached version moved."""
+    global _snapshot, _checked_at
+    interval = settings.FEATURE_FLAGS_CHECK_INTERVAL
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _checked_at < interval:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and time.monotonic() - _checked_at < interval:
+            return snapshot
+        try:
+            version = current_version()
+        except Exception as e:
+            # Keep serving the last snapshot while the cache is unreachable
+            logger.warning(f"Feature flag version check failed: {e}")
+            version = snapshot.version if snapshot else None
+        if snapshot is None or version != snapshot.version:
+            snapshot = load_snapshot(version)
+            _snapshot = snapshot
+        _checked_at = time.monotonic()
+    return snapshot
+
+
+def _tenant_id(tenant):
+    return getattr(tenant, 'pk', tenant)
+
+
+def is_enabled(key, tenant=None):
+    """Whether flag ``key`` is on for ``tenant`` (a Tenant, its id, or None)."""
+    return get_snapshot().is_enabled(key, _tenant_id(tenant))
+
+
+def flags_for(tenant=None):
+    """``{flag_key: bool}`` for every flag, for ``tenant`` (a Tenant, its id, or None)."""
+    return get_snapshot().flags_for(_tenant_id(tenant))
+
+
+def invalidate():
+    """Publish a new version once the current transaction commits."""
+    def publish():
+        global _checked_at
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        # This process sees its own write on the next check
+        _checked_at = 0.0
+    transaction.on_commit(publish)
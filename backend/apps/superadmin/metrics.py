@@ -0,0 +1,199 @@
+"""
+Platform overview metrics for the superadmin dashboard.
+
+Metrics are computed by a periodic task with a handful of grouped
+aggregates, stored as PlatformMetricsSnapshot rows (the time series) and
+cached, so dashboard loads never touch the source tables. Every capture is
+kept for PLATFORM_METRICS_DETAIL_DAYS, then only each day's last one, up to
+PLATFORM_METRICS_RETENTION_DAYS. Each capture
+pushes the changed values to PlatformUpdatesConsumer clients.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from apps.students.models import Student
+from apps.tenants.models import Tenant
+from apps.users.models import User
+from .models import PaymentTransaction, PlatformMetricsSnapshot, SystemHealth, TenantSubscription
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'superadmin:platform-metrics'
+CACHE_TIMEOUT = 15 * 60
+
+# SystemHealth is recorded every 5 minutes; uptime is the share of expected samples present
+HEALTH_INTERVAL_MINUTES = 5
+
+
+def compute_platform_metrics(now=None):
+    """Compute the dashboard metrics from the source tables."""
+    now = now or timezone.now()
+    today = now.date()
+    thirty_days_ago = now - timedelta(days=30)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    schools = Tenant.objects.filter(is_deleted=False).aggregate(
+        total_schools=Count('id'),
+        active_schools=Count('id', filter=Q(is_active=True)),
+        active_last_7d=Count('id', filter=Q(is_active=True, updated_at__gte=now - timedelta(days=7))),
+        active_last_30d=Count('id', filter=Q(is_active=True, updated_at__gte=thirty_days_ago)),
+        new_signups=Count('id', filter=Q(created_at__gte=now - timedelta(days=7))),
+    )
+
+    users_by_role = dict(
+        User.objects.filter(is_active=True, role__in=['teacher', 'parent'])
+        .values_list('role').annotate(total=Count('id')).order_by()
+    )
+
+    active_subscription = Q(status='active', end_date__gte=today)
+    subscriptions = TenantSubscription.objects.aggregate(
+        mrr=Sum('amount', filter=active_subscription & Q(billing_cycle='monthly')),
+        yearly_revenue=Sum('amount', filter=active_subscription & Q(billing_cycle='yearly')),
+        trial_schools=Count('id', filter=Q(status='trial')),
+        paid_schools=Count('id', filter=Q(status='active')),
+        sms_quota=Sum('plan__sms_quota', filter=Q(status__in=['trial', 'active'])),
+        storage_quota_gb=Sum('plan__max_storage_gb', filter=Q(status__in=['trial', 'active'])),
+    )
+    mrr = subscriptions['mrr'] or 0
+    arr = (mrr * 12) + (subscriptions['yearly_revenue'] or 0)
+
+    sms_sent = _sms_sent_since(month_start)
+
+    payments = PaymentTransaction.objects.filter(created_at__gte=thirty_days_ago).aggregate(
+        completed=Count('id', filter=Q(status='completed')),
+        failed=Count('id', filter=Q(status='failed')),
+    )
+    settled = payments['completed'] + payments['failed']
+
+    health_samples = SystemHealth.objects.filter(recorded_at__gte=thirty_days_ago).count()
+    latest_health = SystemHealth.objects.first()
+
+    return {
+        **schools,
+        'total_students': Student.objects.filter(is_deleted=False).count(),
+        'total_teachers': users_by_role.get('teacher', 0),
+        'total_parents': users_by_role.get('parent', 0),
+        'mrr': float(mrr),
+        'arr': float(arr),
+        'trial_schools': subscriptions['trial_schools'],
+        'paid_schools': subscriptions['paid_schools'],
+        'sms_sent': sms_sent,
+        'sms_remaining': max((subscriptions['sms_quota'] or 0) - sms_sent, 0),
+        'storage_used': latest_health.storage_used_gb if latest_health else 0.0,
+        'storage_total': float(subscriptions['storage_quota_gb'] or 0),
+        'uptime': _uptime(health_samples, now),
+        'error_rate': latest_health.error_rate if latest_health else 0.0,
+        'payment_success_rate': round(payments['completed'] * 100 / settled, 2) if settled else 100.0,
+    }
+
+
+def _sms_sent_since(since):
+    from apps.communications.models import SMSLog
+
+    return SMSLog.objects.filter(
+        sent_at__gte=since, status__in=['sent', 'delivered']
+    ).count()
+
+
+def _uptime(samples, now):
+    first = SystemHealth.objects.filter(
+        recorded_at__gte=now - timedelta(days=30)
+    ).order_by('recorded_at').values_list('recorded_at', flat=True).first()
+    if not first:
+        return 100.0
+    expected = (now - first).total_seconds() / (HEALTH_INTERVAL_MINUTES * 60) + 1
+    return round(min(samples / expected, 1.0) * 100, 2)
+
+
+def capture_platform_metrics():
+    """Compute, store, cache and broadcast a new snapshot; returns the metrics."""
+    now = timezone.now()
+    metrics = compute_platform_metrics(now)
+    previous = PlatformMetricsSnapshot.objects.values_list('metrics', flat=True).first()
+
+    PlatformMetricsSnapshot.objects.create(captured_at=now, metrics=metrics)
+    prune_snapshots(now)
+    cache.set(CACHE_KEY, {**metrics, 'captured_at': now.isoformat()}, CACHE_TIMEOUT)
+
+    changes = {
+        key: {'value': value, 'delta': _delta(value, (previous or {}).get(key))}
+        for key, value in metrics.items()
+        if previous is None or previous.get(key) != value
+    }
+    if changes:
+        _broadcast(changes, now)
+    return metrics
+
+
+def _last_per(snapshots, trunc):
+    """Ids of the last snapshot in each ``trunc`` (TruncDate/TruncHour) bucket."""
+    return snapshots.annotate(bucket=trunc('captured_at')).values('bucket').annotate(last=Max('id')).values('last')
+
+
+def prune_snapshots(now=None):
+    """Thin snapshots past the detail window to one per day; drop those past retention."""
+    now = now or timezone.now()
+    PlatformMetricsSnapshot.objects.filter(
+        captured_at__lt=now - timedelta(days=settings.PLATFORM_METRICS_RETENTION_DAYS)
+    ).delete()
+    older = PlatformMetricsSnapshot.objects.filter(
+        captured_at__lt=now - timedelta(days=settings.PLATFORM_METRICS_DETAIL_DAYS)
+    )
+    older.exclude(id__in=_last_per(older, TruncDate)).delete()
+
+
+def snapshot_series(days, now=None):
+    """
+    ``(captured_at, metrics)`` over the last ``days`` days, oldest first.
+
+    Windows longer than the detail window return one point per hour (days
+    past it already hold one per day), so a year is about 500 points.
+    """
+    now = now or timezone.now()
+    snapshots = PlatformMetricsSnapshot.objects.filter(captured_at__gte=now - timedelta(days=days))
+    if days > settings.PLATFORM_METRICS_DETAIL_DAYS:
+        snapshots = snapshots.filter(id__in=_last_per(snapshots, TruncHour))
+    return snapshots.order_by('captured_at').values_list('captured_at', 'metrics')
+
+
+def _delta(value, previous):
+    if isinstance(value, (int, float)) and isinstance(previous, (int, float)):
+        return round(value - previous, 4)
+    return None
+
+
+def _broadcast(changes, now):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)('platform_updates', {
+            'type': 'metrics_update',
+            'data': {'captured_at': now.isoformat(), 'changes': changes},
+        })
+    except Exception as e:
+        logger.warning(f"Platform metrics broadcast failed: {e}")
+
+
+def get_platform_metrics():
+    """Cached metrics, falling back to the latest snapshot, then a fresh capture."""
+    metrics = cache.get(CACHE_KEY)
+    if metrics is not None:
+        return metrics
+
+    snapshot = PlatformMetricsSnapshot.objects.first()
+    if snapshot:
+        metrics = {**snapshot.metrics, 'captured_at': snapshot.captured_at.isoformat()}
+        cache.set(CACHE_KEY, metrics, CACHE_TIMEOUT)
+        return metrics
+
+    metrics = capture_platform_metrics()
+    return cache.get(CACHE_KEY) or metrics
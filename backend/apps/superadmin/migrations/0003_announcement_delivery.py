@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_add_current_academic_year'),
+        ('superadmin', '0002_content_paymentgateway_onboardingchecklist_lead_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globalannouncement',
+            name='delivery_stats',
+            field=models.JSONField(blank=True, default=dict, help_text='Totals per channel and tenant status'),
+        ),
+        migrations.CreateModel(
+            name='AnnouncementDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('completed_channels', models.JSONField(default=list, help_text='Channels already delivered, skipped on retry')),
+                ('in_app_count', models.IntegerField(default=0)),
+                ('email_count', models.IntegerField(default=0)),
+                ('sms_count', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('announcement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='superadmin.globalannouncement')),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='announcement_deliveries', to='tenants.tenant')),
+            ],
+            options={
+                'db_table': 'announcement_deliveries',
+                'indexes': [models.Index(fields=['announcement', 'status'], name='announcemen_announc_1f6cc7_idx')],
+                'unique_together': {('announcement', 'tenant')},
+            },
+        ),
+    ]
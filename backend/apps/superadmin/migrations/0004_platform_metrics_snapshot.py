@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('superadmin', '0003_announcement_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformMetricsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('captured_at', models.DateTimeField(db_index=True)),
+                ('metrics', models.JSONField(default=dict)),
+            ],
+            options={
+                'db_table': 'platform_metrics_snapshots',
+                'ordering': ['-captured_at'],
+                'get_latest_by': 'captured_at',
+            },
+        ),
+    ]
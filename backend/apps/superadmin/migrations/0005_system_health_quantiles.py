@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('superadmin', '0004_platform_metrics_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemhealth',
+            name='endpoint_metrics',
+            field=models.JSONField(blank=True, default=list, help_text='Busiest endpoints with latency quantiles'),
+        ),
+        migrations.AddField(
+            model_name='systemhealth',
+            name='response_time_p50',
+            field=models.FloatField(default=0, help_text='Median response time in ms'),
+        ),
+        migrations.AddField(
+            model_name='systemhealth',
+            name='response_time_p99',
+            field=models.FloatField(default=0, help_text='99th percentile response time in ms'),
+        ),
+    ]
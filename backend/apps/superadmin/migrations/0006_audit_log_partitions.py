@@ -0,0 +1,124 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:39
+
+import datetime
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+TABLE = 'superadmin_audit_logs'
+LEGACY = f'{TABLE}_legacy'
+SEQUENCE = f'{TABLE}_id_seq'
+MONTHS_AHEAD = 3
+
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_audit_logs(apps, schema_editor):
+    """
+    Convert superadmin_audit_logs into a table range-partitioned by month on
+    created_at without copying rows: the existing table becomes the
+    ``_legacy`` partition (everything before next month), followed by
+    monthly partitions and a DEFAULT partition. The primary key becomes
+    (id, created_at), as PostgreSQL requires for partitioned tables.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    q = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        if cursor.fetchone()[0] == 'p':
+            return
+
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary",
+            [TABLE]
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid), contype FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('f', 'p')",
+            [TABLE]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+            [TABLE]
+        )
+        identity = cursor.fetchone()[0]
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {q(TABLE)} RENAME TO {q(LEGACY)}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {q(name)} RENAME TO {q(name[:55] + "_legacy")}')
+        for name, _, _ in constraints:
+            cursor.execute(f'ALTER TABLE {q(LEGACY)} DROP CONSTRAINT {q(name)}')
+
+        # Move the id sequence from the old table to the partitioned one
+        if identity:
+            cursor.execute(f'SELECT last_value, is_called FROM {sequence}')
+            last_value, is_called = cursor.fetchone()
+            cursor.execute(f'ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP IDENTITY')
+            cursor.execute(f'CREATE SEQUENCE {q(SEQUENCE)} AS bigint')
+            cursor.execute('SELECT setval(%s, %s, %s)', [SEQUENCE, last_value, is_called])
+            sequence = q(SEQUENCE)
+        else:
+            cursor.execute(f'ALTER TABLE {q(LEGACY)} ALTER COLUMN id DROP DEFAULT')
+
+        cursor.execute(
+            f'CREATE TABLE {q(TABLE)} (LIKE {q(LEGACY)} INCLUDING DEFAULTS INCLUDING STORAGE) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f"ALTER TABLE {q(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)")
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {q(TABLE)}.id')
+        cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(TABLE + "_pkey")} PRIMARY KEY (id, created_at)')
+
+        # A validated CHECK lets ATTACH skip its own full-table scan
+        boundary = _add_months(datetime.date.today(), 1)
+        cursor.execute(
+            f'ALTER TABLE {q(LEGACY)} ADD CONSTRAINT legacy_range CHECK (created_at < %s)',
+            [boundary.isoformat()]
+        )
+        cursor.execute(
+            f"ALTER TABLE {q(TABLE)} ATTACH PARTITION {q(LEGACY)} FOR VALUES FROM (MINVALUE) TO (%s)",
+            [boundary.isoformat()]
+        )
+        cursor.execute(f'ALTER TABLE {q(LEGACY)} DROP CONSTRAINT legacy_range')
+
+        for offset in range(MONTHS_AHEAD + 1):
+            start = _add_months(boundary, offset)
+            cursor.execute(
+                f'CREATE TABLE {q(f"{TABLE}_p{start:%Y%m}")} PARTITION OF {q(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+                [start.isoformat(), _add_months(start, 1).isoformat()]
+            )
+        cursor.execute(f'CREATE TABLE {q(TABLE + "_default")} PARTITION OF {q(TABLE)} DEFAULT')
+
+        # Recreated on the parent under their original names; the legacy
+        # partition's equivalent indexes are attached rather than rebuilt
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition, contype in constraints:
+            if contype == 'f':
+                cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('superadmin', '0005_system_health_quantiles'),
+    ]
+
+    operations = [
+        # Not reversed: the partitioned table serves the same model
+        migrations.RunPython(partition_audit_logs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='superadmin_audit_created_brin'),
+        ),
+    ]
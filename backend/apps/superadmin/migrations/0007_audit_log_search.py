@@ -0,0 +1,106 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+TABLE = 'superadmin_audit_logs'
+FUNCTION = 'superadmin_audit_logs_search_vector'
+TRIGGER = 'superadmin_audit_logs_search_vector_trg'
+BACKFILL_BATCH_SIZE = 10000
+
+# Email is indexed whole and split on '@' and '.', so both
+# "jane.doe@school.org" and "jane" or "school" match
+FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+DECLARE
+    user_email text := '';
+BEGIN
+    IF NEW.user_id IS NOT NULL THEN
+        SELECT coalesce(u.email, '') INTO user_email FROM {users} u WHERE u.id = NEW.user_id;
+    END IF;
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.resource_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(user_email, '') || ' ' || translate(coalesce(user_email, ''), '@.', '  ')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.resource_type, '') || ' ' || coalesce(NEW.action_type, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    """
+    Maintain search_vector in the database so every writer (signals, views,
+    bulk inserts) is covered. A row trigger on the partitioned parent applies
+    to all partitions, including ones created later (PostgreSQL 13+).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    q = connection.ops.quote_name
+    users_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(FUNCTION_SQL.format(function=q(FUNCTION), users=q(users_table)))
+        cursor.execute(f'DROP TRIGGER IF EXISTS {q(TRIGGER)} ON {q(TABLE)}')
+        cursor.execute(
+            f'CREATE TRIGGER {q(TRIGGER)} BEFORE INSERT OR UPDATE ON {q(TABLE)} '
+            f'FOR EACH ROW EXECUTE FUNCTION {q(FUNCTION)}()'
+        )
+
+
+def drop_search_trigger(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {q(TRIGGER)} ON {q(TABLE)}')
+        cursor.execute(f'DROP FUNCTION IF EXISTS {q(FUNCTION)}()')
+
+
+def backfill_search_vector(apps, schema_editor):
+    """Fill existing rows through the trigger, one committed id range at a time."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    q = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(id), max(id) FROM {q(TABLE)}')
+        low, high = cursor.fetchone()
+        if low is None:
+            return
+        for start in range(low, high + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(
+                f'UPDATE {q(TABLE)} SET search_vector = NULL '
+                f'WHERE id >= %s AND id < %s AND search_vector IS NULL',
+                [start, start + BACKFILL_BATCH_SIZE]
+            )
+
+
+class Migration(migrations.Migration):
+
+    # Backfill batches commit as they go instead of one table-wide transaction
+    atomic = False
+
+    dependencies = [
+        ('superadmin', '0006_audit_log_partitions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        # Built after the backfill rather than maintained through it
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='superadmin_audit_search_gin'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:57
+
+from django.db import migrations, models
+
+
+def set_delivery_status(apps, schema_editor):
+    """Published announcements are completed, or partial if a tenant did not finish."""
+    GlobalAnnouncement = apps.get_model('superadmin', 'GlobalAnnouncement')
+    AnnouncementDelivery = apps.get_model('superadmin', 'AnnouncementDelivery')
+    unfinished = AnnouncementDelivery.objects.exclude(status='completed').values('announcement_id')
+    published = GlobalAnnouncement.objects.filter(is_published=True)
+    published.filter(id__in=unfinished).update(delivery_status='partial')
+    published.exclude(id__in=unfinished).update(delivery_status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('superadmin', '0007_audit_log_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcementdelivery',
+            name='progress',
+            field=models.JSONField(blank=True, default=dict, help_text='Per channel, the last user id delivered to; a resumed channel continues after it'),
+        ),
+        migrations.AddField(
+            model_name='globalannouncement',
+            name='delivery_status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('queued', 'Queued'), ('sending', 'Sending'), ('completed', 'Completed'), ('partial', 'Partially Delivered')], default='draft', max_length=20),
+        ),
+        migrations.RunPython(set_delivery_status, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 """
 Superadmin/Platform Owner models.
 """
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.contenttypes.models import ContentType
@@ -212,7 +214,13 @@ class TicketReply(BaseModel):
 
 
 class AuditLog(BaseModel):
-    """Comprehensive audit logging for all actions."""
+    """
+    Comprehensive audit logging for all actions.
+    
+    The table is range-partitioned by month on created_at (primary key
+    ``(id, created_at)``); see apps.superadmin.partitions. ``search_vector``
+    is maintained by a database trigger; see apps.superadmin.audit_search.
+    """
     
     ACTION_TYPES = [
         ('create', 'Create'),
@@ -258,6 +266,9 @@ class AuditLog(BaseModel):
     tenant = models.ForeignKey(Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_logs')
     metadata = models.JSONField(default=dict, help_text="Additional context data")
     
+    # Full-text search (set by trigger from resource, description and user email)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'superadmin_audit_logs'
         ordering = ['-created_at']
@@ -266,6 +277,8 @@ class AuditLog(BaseModel):
             models.Index(fields=['tenant', '-created_at']),
             models.Index(fields=['action_type', '-created_at']),
             models.Index(fields=['resource_type', 'resource_id']),
+            BrinIndex(fields=['created_at'], name='superadmin_audit_created_brin'),
+            GinIndex(fields=['search_vector'], name='superadmin_audit_search_gin'),
         ]
     
     def __str__(self):
@@ -354,7 +367,9 @@ class SystemHealth(BaseModel):
     
     # Performance
     response_time_avg = models.FloatField(help_text="Average API response time in ms")
+    response_time_p50 = models.FloatField(default=0, help_text="Median response time in ms")
     response_time_p95 = models.FloatField(help_text="95th percentile response time")
+    response_time_p99 = models.FloatField(default=0, help_text="99th percentile response time in ms")
     error_rate = models.FloatField(help_text="Error rate percentage")
     
     # Resources
@@ -368,6 +383,7 @@ class SystemHealth(BaseModel):
     api_requests_24h = models.IntegerField()
     background_jobs_queued = models.IntegerField()
     background_jobs_failed = models.IntegerField()
+    endpoint_metrics = models.JSONField(default=list, blank=True, help_text="Busiest endpoints with latency quantiles")
     
     # Timestamp
     recorded_at = models.DateTimeField(auto_now_add=True)
@@ -381,6 +397,21 @@ class SystemHealth(BaseModel):
         return f"Health check at {self.recorded_at}"
 
 
+class PlatformMetricsSnapshot(models.Model):
+    """Periodic snapshot of platform overview metrics (time series)."""
+    
+    captured_at = models.DateTimeField(db_index=True)
+    metrics = models.JSONField(default=dict)
+    
+    class Meta:
+        db_table = 'platform_metrics_snapshots'
+        ordering = ['-captured_at']
+        get_latest_by = 'captured_at'
+    
+    def __str__(self):
+        return f"Platform metrics at {self.captured_at}"
+
+
 class GlobalUser(BaseModel):
     """Platform owner's internal staff users."""
     
@@ -743,9 +774,23 @@ class GlobalAnnouncement(BaseModel):
     published_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     
+    # Delivery progress; moves to 'queued' exactly once per publish
+    delivery_status = models.CharField(
+        max_length=20,
+        choices=[
+            ('draft', 'Draft'),
+            ('queued', 'Queued'),
+            ('sending', 'Sending'),
+            ('completed', 'Completed'),
+            ('partial', 'Partially Delivered'),
+        ],
+        default='draft'
+    )
+    
     # Statistics
     sent_count = models.IntegerField(default=0)
     read_count = models.IntegerField(default=0)
+    delivery_stats = models.JSONField(default=dict, blank=True, help_text="Totals per channel and tenant status")
     
     class Meta:
         db_table = 'global_announcements'
@@ -755,6 +800,49 @@ class GlobalAnnouncement(BaseModel):
         return self.title
 
 
+class AnnouncementDelivery(BaseModel):
+    """Delivery of a global announcement to one tenant."""
+    
+    announcement = models.ForeignKey(GlobalAnnouncement, on_delete=models.CASCADE, related_name='deliveries')
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='announcement_deliveries')
+    
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('in_progress', 'In Progress'),
+            ('completed', 'Completed'),
+            ('failed', 'Failed'),
+        ],
+        default='pending'
+    )
+    completed_channels = models.JSONField(default=list, help_text="Channels already delivered, skipped on retry")
+    progress = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Per channel, the last user id delivered to; a resumed channel continues after it"
+    )
+    
+    # Statistics
+    in_app_count = models.IntegerField(default=0)
+    email_count = models.IntegerField(default=0)
+    sms_count = models.IntegerField(default=0)
+    
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'announcement_deliveries'
+        unique_together = [['announcement', 'tenant']]
+        indexes = [
+            models.Index(fields=['announcement', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.announcement.title} - {self.tenant.name} ({self.status})"
+
+
 class KnowledgeBaseArticle(BaseModel):
     """Knowledge base articles."""
     
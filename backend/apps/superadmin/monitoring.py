@@ -0,0 +1,146 @@
+"""
+Live system monitoring broadcasts.
+
+A single periodic task (``broadcast_monitoring_metrics``) computes the live
+metrics once, diffs them against the previous broadcast and sends only the
+changed values, grouped by topic and numbered with a sequence, to the
+``system_monitoring`` group. Every open SystemMonitoringConsumer filters the
+delta by its subscribed topics; a consumer that sees a gap in the sequence
+(e.g. after the channel layer dropped messages for a slow client) resyncs
+from the full state kept in the cache. Nothing is computed while no
+dashboard is connected.
+"""
+import logging
+import time
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+GROUP_NAME = 'system_monitoring'
+STATE_KEY = 'superadmin:monitoring:state'
+ACTIVE_KEY = 'superadmin:monitoring:active'
+LOCK_KEY = 'superadmin:monitoring:lock'
+STATE_TIMEOUT = 60 * 60
+# Consumers refresh this while connected; the producer idles once it expires
+ACTIVE_TIMEOUT = 90
+CPU_SAMPLE_KEY = 'systemstats:cpu:live'
+
+# Metric keys per topic; 'endpoints' is the per-view breakdown list
+TOPICS = {
+    'latency': ('avg_ms', 'p50_ms', 'p95_ms', 'p99_ms'),
+    'traffic': ('requests_per_minute', 'active_users'),
+    'errors': ('error_rate', 'errors_per_minute'),
+    'resources': ('cpu_usage', 'memory_usage'),
+    'jobs': ('background_jobs_queued', 'background_jobs_failed_24h'),
+    'endpoints': None,
+}
+# Event-driven topics, pushed by their producers rather than diffed here
+EVENT_TOPICS = ('health', 'audit')
+ALL_TOPICS = tuple(TOPICS) + EVENT_TOPICS
+
+
+def celery_queue_length():
+    """Messages waiting on the default Celery queue (Redis broker)."""
+    try:
+        return redis.Redis.from_url(settings.CELERY_BROKER_URL).llen('celery')
+    except redis.RedisError:
+        return 0
+
+
+def collect_live_metrics(now=None):
+    """Compute the live metrics, grouped by topic."""
+    from apps.core import request_metrics, system_stats
+
+    now = now or time.time()
+    histograms = request_metrics.read_histograms(minutes=2, now=now)
+    total = histograms[request_metrics.TOTAL].summary()
+    # The window is the previous full minute plus the current partial one
+    window_minutes = (60 + now % 60) / 60
+
+    return {
+        'latency': {key: total[key] for key in TOPICS['latency']},
+        'traffic': {
+            'requests_per_minute': round(total['requests'] / window_minutes, 1),
+            'active_users': request_metrics.read_active_users(minutes=15, now=now),
+        },
+        'errors': {
+            'error_rate': total['error_rate'],
+            'errors_per_minute': round(total['errors'] / window_minutes, 1),
+        },
+        'resources': {
+            'cpu_usage': system_stats.cpu_usage(CPU_SAMPLE_KEY),
+            'memory_usage': system_stats.memory_usage(),
+        },
+        'jobs': {
+            'background_jobs_queued': celery_queue_length(),
+            'background_jobs_failed_24h': request_metrics.read_task_failures(hours=24, now=now),
+        },
+        'endpoints': request_metrics.endpoint_breakdown(histograms),
+    }
+
+
+def diff_metrics(previous, current):
+    """Changed values per topic (whole list for 'endpoints')."""
+    delta = {}
+    for topic, values in current.items():
+        before = previous.get(topic)
+        if TOPICS[topic] is None:
+            if values != before:
+                delta[topic] = values
+            continue
+        before = before or {}
+        changed = {key: value for key, value in values.items() if before.get(key) != value}
+        if changed:
+            delta[topic] = changed
+    return delta
+
+
+def get_state():
+    """``{'seq': n, 'metrics': {...}}`` of the last broadcast, or None."""
+    return cache.get(STATE_KEY)
+
+
+def mark_active():
+    cache.set(ACTIVE_KEY, 1, ACTIVE_TIMEOUT)
+
+
+def broadcast_metrics():
+    """
+    Compute once and send the delta to every monitoring client.
+
+    Returns the number of changed topics, or None when skipped (no
+    dashboard connected or another run in progress).
+    """
+    if not cache.get(ACTIVE_KEY):
+        return None
+    if not cache.add(LOCK_KEY, 1, timeout=30):
+        return None
+    try:
+        state = get_state() or {'seq': 0, 'metrics': {}}
+        metrics = collect_live_metrics()
+        delta = diff_metrics(state['metrics'], metrics)
+        if not delta:
+            return 0
+
+        seq = state['seq'] + 1
+        cache.set(STATE_KEY, {'seq': seq, 'metrics': metrics}, STATE_TIMEOUT)
+        publish({'type': 'monitoring_delta', 'seq': seq, 'topics': delta})
+        return len(delta)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def publish(message):
+    """Best-effort group send to the monitoring group."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(GROUP_NAME, message)
+    except Exception as e:
+        logger.warning(f"Monitoring broadcast failed: {e}")
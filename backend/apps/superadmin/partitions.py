@@ -0,0 +1,192 @@
+"""
+Monthly range partitions of the superadmin audit log.
+
+``superadmin_audit_logs`` is partitioned by ``created_at`` (migration 0006):
+one ``superadmin_audit_logs_pYYYYMM`` partition per month, the pre-partitioning
+rows in ``superadmin_audit_logs_legacy`` and a DEFAULT partition that only
+catches rows if maintenance ever falls behind. ``maintain_audit_log_partitions``
+keeps partitions created ahead of time and enforces retention by detaching
+and dropping whole months, optionally writing each month to a gzipped CSV
+file in the private backup storage first, so retention never runs a large
+DELETE.
+"""
+import gzip
+import logging
+import re
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.core.files import File
+from django.db import DatabaseError, connection, transaction
+
+from .backups import HashingWriter, backup_storage
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'superadmin_audit_logs'
+LEGACY_PARTITION = f'{PARENT_TABLE}_legacy'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+ARCHIVE_DIR = 'audit-archive'
+# Rows deleted per statement when trimming a partition that straddles the cutoff
+TRIM_BATCH_SIZE = 5000
+
+PARTITIONS_SQL = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = %s::regclass
+    ORDER BY c.relname
+"""
+_UPPER_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def _q(name):
+    return connection.ops.quote_name(name)
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", [PARENT_TABLE])
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions():
+    """``[(name, upper_bound or None), ...]``; None for DEFAULT or unbounded partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [PARENT_TABLE])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _UPPER_BOUND_RE.search(bound or '')
+        upper = datetime.fromisoformat(match.group(1)) if match else None
+        if upper is not None and upper.tzinfo is None:
+            upper = upper.replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, upper))
+    return partitions
+
+
+def _create_partition(cursor, name, start, end, has_default):
+    bounds = [start.isoformat(), end.isoformat()]
+    in_default = False
+    if has_default:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {_q(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s)',
+            bounds
+        )
+        in_default = cursor.fetchone()[0]
+    if in_default:
+        # A new range may not overlap rows already in DEFAULT: take DEFAULT out,
+        # create the month, move its rows over and put DEFAULT back
+        cursor.execute(f'ALTER TABLE {_q(PARENT_TABLE)} DETACH PARTITION {_q(DEFAULT_PARTITION)}')
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {_q(name)} PARTITION OF {_q(PARENT_TABLE)} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        bounds
+    )
+    if in_default:
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {_q(DEFAULT_PARTITION)} '
+            f'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO {_q(name)} SELECT * FROM moved',
+            bounds
+        )
+        logger.warning(f"Moved {cursor.rowcount} audit log rows from {DEFAULT_PARTITION} to {name}")
+        cursor.execute(f'ALTER TABLE {_q(PARENT_TABLE)} ATTACH PARTITION {_q(DEFAULT_PARTITION)} DEFAULT')
+
+
+def ensure_partitions(today, months_ahead):
+    """
+    Create monthly partitions from this month through ``months_ahead`` months
+    out, moving any rows the DEFAULT partition caught for a month into it. A
+    month that cannot be created is logged and skipped.
+    """
+    created = []
+    existing = {name for name, _ in list_partitions()}
+    has_default = DEFAULT_PARTITION in existing
+    for offset in range(months_ahead + 1):
+        start = add_months(month_start(today), offset)
+        name = partition_name(start)
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                _create_partition(cursor, name, start, add_months(start, 1), has_default)
+        except DatabaseError as e:
+            logger.error(f"Failed to create audit log partition {name}: {e}")
+            continue
+        created.append(name)
+    return created
+
+
+def archive_partition(name):
+    """Write a partition to ``audit-archive/<name>.csv.gz`` in backup storage; returns (path, sha256, bytes)."""
+    with tempfile.TemporaryFile() as raw:
+        writer = HashingWriter(raw)
+        with gzip.GzipFile(fileobj=writer, mode='wb', mtime=0) as compressed:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(f'COPY {_q(name)} TO STDOUT WITH (FORMAT csv, HEADER true)', compressed)
+        raw.seek(0)
+        path = backup_storage().save(f'{ARCHIVE_DIR}/{name}.csv.gz', File(raw))
+    return path, writer.sha256.hexdigest(), writer.size
+
+
+def drop_partition(name, archive=False):
+    """Optionally archive, then detach and drop one partition."""
+    archived = archive_partition(name) if archive else None
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {_q(PARENT_TABLE)} DETACH PARTITION {_q(name)}')
+            cursor.execute(f'DROP TABLE {_q(name)}')
+    return archived
+
+
+def trim_partition(name, cutoff, max_batches):
+    """Delete rows older than ``cutoff`` from a partition that straddles it, in small batches."""
+    deleted = 0
+    with connection.cursor() as cursor:
+        for _ in range(max_batches):
+            cursor.execute(
+                f'DELETE FROM {_q(name)} WHERE ctid = ANY(ARRAY('
+                f'SELECT ctid FROM {_q(name)} WHERE created_at < %s LIMIT %s))',
+                [cutoff, TRIM_BATCH_SIZE]
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < TRIM_BATCH_SIZE:
+                break
+    return deleted
+
+
+def apply_retention(cutoff, archive=False, max_trim_batches=100):
+    """
+    Drop partitions wholly older than ``cutoff`` and trim the one that
+    straddles it (only the legacy partition can). Returns a summary.
+    """
+    summary = {'dropped': [], 'archived': [], 'trimmed_rows': 0}
+    for name, upper in list_partitions():
+        if upper is None:
+            continue
+        if upper <= cutoff:
+            archived = drop_partition(name, archive=archive)
+            logger.info(f"Dropped audit log partition {name} (rows before {upper:%Y-%m-%d})")
+            summary['dropped'].append(name)
+            if archived:
+                summary['archived'].append(archived[0])
+        elif name == LEGACY_PARTITION:
+            summary['trimmed_rows'] += trim_partition(name, cutoff, max_trim_batches)
+    return summary
@@ -0,0 +1,418 @@
+"""
+Tenant restore from backup archives (see apps.superadmin.backups).
+
+The archive is copied from storage to a local file and checked against the
+SHA-256 recorded on the Backup. Everything then loads in one transaction
+with constraints deferred, so dependency cycles and forward references
+resolve at commit:
+
+* ``replace`` - the tenant's current rows are deleted and each table member
+  is streamed straight into its table with ``COPY FROM STDIN``, keeping the
+  original keys. Incremental backups replace just the rows they contain.
+* ``remap`` - for restoring alongside other tenants whose keys may collide:
+  every table is COPYed into a temporary staging table, new keys are drawn
+  from the tables' sequences into mapping tables, and one
+  ``INSERT ... SELECT`` per table writes the rows with primary and foreign
+  keys translated.
+
+Platform-owned models (backups.EXCLUDED_MODELS) are never deleted or loaded,
+even from archives that contain them; nullable references they hold to
+tenant rows that a replace restore removed for good are cleared.
+
+Each member's SHA-256 and row count are verified as it loads. Secondary
+indexes of tables that start out empty (a fresh database) are dropped
+before loading and rebuilt afterwards; every loaded table is analyzed.
+Media files are written to storage once the transaction has committed.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import shutil
+import tarfile
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from .backups import (
+    EXCLUDED_MODELS, FORMAT_VERSION, MANIFEST_NAME, HashingReader, backup_storage, dependency_order, tenant_scopes,
+)
+
+logger = logging.getLogger(__name__)
+
+RESTORE_MODES = ('replace', 'remap')
+# Below this many rows, keeping indexes is cheaper than rebuilding them
+REBUILD_INDEX_MIN_ROWS = 10000
+COPY_READ_SIZE = 1024 * 1024
+
+SECONDARY_INDEXES_SQL = """
+    SELECT i.relname, pg_get_indexdef(i.oid)
+    FROM pg_index x
+    JOIN pg_class i ON i.oid = x.indexrelid
+    WHERE x.indrelid = %s::regclass
+      AND NOT x.indisprimary
+      AND NOT x.indisunique
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)
+"""
+
+
+class RestoreError(Exception):
+    """Raised when an archive cannot be restored into this database."""
+
+
+def _q(name):
+    return connection.ops.quote_name(name)
+
+
+# ============================================================================
+# Archive
+# ============================================================================
+
+def fetch_archive(backup, fileobj):
+    """Copy the backup archive into ``fileobj``, verifying its SHA-256."""
+    expected = (backup.metadata or {}).get('sha256')
+    if not backup.file_path or not expected:
+        raise RestoreError('Backup has no archive checksum; it was not created by the backup engine')
+
+    digest = hashlib.sha256()
+    with backup_storage().open(backup.file_path, 'rb') as source:
+        for block in iter(lambda: source.read(COPY_READ_SIZE), b''):
+            digest.update(block)
+            fileobj.write(block)
+    fileobj.seek(0)
+    if digest.hexdigest() != expected:
+        raise RestoreError(f'Archive checksum mismatch for backup {backup.id}')
+
+
+def read_manifest(archive):
+    manifest = json.load(archive.extractfile(MANIFEST_NAME))
+    if manifest.get('format') != FORMAT_VERSION:
+        raise RestoreError(f"Unsupported backup format {manifest.get('format')}")
+    return manifest
+
+
+def check_compatibility(manifest):
+    """
+    Resolve manifest tables to models; raise if the backup was taken on a
+    newer schema or has columns this schema no longer has.
+    """
+    applied = {}
+    for app_label, name in MigrationRecorder(connection).applied_migrations():
+        applied[app_label] = max(applied.get(app_label, ''), name)
+    newer = [
+        f'{app_label}.{name}' for app_label, name in manifest.get('schema', {}).items()
+        if name > applied.get(app_label, '')
+    ]
+    if newer:
+        raise RestoreError(f"Backup needs migrations not applied here: {', '.join(sorted(newer))}")
+
+    models = {}
+    for table in manifest['tables']:
+        try:
+            model = apps.get_model(table['model'])
+        except LookupError:
+            raise RestoreError(f"Unknown model in backup: {table['model']}")
+        current = {field.column for field in model._meta.concrete_fields}
+        missing = [column for column in table['columns'] if column not in current]
+        if missing:
+            raise RestoreError(f"{table['model']}: columns no longer exist: {', '.join(missing)}")
+        models[table['model']] = model
+    return models
+
+
+class _RowCountingReader:
+    """COPY text input wrapper; every row ends in a newline (embedded ones are escaped)."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.rows = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.rows += data.count(b'\n')
+        return data
+
+
+def _copy_member(cursor, archive, member, target, columns):
+    """Stream one gzip COPY member into ``target``, verifying checksum and row count."""
+    reader = HashingReader(archive.extractfile(member['name']))
+    with gzip.GzipFile(fileobj=reader, mode='rb') as decompressed:
+        rows = _RowCountingReader(decompressed)
+        cursor.copy_expert(
+            f"COPY {target} ({', '.join(_q(column) for column in columns)}) FROM STDIN",
+            rows, size=COPY_READ_SIZE,
+        )
+    while reader.read(COPY_READ_SIZE):
+        pass
+    if reader.sha256.hexdigest() != member['sha256']:
+        raise RestoreError(f"Checksum mismatch in {member['name']}")
+    if rows.rows != member['rows']:
+        raise RestoreError(f"{member['name']}: expected {member['rows']} rows, read {rows.rows}")
+    return rows.rows
+
+
+# ============================================================================
+# Loading
+# ============================================================================
+
+def _table_is_empty(cursor, table):
+    cursor.execute(f'SELECT NOT EXISTS (SELECT 1 FROM {_q(table)})')
+    return cursor.fetchone()[0]
+
+
+def _drop_secondary_indexes(cursor, table):
+    """Drop non-unique indexes of ``table``; returns their definitions."""
+    cursor.execute(SECONDARY_INDEXES_SQL, [_q(table)])
+    indexes = cursor.fetchall()
+    for name, _ in indexes:
+        cursor.execute(f'DROP INDEX {_q(name)}')
+    return [definition for _, definition in indexes]
+
+
+def _reset_sequence(cursor, model):
+    """Move the pk sequence past restored keys (a fresh database starts at 1)."""
+    table, pk = model._meta.db_table, model._meta.pk.column
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [_q(table), pk])
+    sequence = cursor.fetchone()[0]
+    if sequence:
+        cursor.execute(
+            f'SELECT setval(%s, GREATEST((SELECT COALESCE(MAX({_q(pk)}), 1) FROM {_q(table)}), '
+            f'(SELECT last_value FROM {sequence})))',
+            [sequence]
+        )
+
+
+def _kept_references(scopes):
+    """``(model, field)`` for nullable FKs from rows a restore keeps to tenant-scoped rows."""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        if model._meta.app_config.name.startswith('apps.') and model._meta.managed and model not in scopes
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.null and field.related_model in scopes
+    ]
+
+
+def _delete_tenant_rows(cursor, tenant_id):
+    """
+    Delete every row currently scoped to the tenant, children first.
+
+    Returns the number of rows deleted and ``{model: temp table}`` of the
+    deleted keys of models that kept rows may reference.
+    """
+    scopes = tenant_scopes()
+    referenced = {field.related_model for _, field in _kept_references(scopes)}
+    deleted = 0
+    removed = {}
+    for index, model in enumerate(reversed(dependency_order(scopes))):
+        subquery, params = (
+            model._base_manager.filter(**{scopes[model]: tenant_id}).order_by()
+            .values('pk').query.sql_with_params()
+        )
+        table, pk = _q(model._meta.db_table), _q(model._meta.pk.column)
+        if model in referenced:
+            removed[model] = f'restore_removed_{index}'
+            cursor.execute(
+                f'CREATE TEMP TABLE {removed[model]} ON COMMIT DROP AS '
+                f'SELECT {pk} AS pk FROM {table} WHERE {pk} IN ({subquery})', params
+            )
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({subquery})', params)
+        deleted += cursor.rowcount
+    return deleted, removed
+
+
+def _clear_kept_references(cursor, removed):
+    """Null references from kept rows to deleted tenant rows the backup did not bring back."""
+    for model, field in _kept_references(tenant_scopes()):
+        if field.related_model not in removed:
+            continue
+        target = field.related_model
+        column = _q(field.column)
+        cursor.execute(
+            f'UPDATE {_q(model._meta.db_table)} k SET {column} = NULL '
+            f'WHERE k.{column} IN (SELECT pk FROM {removed[target]}) '
+            f'AND NOT EXISTS (SELECT 1 FROM {_q(target._meta.db_table)} t '
+            f'WHERE t.{_q(target._meta.pk.column)} = k.{column})'
+        )
+
+
+def _load_in_place(cursor, archive, manifest, models, incremental):
+    """Replace mode: COPY each table directly (or via staging for incremental backups)."""
+    loaded = {}
+    rebuild = []
+    for index, table in enumerate(manifest['tables']):
+        if not table['rows']:
+            continue
+        model = models[table['model']]
+        name = _q(model._meta.db_table)
+        if incremental:
+            stage = f'restore_stage_{index}'
+            cursor.execute(f'CREATE TEMP TABLE {stage} (LIKE {name}) ON COMMIT DROP')
+            rows = sum(_copy_member(cursor, archive, member, stage, table['columns']) for member in table['members'])
+            pk = _q(model._meta.pk.column)
+            columns = ', '.join(_q(column) for column in table['columns'])
+            cursor.execute(f'DELETE FROM {name} WHERE {pk} IN (SELECT {pk} FROM {stage})')
+            cursor.execute(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {stage}')
+        else:
+            if table['rows'] >= REBUILD_INDEX_MIN_ROWS and _table_is_empty(cursor, model._meta.db_table):
+                rebuild += _drop_secondary_indexes(cursor, model._meta.db_table)
+            rows = sum(_copy_member(cursor, archive, member, name, table['columns']) for member in table['members'])
+        loaded[table['model']] = rows
+        _reset_sequence(cursor, model)
+    return loaded, rebuild
+
+
+def _apply_overrides(cursor, stage, overrides):
+    from apps.tenants.models import Tenant
+
+    columns = {field.name: field.column for field in Tenant._meta.concrete_fields if not field.primary_key}
+    unknown = [name for name in overrides if name not in columns]
+    if unknown:
+        raise RestoreError(f"Unknown tenant fields: {', '.join(unknown)}")
+    assignments = ', '.join(f'{_q(columns[name])} = %s' for name in overrides)
+    cursor.execute(f'UPDATE {stage} SET {assignments}', list(overrides.values()))
+
+
+def _load_remapped(cursor, archive, manifest, models, tenant_overrides):
+    """Remap mode: stage every table, allocate new keys, then insert translated rows."""
+    tables = [table for table in manifest['tables'] if table['rows']]
+    stages = {}
+    for index, table in enumerate(tables):
+        model = models[table['model']]
+        stage, mapping = f'restore_stage_{index}', f'restore_map_{index}'
+        cursor.execute(f'CREATE TEMP TABLE {stage} (LIKE {_q(model._meta.db_table)}) ON COMMIT DROP')
+        for member in table['members']:
+            _copy_member(cursor, archive, member, stage, table['columns'])
+        pk = _q(model._meta.pk.column)
+        cursor.execute(
+            f'CREATE TEMP TABLE {mapping} (old_id bigint PRIMARY KEY, new_id bigint NOT NULL) ON COMMIT DROP'
+        )
+        cursor.execute(
+            f'INSERT INTO {mapping} SELECT {pk}, nextval(pg_get_serial_sequence(%s, %s)) FROM {stage}',
+            [_q(model._meta.db_table), model._meta.pk.column]
+        )
+        stages[table['model']] = (stage, mapping)
+        if table['model'] == 'tenants.tenant' and tenant_overrides:
+            _apply_overrides(cursor, stage, tenant_overrides)
+
+    loaded = {}
+    for table in tables:
+        model = models[table['model']]
+        stage, mapping = stages[table['model']]
+        foreign = {
+            field.column: stages[field.related_model._meta.label_lower][1]
+            for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model._meta.label_lower in stages
+        }
+        selects, joins = [], [f'JOIN {mapping} m_pk ON m_pk.old_id = s.{_q(model._meta.pk.column)}']
+        for position, column in enumerate(table['columns']):
+            if column == model._meta.pk.column:
+                selects.append('m_pk.new_id')
+            elif column in foreign:
+                alias = f'm_{position}'
+                joins.append(f'LEFT JOIN {foreign[column]} {alias} ON {alias}.old_id = s.{_q(column)}')
+                selects.append(f'{alias}.new_id')
+            else:
+                selects.append(f's.{_q(column)}')
+        cursor.execute(
+            f"INSERT INTO {_q(model._meta.db_table)} ({', '.join(_q(column) for column in table['columns'])}) "
+            f"SELECT {', '.join(selects)} FROM {stage} s {' '.join(joins)}"
+        )
+        loaded[table['model']] = cursor.rowcount
+
+    tenant_stage = stages.get('tenants.tenant')
+    if tenant_stage is None:
+        raise RestoreError('Backup has no tenant row to remap')
+    cursor.execute(f'SELECT new_id FROM {tenant_stage[1]}')
+    return loaded, cursor.fetchone()[0]
+
+
+# ============================================================================
+# Entry point
+# ============================================================================
+
+def _restore_media(archive, manifest):
+    restored = 0
+    for entry in manifest.get('media', []):
+        name = entry['name']
+        if default_storage.exists(name):
+            if default_storage.size(name) == entry['bytes']:
+                continue
+            default_storage.delete(name)
+        reader = HashingReader(archive.extractfile(f'media/{name}'))
+        with tempfile.TemporaryFile() as data:
+            shutil.copyfileobj(reader, data, COPY_READ_SIZE)
+            if reader.sha256.hexdigest() != entry['sha256']:
+                raise RestoreError(f'Checksum mismatch in media/{name}')
+            data.seek(0)
+            default_storage.save(name, File(data))
+        restored += 1
+    return restored
+
+
+def restore_backup(backup, mode='replace', tenant_overrides=None):
+    """
+    Restore ``backup`` into this database; returns a summary with the
+    restored tenant id, per-table row counts and timing.
+    """
+    if mode not in RESTORE_MODES:
+        raise RestoreError(f'Unknown restore mode: {mode}')
+    if connection.vendor != 'postgresql':
+        raise RestoreError('Restores require PostgreSQL')
+    incremental = backup.backup_type == 'incremental'
+    if incremental and mode == 'remap':
+        raise RestoreError('Incremental backups can only be restored in place over their base backup')
+
+    started = time.monotonic()
+    with tempfile.TemporaryFile() as local:
+        fetch_archive(backup, local)
+        with tarfile.open(fileobj=local, mode='r:') as archive:
+            manifest = read_manifest(archive)
+            models = check_compatibility(manifest)
+            # Archives taken before a model became platform-owned still carry it
+            manifest['tables'] = [
+                table for table in manifest['tables']
+                if models[table['model']]._meta.label not in EXCLUDED_MODELS
+            ]
+            tenant_id = manifest['tenant_id']
+            deleted = 0
+
+            if manifest['tables']:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+                        if mode == 'remap':
+                            loaded, tenant_id = _load_remapped(cursor, archive, manifest, models, tenant_overrides)
+                            rebuild = []
+                        else:
+                            removed = {}
+                            if not incremental:
+                                deleted, removed = _delete_tenant_rows(cursor, tenant_id)
+                            loaded, rebuild = _load_in_place(cursor, archive, manifest, models, incremental)
+                            _clear_kept_references(cursor, removed)
+
+                        for definition in rebuild:
+                            cursor.execute(definition)
+                        for label in loaded:
+                            cursor.execute(f'ANALYZE {_q(models[label]._meta.db_table)}')
+                        # Surface FK violations here rather than as a bare commit failure
+                        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            else:
+                loaded = {}
+
+            media = _restore_media(archive, manifest)
+
+    return {
+        'mode': mode,
+        'tenant_id': tenant_id,
+        'rows': sum(loaded.values()),
+        'tables': loaded,
+        'deleted_rows': deleted,
+        'media_files': media,
+        'seconds': round(time.monotonic() - started, 1),
+    }
@@ -185,7 +185,8 @@ class SystemHealthSerializer(serializers.ModelSerializer):
     class Meta:
         model = SystemHealth
         fields = [
-            'id', 'response_time_avg', 'response_time_p95', 'error_rate',
+            'id', 'response_time_avg', 'response_time_p50', 'response_time_p95',
+            'response_time_p99', 'error_rate',
             'cpu_usage', 'memory_usage', 'storage_used_gb', 'storage_total_gb',
             'active_users', 'api_requests_24h', 'background_jobs_queued',
             'background_jobs_failed', 'recorded_at', 'created_at', 'updated_at'
@@ -213,4 +214,5 @@ class PlatformMetricsSerializer(serializers.Serializer):
     error_rate = serializers.FloatField()
     new_signups = serializers.IntegerField()
     payment_success_rate = serializers.FloatField()
+    captured_at = serializers.DateTimeField(required=False)
 
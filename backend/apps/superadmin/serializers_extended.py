@@ -184,10 +184,13 @@ class GlobalAnnouncementSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'message', 'target_tenants', 'target_roles',
             'send_email', 'send_sms', 'send_in_app', 'is_published',
-            'published_at', 'expires_at', 'sent_count', 'read_count',
+            'published_at', 'expires_at', 'delivery_status', 'sent_count', 'read_count', 'delivery_stats',
             'target_tenants_count', 'created_at', 'updated_at'
         ]
-        read_only_fields = ('id', 'published_at', 'sent_count', 'read_count', 'created_at', 'updated_at')
+        read_only_fields = (
+            'id', 'published_at', 'delivery_status', 'sent_count', 'read_count', 'delivery_stats',
+            'created_at', 'updated_at'
+        )
     
     def get_target_tenants_count(self, obj):
         return obj.target_tenants.count()
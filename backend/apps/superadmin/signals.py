@@ -1,23 +1,13 @@
 """
 Signals for automatic audit logging.
 """
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
 from apps.core.middleware import get_current_request
-from .models import AuditLog
-
-
-def get_client_ip(request):
-    """Get client IP address from request."""
-    if not request:
-        return None
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+from apps.core.utils import get_client_ip
+from . import api_keys, feature_flags
+from .models import AuditLog, APIKey, FeatureFlag, TenantSubscription
 
 
 def log_action(request, action_type, instance, changes=None, description=''):
@@ -27,6 +17,11 @@ def log_action(request, action_type, instance, changes=None, description=''):
     
     user = request.user
     impersonated_by = getattr(request, 'impersonated_by', None)
+    metadata = {}
+    if isinstance(user, api_keys.APIKeyUser):
+        # No user account behind an API key request; record the key instead
+        metadata = {'api_key_id': user.api_key.id, 'api_key_name': user.api_key.name}
+        user = None
     
     # Get resource info
     resource_type = instance.__class__.__name__
@@ -55,6 +50,7 @@ def log_action(request, action_type, instance, changes=None, description=''):
             changes=changes or {},
             description=description,
             tenant=tenant,
+            metadata=metadata,
         )
     except Exception as e:
         # Silently fail to avoid breaking the main operation
@@ -137,3 +133,25 @@ def log_delete(sender, instance, **kwargs):
     except Exception:
         pass
 
+
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+@receiver(post_save, sender=TenantSubscription)
+@receiver(post_delete, sender=TenantSubscription)
+def invalidate_feature_flags(sender, **kwargs):
+    """Flags and plan membership feed the feature flag snapshot."""
+    feature_flags.invalidate()
+
+
+@receiver(m2m_changed, sender=FeatureFlag.enabled_tenants.through)
+@receiver(m2m_changed, sender=FeatureFlag.enabled_plans.through)
+def invalidate_feature_flag_targeting(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        feature_flags.invalidate()
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def evict_api_key(sender, instance, **kwargs):
+    """Drop the key from this process's lookup cache; others expire it by TTL."""
+    api_keys.key_cache.evict(instance.pk)
@@ -1,42 +1,88 @@
 """
 Celery tasks for Platform Owner operations.
 """
-from celery import shared_task
+import logging
+
+from celery import chord, shared_task
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 from .models import (
     SystemHealth, Backup, Tenant, TenantSubscription,
-    Invoice, GlobalAnnouncement
+    Invoice, GlobalAnnouncement, AnnouncementDelivery
 )
 from .business_logic import automate_onboarding_progress
+from apps.core.sequences import next_number
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def record_system_health():
     """Record system health metrics (runs every 5 minutes)."""
-    # TODO: Implement actual system metrics collection
-    # This is a placeholder - in production, collect real metrics
+    import redis
+    from apps.core import request_metrics, system_stats
+    from . import monitoring
+    
+    try:
+        histograms = request_metrics.read_histograms(minutes=5)
+        requests_24h, _ = request_metrics.read_request_totals(hours=24)
+        active_users = request_metrics.read_active_users(minutes=15)
+        jobs_failed = request_metrics.read_task_failures(hours=24)
+    except redis.RedisError as e:
+        # Request metrics live in Redis; still record the host metrics
+        logger.warning(f"Request metrics unavailable for health record: {e}")
+        histograms = {request_metrics.TOTAL: request_metrics.Histogram()}
+        requests_24h = active_users = jobs_failed = 0
+    latency = histograms[request_metrics.TOTAL].summary()
+    endpoints = request_metrics.endpoint_breakdown(histograms)
+    storage_used, storage_total = system_stats.storage_usage()
     
     health = SystemHealth.objects.create(
-        response_time_avg=150.0,  # ms
-        response_time_p95=300.0,
-        error_rate=0.5,  # percentage
-        cpu_usage=45.0,
-        memory_usage=60.0,
-        storage_used_gb=450.0,
-        storage_total_gb=1000.0,
-        active_users=1250,
-        api_requests_24h=50000,
-        background_jobs_queued=10,
-        background_jobs_failed=2,
+        response_time_avg=latency['avg_ms'],
+        response_time_p50=latency['p50_ms'],
+        response_time_p95=latency['p95_ms'],
+        response_time_p99=latency['p99_ms'],
+        error_rate=latency['error_rate'],
+        cpu_usage=system_stats.cpu_usage(),
+        memory_usage=system_stats.memory_usage(),
+        storage_used_gb=storage_used,
+        storage_total_gb=storage_total,
+        active_users=active_users,
+        api_requests_24h=requests_24h,
+        background_jobs_queued=monitoring.celery_queue_length(),
+        background_jobs_failed=jobs_failed,
+        endpoint_metrics=endpoints,
     )
     
+    from .consumers import health_payload
+    monitoring.publish({'type': 'system_health_update', 'data': health_payload(health)})
+    
     return f"Health recorded: {health.id}"
 
 
+@shared_task
+def broadcast_monitoring_metrics():
+    """Push live metric deltas to open monitoring dashboards (runs every 10 seconds)."""
+    from .monitoring import broadcast_metrics
+    
+    changed = broadcast_metrics()
+    return 'idle' if changed is None else f"Broadcast {changed} changed topics"
+
+
+@shared_task
+def capture_platform_metrics():
+    """Snapshot platform overview metrics (runs every 5 minutes)."""
+    from .metrics import capture_platform_metrics as capture
+    
+    metrics = capture()
+    return f"Platform metrics captured: {metrics['total_schools']} schools"
+
+
 @shared_task
 def create_tenant_backup(backup_id):
-    """Create backup for a tenant."""
+    """Create backup for a tenant (see apps.superadmin.backups)."""
+    from .backups import create_backup
     from .models import Backup
     
     backup = Backup.objects.get(id=backup_id)
@@ -45,20 +91,12 @@ def create_tenant_backup(backup_id):
     backup.save()
     
     try:
-        tenant = backup.tenant
-        
-        # TODO: Implement actual backup logic
-        # - Backup database records for tenant
-        # - Backup uploaded files
-        # - Compress and store
-        
+        create_backup(backup)
         backup.status = 'completed'
         backup.completed_at = timezone.now()
-        backup.file_path = f"backups/{tenant.id}/{backup.id}.tar.gz"
-        backup.file_size_mb = 125.5  # Placeholder
         backup.save()
         
-        return f"Backup completed: {backup.id}"
+        return f"Backup completed: {backup.id} ({backup.file_size_mb} MB)"
     except Exception as e:
         backup.status = 'failed'
         backup.error_message = str(e)
@@ -66,6 +104,54 @@ def create_tenant_backup(backup_id):
         raise
 
 
+@shared_task
+def restore_tenant_backup(backup_id, mode='replace', tenant_overrides=None, requested_by=None):
+    """Restore a tenant from a backup archive (see apps.superadmin.restores)."""
+    from django.core.cache import cache
+    from .models import AuditLog, Backup
+    from .restores import restore_backup
+    
+    backup = Backup.objects.get(id=backup_id)
+    lock_key = f"superadmin:restore:{backup.tenant_id}"
+    if not cache.add(lock_key, backup_id, timeout=6 * 60 * 60):
+        return f"Restore already running for tenant {backup.tenant_id}"
+    
+    started_at = timezone.now()
+    try:
+        summary = restore_backup(backup, mode=mode, tenant_overrides=tenant_overrides)
+    except Exception as e:
+        _record_restore(backup_id, {
+            'status': 'failed', 'mode': mode, 'started_at': started_at.isoformat(), 'error': str(e),
+        })
+        raise
+    finally:
+        cache.delete(lock_key)
+    
+    _record_restore(backup_id, {
+        **summary, 'status': 'completed', 'started_at': started_at.isoformat(),
+        'completed_at': timezone.now().isoformat(),
+    })
+    AuditLog.objects.create(
+        user_id=requested_by,
+        action_type='import',
+        resource_type='Backup',
+        resource_id=backup_id,
+        resource_name=str(backup),
+        description=f"Backup restored ({mode}): {summary['rows']} rows into tenant {summary['tenant_id']}",
+        tenant_id=summary['tenant_id'],
+    )
+    return f"Restored backup {backup_id}: {summary['rows']} rows into tenant {summary['tenant_id']}"
+
+
+def _record_restore(backup_id, result):
+    from .models import Backup
+    
+    # Re-read: a replace restore may have rewritten this tenant's rows
+    backup = Backup.objects.get(id=backup_id)
+    backup.metadata = {**backup.metadata, 'last_restore': result}
+    backup.save(update_fields=['metadata', 'updated_at'])
+
+
 @shared_task
 def generate_invoices_for_renewals():
     """Generate invoices for upcoming renewals."""
@@ -78,12 +164,15 @@ def generate_invoices_for_renewals():
         next_billing_date__gte=today,
         next_billing_date__lte=next_week,
         auto_renew=True
-    )
+    ).exclude(
+        # Already invoiced for this billing date
+        invoices__due_date=F('next_billing_date')
+    ).select_related('tenant')
     
     invoices_created = 0
     for subscription in renewals:
         # Generate invoice
-        invoice_number = f"INV-{timezone.now().year}-{subscription.tenant.id}-{subscription.id}"
+        invoice_number = next_number('subscription_invoice', when=today)
         
         Invoice.objects.create(
             invoice_number=invoice_number,
@@ -105,39 +194,67 @@ def generate_invoices_for_renewals():
 
 @shared_task
 def send_announcement(announcement_id):
-    """Send global announcement via email/SMS/in-app."""
+    """
+    Send a global announcement via in-app/email/SMS, one sub-task per tenant.
+    
+    Runs only for an announcement that publish() moved to 'queued', and moves
+    it to 'sending' first, so duplicate enqueues are no-ops. Tenants whose
+    delivery completed are skipped.
+    """
+    from .announcements import prepare_deliveries, aggregate_delivery_stats
+    
+    claimed = GlobalAnnouncement.objects.filter(
+        id=announcement_id, delivery_status='queued'
+    ).update(delivery_status='sending', updated_at=timezone.now())
+    if not claimed:
+        return f"Announcement {announcement_id} is not queued for delivery"
+    
     announcement = GlobalAnnouncement.objects.get(id=announcement_id)
+    tenant_ids = prepare_deliveries(announcement)
+    if not tenant_ids:
+        aggregate_delivery_stats(announcement_id)
+        return "Announcement already delivered to all tenants"
     
-    # Get target tenants
-    if announcement.target_tenants.exists():
-        tenants = announcement.target_tenants.all()
-    else:
-        tenants = Tenant.objects.filter(is_active=True, is_deleted=False)
+    chord(
+        deliver_announcement_to_tenant.s(announcement_id, tenant_id) for tenant_id in tenant_ids
+    )(finalize_announcement.s(announcement_id))
     
-    sent_count = 0
+    return f"Dispatched announcement to {len(tenant_ids)} tenants"
+
+
+@shared_task(bind=True, acks_late=True, max_retries=None)
+def deliver_announcement_to_tenant(self, announcement_id, tenant_id):
+    """
+    Deliver an announcement to one tenant's users.
     
-    for tenant in tenants:
-        # Send in-app notification
-        if announcement.send_in_app:
-            # TODO: Create in-app notification records
-            sent_count += 1
-        
-        # Send email
-        if announcement.send_email:
-            # TODO: Send email via email service
-            # send_email_task.delay(tenant.email, announcement.title, announcement.message)
-            pass
-        
-        # Send SMS
-        if announcement.send_sms:
-            # TODO: Send SMS via SMS service
-            # send_sms_task.delay(tenant.phone, announcement.message)
-            pass
+    When the email rate limit runs out the task re-schedules itself for when
+    tokens are due and resumes from its checkpoints. Any other error is
+    recorded on the tenant's AnnouncementDelivery instead of raised, so the
+    chord still runs finalize_announcement.
+    """
+    from .announcements import DeliveryThrottled, deliver_to_tenant
     
-    announcement.sent_count = sent_count
-    announcement.save()
+    try:
+        announcement = GlobalAnnouncement.objects.get(id=announcement_id)
+        delivery = deliver_to_tenant(announcement, tenant_id)
+    except DeliveryThrottled as e:
+        raise self.retry(countdown=e.wait)
+    except Exception as e:
+        logger.error(f"Announcement {announcement_id} delivery to tenant {tenant_id} failed: {e}")
+        AnnouncementDelivery.objects.filter(
+            announcement_id=announcement_id, tenant_id=tenant_id
+        ).update(status='failed', error_message=str(e), updated_at=timezone.now())
+        return {'tenant_id': tenant_id, 'status': 'failed'}
+    return {'tenant_id': tenant_id, 'status': delivery.status}
+
+
+@shared_task
+def finalize_announcement(results, announcement_id):
+    """Aggregate per-tenant delivery stats and the final status onto the announcement."""
+    from .announcements import aggregate_delivery_stats
     
-    return f"Sent announcement to {sent_count} tenants"
+    stats = aggregate_delivery_stats(announcement_id)
+    return f"Announcement {announcement_id}: {stats}"
 
 
 @shared_task
@@ -180,14 +297,54 @@ def update_onboarding_progress():
 
 @shared_task
 def cleanup_old_audit_logs():
-    """Cleanup old audit logs (keep last 2 years)."""
+    """
+    Enforce audit log retention (AUDIT_LOG_RETENTION_DAYS) by dropping
+    expired monthly partitions, archiving them first when
+    AUDIT_LOG_ARCHIVE_ENABLED is set.
+    """
+    from django.conf import settings
     from .models import AuditLog
+    from . import partitions
     
-    cutoff = timezone.now() - timedelta(days=730)
-    deleted = AuditLog.objects.filter(created_at__lt=cutoff).delete()[0]
+    cutoff = timezone.now() - timedelta(days=settings.AUDIT_LOG_RETENTION_DAYS)
+    if partitions.is_partitioned():
+        summary = partitions.apply_retention(cutoff, archive=settings.AUDIT_LOG_ARCHIVE_ENABLED)
+        return (
+            f"Dropped {len(summary['dropped'])} audit log partitions, "
+            f"archived {len(summary['archived'])}, trimmed {summary['trimmed_rows']} rows"
+        )
     
+    # Unpartitioned table (non-PostgreSQL databases): delete in bounded batches
+    deleted = 0
+    while True:
+        batch = list(AuditLog.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:5000])
+        if not batch:
+            break
+        deleted += AuditLog.objects.filter(id__in=batch).delete()[0]
     return f"Deleted {deleted} old audit logs"
 
 
+@shared_task
+def maintain_audit_log_partitions():
+    """Create upcoming audit log partitions, then apply retention (runs daily)."""
+    from django.conf import settings
+    from . import partitions
+    
+    if not partitions.is_partitioned():
+        return cleanup_old_audit_logs()
+    created = partitions.ensure_partitions(timezone.now().date(), settings.AUDIT_LOG_PARTITIONS_AHEAD)
+    return f"Created {len(created)} audit log partitions; {cleanup_old_audit_logs()}"
 
 
+@shared_task
+def flush_api_key_usage():
+    """Write API key request counts and last-used times gathered in Redis (runs every minute)."""
+    from django.core.cache import cache
+    from .api_keys import flush_usage
+    
+    if not cache.add('superadmin:apikeys:flush_lock', 1, timeout=300):
+        return "API key usage flush already running"
+    try:
+        return f"Flushed usage for {flush_usage()} API keys"
+    finally:
+        cache.delete('superadmin:apikeys:flush_lock')
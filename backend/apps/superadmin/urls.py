@@ -6,7 +6,8 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     SubscriptionPlanViewSet, TenantSubscriptionViewSet, InvoiceViewSet,
     SupportTicketViewSet, AuditLogViewSet, ImpersonationSessionViewSet,
-    FeatureFlagViewSet, SystemHealthViewSet, PlatformMetricsView
+    FeatureFlagViewSet, SystemHealthViewSet, PlatformMetricsView, PlatformMetricsHistoryView,
+    QueryProfilesView
 )
 from .views_extended import (
     GlobalUserViewSet, APIKeyViewSet, PaymentGatewayViewSet,
@@ -49,6 +50,8 @@ from .views import (
 urlpatterns = [
     path('', include(router.urls)),
     path('metrics/', PlatformMetricsView.as_view(), name='platform-metrics'),
+    path('metrics/history/', PlatformMetricsHistoryView.as_view(), name='platform-metrics-history'),
+    path('query-profiles/', QueryProfilesView.as_view(), name='query-profiles'),
     # Business Logic Endpoints
     path('analytics/churn/', ChurnAnalysisView.as_view(), name='churn-analysis'),
     path('analytics/ltv/<int:tenant_id>/', TenantLTVView.as_view(), name='tenant-ltv'),
@@ -14,16 +14,6 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
 
-def get_client_ip(request):
-    """Get client IP address from request."""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
-
 def export_to_excel(queryset, model_name):
     """Export queryset to Excel file."""
     wb = openpyxl.Workbook()
@@ -33,7 +23,11 @@ def export_to_excel(queryset, model_name):
     # Get model fields
     if queryset.exists():
         first_obj = queryset.first()
-        fields = [field.name for field in first_obj._meta.fields if field.name != 'id']
+        deferred = first_obj.get_deferred_fields()
+        fields = [
+            field.name for field in first_obj._meta.fields
+            if field.name != 'id' and field.attname not in deferred
+        ]
         
         # Header row
         header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
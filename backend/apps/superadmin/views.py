@@ -30,17 +30,11 @@ from .serializers import (
     AuditLogSerializer, ImpersonationSessionSerializer, FeatureFlagSerializer,
     SystemHealthSerializer, PlatformMetricsSerializer
 )
+from . import feature_flags
+from .audit_search import AuditLogSearchFilter, AuditLogCursorPagination
 from .utils import generate_invoice_pdf, export_to_excel
 from apps.core.middleware import get_current_request
-
-def get_client_ip(request):
-    """Get client IP address from request."""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+from apps.core.utils import get_client_ip
 
 
 class SubscriptionPlanViewSet(viewsets.ModelViewSet):
@@ -216,14 +210,14 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Audit Log viewing (read-only)."""
     
-    queryset = AuditLog.objects.select_related('user', 'tenant', 'impersonated_by').all()
+    queryset = AuditLog.objects.select_related('user', 'tenant', 'impersonated_by').defer('search_vector')
     serializer_class = AuditLogSerializer
     permission_classes = [IsSuperAdmin]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, AuditLogSearchFilter, OrderingFilter]
     filterset_fields = ['action_type', 'resource_type', 'user', 'tenant']
-    search_fields = ['resource_name', 'description', 'user__email']
+    pagination_class = AuditLogCursorPagination
     ordering_fields = ['created_at']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
     
     @action(detail=False, methods=['post'])
     def export(self, request):
@@ -349,6 +343,17 @@ class FeatureFlagViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'key', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    
+    @action(detail=False, methods=['get'])
+    def evaluate(self, request):
+        """Evaluate every flag for a tenant (``?tenant=<id>``; omit for platform-wide)."""
+        tenant_id = request.query_params.get('tenant')
+        if tenant_id is not None:
+            try:
+                tenant_id = int(tenant_id)
+            except ValueError:
+                return Response({'error': 'tenant must be an integer id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'tenant': tenant_id, 'flags': feature_flags.flags_for(tenant_id)})
 
 
 class SystemHealthViewSet(viewsets.ReadOnlyModelViewSet):
@@ -373,88 +378,52 @@ class PlatformMetricsView(generics.RetrieveAPIView):
     serializer_class = PlatformMetricsSerializer
     
     def get_object(self):
-        """Calculate and return platform metrics."""
-        now = timezone.now()
-        thirty_days_ago = now - timedelta(days=30)
-        
-        # Schools
-        total_schools = Tenant.objects.filter(is_deleted=False).count()
-        active_schools = Tenant.objects.filter(is_deleted=False, is_active=True).count()
-        active_last_7d = Tenant.objects.filter(
-            is_deleted=False,
-            is_active=True,
-            updated_at__gte=now - timedelta(days=7)
-        ).count()
-        active_last_30d = Tenant.objects.filter(
-            is_deleted=False,
-            is_active=True,
-            updated_at__gte=thirty_days_ago
-        ).count()
-        
-        # Users
-        total_students = Student.objects.filter(is_deleted=False).count()
-        total_teachers = User.objects.filter(role='teacher', is_active=True).count()
-        total_parents = User.objects.filter(role='parent', is_active=True).count()
-        
-        # Revenue
-        active_subscriptions = TenantSubscription.objects.filter(
-            status='active',
-            end_date__gte=now.date()
-        )
-        mrr = active_subscriptions.filter(billing_cycle='monthly').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        yearly_revenue = active_subscriptions.filter(billing_cycle='yearly').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        arr = (mrr * 12) + yearly_revenue
-        
-        # Subscriptions
-        trial_schools = TenantSubscription.objects.filter(status='trial').count()
-        paid_schools = TenantSubscription.objects.filter(status='active').count()
-        
-        # SMS (mock - implement with actual SMS service)
-        sms_sent = 125000  # Replace with actual count
-        sms_remaining = 875000  # Replace with actual quota
-        
-        # Storage (mock - implement with actual storage tracking)
-        storage_used = 450.0
-        storage_total = 1000.0
-        
-        # System health
-        latest_health = SystemHealth.objects.first()
-        uptime = 99.98  # Calculate from health records
-        error_rate = latest_health.error_rate if latest_health else 0.02
+        """Return the latest platform metrics snapshot (see apps.superadmin.metrics)."""
+        from .metrics import get_platform_metrics
+        return get_platform_metrics()
+
+
+class PlatformMetricsHistoryView(generics.GenericAPIView):
+    """Platform metrics time series for dashboard charts (hourly points beyond the detail window)."""
+    
+    permission_classes = [IsSuperAdmin]
+    
+    def get(self, request):
+        from django.conf import settings
+        from .metrics import snapshot_series
         
-        # New signups
-        new_signups = Tenant.objects.filter(
-            created_at__gte=now - timedelta(days=7)
-        ).count()
+        try:
+            days = min(int(request.query_params.get('days', 7)), settings.PLATFORM_METRICS_RETENTION_DAYS)
+        except ValueError:
+            return Response({'error': 'Invalid days'}, status=status.HTTP_400_BAD_REQUEST)
+        fields = [field for field in request.query_params.get('fields', '').split(',') if field]
         
-        # Payment success rate (mock)
-        payment_success_rate = 98.5
+        snapshots = snapshot_series(days)
         
-        return {
-            'total_schools': total_schools,
-            'active_schools': active_schools,
-            'active_last_7d': active_last_7d,
-            'active_last_30d': active_last_30d,
-            'total_students': total_students,
-            'total_teachers': total_teachers,
-            'total_parents': total_parents,
-            'mrr': float(mrr),
-            'arr': float(arr),
-            'trial_schools': trial_schools,
-            'paid_schools': paid_schools,
-            'sms_sent': sms_sent,
-            'sms_remaining': sms_remaining,
-            'storage_used': storage_used,
-            'storage_total': storage_total,
-            'uptime': uptime,
-            'error_rate': error_rate,
-            'new_signups': new_signups,
-            'payment_success_rate': payment_success_rate,
-        }
+        return Response([
+            {
+                'captured_at': captured_at.isoformat(),
+                'metrics': {key: metrics.get(key) for key in fields} if fields else metrics,
+            }
+            for captured_at, metrics in snapshots
+        ])
+
+
+class QueryProfilesView(generics.GenericAPIView):
+    """Sampled SQL profiles: heaviest views, or recent samples for ``?view=``."""
+    
+    permission_classes = [IsSuperAdmin]
+    
+    def get(self, request):
+        from apps.core.query_profiler import profiled_views, view_profiles
+        
+        view = request.query_params.get('view')
+        if view:
+            return Response(view_profiles(view))
+        return Response([
+            {'view': name, 'max_queries': max_queries}
+            for name, max_queries in profiled_views()
+        ])
 
 
 # Business Logic Views
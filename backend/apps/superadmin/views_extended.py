@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
 from django.http import HttpResponse
@@ -21,7 +22,7 @@ from apps.users.models import User
 from .models import (
     GlobalUser, APIKey, PaymentGateway, PaymentTransaction,
     Lead, Backup, Content, ContentSubscription, Contract,
-    GlobalAnnouncement, KnowledgeBaseArticle, OnboardingChecklist
+    GlobalAnnouncement, KnowledgeBaseArticle, OnboardingChecklist, AuditLog
 )
 try:
     from .serializers_extended import (
@@ -40,7 +41,8 @@ except ImportError:
         GlobalAnnouncementSerializer, KnowledgeBaseArticleSerializer,
         OnboardingChecklistSerializer
     )
-from .utils import export_to_excel, get_client_ip
+from apps.core.utils import get_client_ip
+from .utils import export_to_excel
 
 
 class GlobalUserViewSet(viewsets.ModelViewSet):
@@ -348,7 +350,17 @@ class BackupViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
-        """Trigger restore from backup (placeholder for actual restore logic)."""
+        """
+        Restore the tenant from this backup in the background.
+        
+        ``mode`` is 'replace' (overwrite the tenant in place, default) or
+        'remap' (load under new keys, e.g. alongside other tenants);
+        ``tenant_overrides`` sets tenant fields such as slug and code on a
+        remapped copy.
+        """
+        from .restores import RESTORE_MODES
+        from .tasks import restore_tenant_backup
+        
         backup = self.get_object()
         if backup.status != 'completed':
             return Response(
@@ -356,12 +368,57 @@ class BackupViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # TODO: Implement actual restore logic
+        mode = request.data.get('mode', 'replace')
+        if mode not in RESTORE_MODES:
+            return Response(
+                {'error': f"mode must be one of: {', '.join(RESTORE_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        tenant_overrides = request.data.get('tenant_overrides') or None
+        if tenant_overrides is not None and not isinstance(tenant_overrides, dict):
+            return Response(
+                {'error': 'tenant_overrides must be an object'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        restore_tenant_backup.delay(
+            backup.id, mode=mode, tenant_overrides=tenant_overrides, requested_by=request.user.id
+        )
         return Response({
             'status': 'Restore initiated',
             'backup_id': backup.id,
             'tenant_id': backup.tenant.id,
-        })
+            'mode': mode,
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Stream the backup archive from private storage (superadmins only)."""
+        from django.http import FileResponse
+        from .backups import backup_storage
+        
+        backup = self.get_object()
+        if backup.status != 'completed' or not backup.file_path:
+            return Response(
+                {'error': 'Backup is not completed'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        AuditLog.objects.create(
+            user=request.user,
+            action_type='export',
+            resource_type='Backup',
+            resource_id=backup.id,
+            resource_name=str(backup),
+            description=f'Backup archive downloaded by {request.user.email}',
+            tenant=backup.tenant,
+        )
+        return FileResponse(
+            backup_storage().open(backup.file_path, 'rb'),
+            as_attachment=True,
+            filename=f'backup-{backup.tenant_id}-{backup.id}.tar',
+            content_type='application/x-tar',
+        )
     
     @action(detail=False, methods=['post'])
     def create_backup(self, request):
@@ -370,6 +427,11 @@ class BackupViewSet(viewsets.ReadOnlyModelViewSet):
         backup_type = request.data.get('backup_type', 'full')
         
         tenant = get_object_or_404(Tenant, id=tenant_id)
+        if backup_type not in dict(Backup.BACKUP_TYPES):
+            return Response(
+                {'error': 'Invalid backup type'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Create backup record (actual backup will be done by Celery task)
         backup = Backup.objects.create(
@@ -377,10 +439,11 @@ class BackupViewSet(viewsets.ReadOnlyModelViewSet):
             backup_type=backup_type,
             status='pending',
             file_path='',  # Will be set by backup task
+            file_size_mb=0,
         )
         
-        # TODO: Queue Celery task for actual backup
-        # create_backup_task.delay(backup.id)
+        from .tasks import create_tenant_backup
+        transaction.on_commit(lambda: create_tenant_backup.delay(backup.id))
         
         serializer = self.get_serializer(backup)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -540,14 +603,25 @@ class GlobalAnnouncementViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def publish(self, request, pk=None):
-        """Publish announcement."""
-        announcement = self.get_object()
-        announcement.is_published = True
-        announcement.published_at = timezone.now()
-        announcement.save()
-        
-        # TODO: Send emails/SMS/in-app notifications via Celery
-        # send_announcement_task.delay(announcement.id)
+        """Publish announcement and deliver it (resumes an unfinished delivery)."""
+        from .announcements import delivery_in_flight
+        from .tasks import send_announcement
+        
+        with transaction.atomic():
+            announcement = GlobalAnnouncement.objects.select_for_update().get(pk=self.get_object().pk)
+            if delivery_in_flight(announcement):
+                return Response(
+                    {'error': 'Announcement delivery is already in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            announcement.is_published = True
+            announcement.published_at = announcement.published_at or timezone.now()
+            enqueue = announcement.delivery_status != 'completed'
+            if enqueue:
+                announcement.delivery_status = 'queued'
+            announcement.save()
+            if enqueue:
+                transaction.on_commit(lambda: send_announcement.delay(announcement.id))
         
         serializer = self.get_serializer(announcement)
         return Response(serializer.data)
@@ -3,9 +3,6 @@ ASGI config for EduCore project.
 """
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from apps.superadmin import routing
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'educore.settings')
 
@@ -13,12 +10,17 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'educore.settings')
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from apps.core.websocket_auth import JWTAuthMiddlewareStack  # noqa: E402
+from apps.communications import routing as communications_routing  # noqa: E402
+from apps.superadmin import routing as superadmin_routing  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
-            routing.websocket_urlpatterns
+            superadmin_routing.websocket_urlpatterns
+            + communications_routing.websocket_urlpatterns
         )
     ),
 })
-
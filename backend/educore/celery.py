@@ -3,6 +3,7 @@ Celery configuration for EduCore.
 """
 import os
 from celery import Celery
+from celery.signals import task_failure
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'educore.settings')
 
@@ -15,5 +16,12 @@ def debug_task(self):
     print(f'Request: {self.request!r}')
 
 
+@task_failure.connect
+def count_task_failure(**kwargs):
+    """Feed the failed-jobs figure of SystemHealth."""
+    from apps.core.request_metrics import record_task_failure
+    record_task_failure()
+
+
 
 
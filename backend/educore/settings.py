@@ -21,6 +21,8 @@ SECRET_KEY = env('SECRET_KEY', default='django-insecure-change-me-in-production'
 DEBUG = env('DEBUG', default=True)
 
 ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['localhost', '127.0.0.1'])
+# Reverse proxies in front of the app that append to X-Forwarded-For; 0 = use REMOTE_ADDR
+TRUSTED_PROXY_COUNT = env.int('TRUSTED_PROXY_COUNT', default=0)
 
 # Application definition
 INSTALLED_APPS = [
@@ -56,6 +58,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestMetricsMiddleware',  # Latency/throughput for SystemHealth
+    'apps.core.middleware.QueryProfilerMiddleware',  # Sampled SQL profiling / N+1 detection
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -156,6 +160,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Only applies to API key requests (apps.superadmin.api_keys)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'apps.superadmin.api_keys.APIKeyRateThrottle',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
     'DEFAULT_FILTER_BACKENDS': (
@@ -180,6 +188,17 @@ CORS_ALLOWED_ORIGINS = env.list(
 )
 CORS_ALLOW_CREDENTIALS = True
 
+# Redis (cache, channel layer)
+REDIS_URL = env('REDIS_URL', default='redis://localhost:6379/1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'educore',
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -188,13 +207,66 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Periodic tasks (celery beat)
+from celery.schedules import crontab
+CELERY_BEAT_SCHEDULE = {
+    'record-system-health': {
+        'task': 'apps.superadmin.tasks.record_system_health',
+        'schedule': crontab(minute='*/5'),
+    },
+    'broadcast-monitoring-metrics': {
+        'task': 'apps.superadmin.tasks.broadcast_monitoring_metrics',
+        'schedule': 10.0,
+    },
+    'flush-api-key-usage': {
+        'task': 'apps.superadmin.tasks.flush_api_key_usage',
+        'schedule': 60.0,
+    },
+    'capture-platform-metrics': {
+        'task': 'apps.superadmin.tasks.capture_platform_metrics',
+        'schedule': crontab(minute='*/5'),
+    },
+    'recompute-fee-invoices': {
+        'task': 'apps.fees.tasks.recompute_fee_invoices',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'build-reconciliation-snapshots': {
+        'task': 'apps.schooladmin.tasks.build_reconciliation_snapshots',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'process-payment-webhooks': {
+        'task': 'apps.fees.tasks.process_payment_webhooks',
+        'schedule': 60.0,
+    },
+    'drain-sms-queue': {
+        'task': 'apps.communications.tasks.drain_sms_queue',
+        'schedule': 30.0,
+    },
+    'dispatch-scheduled-campaigns': {
+        'task': 'apps.schooladmin.tasks.dispatch_scheduled_campaigns',
+        'schedule': 60.0,
+    },
+    'apply-delivery-receipts': {
+        'task': 'apps.communications.tasks.apply_delivery_receipts',
+        'schedule': 60.0,
+    },
+    'maintain-audit-log-partitions': {
+        'task': 'apps.superadmin.tasks.maintain_audit_log_partitions',
+        'schedule': crontab(hour=2, minute=15),
+    },
+    'reconcile-unread-counters': {
+        'task': 'apps.communications.tasks.reconcile_unread_counters',
+        'schedule': crontab(minute='*/15'),
+    },
+}
+
 # Channels (WebSocket) Configuration
 ASGI_APPLICATION = 'educore.asgi.application'
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL', default='redis://localhost:6379/1')],
+            "hosts": [REDIS_URL],
         },
     },
 }
@@ -203,11 +275,94 @@ CHANNEL_LAYERS = {
 TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = env('TWILIO_PHONE_NUMBER', default='')
+SMS_PROVIDER = env('SMS_PROVIDER', default='twilio')  # 'twilio' or 'fake'
+SMS_TENANT_RATE_PER_SECOND = env.float('SMS_TENANT_RATE_PER_SECOND', default=5.0)
+SMS_TENANT_BURST = env.int('SMS_TENANT_BURST', default=20)
+SMS_MAX_ATTEMPTS = env.int('SMS_MAX_ATTEMPTS', default=5)
+SMS_RETRY_BASE_SECONDS = env.int('SMS_RETRY_BASE_SECONDS', default=30)
+SMS_RETRY_MAX_SECONDS = env.int('SMS_RETRY_MAX_SECONDS', default=3600)
+
+# Email pacing for bulk sends (messages/second shared by all workers)
+EMAIL_RATE_PER_SECOND = env.float('EMAIL_RATE_PER_SECOND', default=10.0)
+EMAIL_RATE_BURST = env.int('EMAIL_RATE_BURST', default=50)
+
+# Notifications
+NOTIFICATION_DEDUPE_SECONDS = env.int('NOTIFICATION_DEDUPE_SECONDS', default=600)
+
+# SQL query profiling (apps.core.query_profiler)
+QUERY_PROFILER_ENABLED = env.bool('QUERY_PROFILER_ENABLED', default=DEBUG)
+QUERY_PROFILER_SAMPLE_RATE = env.float('QUERY_PROFILER_SAMPLE_RATE', default=1.0 if DEBUG else 0.01)
+QUERY_PROFILER_SLOW_MS = env.float('QUERY_PROFILER_SLOW_MS', default=100.0)
+QUERY_PROFILER_REPEAT_THRESHOLD = env.int('QUERY_PROFILER_REPEAT_THRESHOLD', default=5)
 
 # Payment Gateways
 ECOCASH_API_KEY = env('ECOCASH_API_KEY', default='')
 PAYNOW_INTEGRATION_ID = env('PAYNOW_INTEGRATION_ID', default='')
 PAYNOW_INTEGRATION_KEY = env('PAYNOW_INTEGRATION_KEY', default='')
+ECOCASH_WEBHOOK_SECRET = env('ECOCASH_WEBHOOK_SECRET', default='')
+# Local fake gateway for development and tests (never enable in production);
+# off unless explicitly enabled, and only with an explicit signing secret
+FAKE_GATEWAY_ENABLED = env.bool('FAKE_GATEWAY_ENABLED', default=False)
+FAKE_GATEWAY_SECRET = env('FAKE_GATEWAY_SECRET', default='')
+if FAKE_GATEWAY_ENABLED and not FAKE_GATEWAY_SECRET:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured('FAKE_GATEWAY_ENABLED requires FAKE_GATEWAY_SECRET to be set')
+
+# Batch PDF rendering (defaults to one worker per CPU; optional TTF for non-Latin names).
+# Its process pool cannot start inside a prefork (daemonic) Celery worker: set
+# BATCH_RENDER_QUEUE and consume it with `celery -A educore worker -Q <queue> --pool=solo`,
+# otherwise batches render serially in the worker process.
+BATCH_RENDER_WORKERS = env.int('BATCH_RENDER_WORKERS', default=0) or None
+REPORT_FONT_PATH = env('REPORT_FONT_PATH', default='')
+BATCH_RENDER_QUEUE = env('BATCH_RENDER_QUEUE', default='')
+if BATCH_RENDER_QUEUE:
+    CELERY_TASK_ROUTES = {'apps.schooladmin.tasks.render_document_batch': {'queue': BATCH_RENDER_QUEUE}}
+
+# Platform metrics snapshots: every capture is kept this many days, then one per
+# day until the retention limit
+PLATFORM_METRICS_DETAIL_DAYS = env.int('PLATFORM_METRICS_DETAIL_DAYS', default=7)
+PLATFORM_METRICS_RETENTION_DAYS = env.int('PLATFORM_METRICS_RETENTION_DAYS', default=365)
+
+# Audit log retention (monthly partitions older than this are dropped)
+AUDIT_LOG_RETENTION_DAYS = env.int('AUDIT_LOG_RETENTION_DAYS', default=730)
+AUDIT_LOG_PARTITIONS_AHEAD = env.int('AUDIT_LOG_PARTITIONS_AHEAD', default=3)
+# Write each dropped month to BACKUP_STORAGE (audit-archive/) as gzipped CSV first
+AUDIT_LOG_ARCHIVE_ENABLED = env.bool('AUDIT_LOG_ARCHIVE_ENABLED', default=False)
+# Audit log search: window used when none is given, and the longest allowed
+AUDIT_SEARCH_DEFAULT_DAYS = env.int('AUDIT_SEARCH_DEFAULT_DAYS', default=30)
+AUDIT_SEARCH_MAX_DAYS = env.int('AUDIT_SEARCH_MAX_DAYS', default=366)
+
+# Seconds between checks of the feature flag version in cache (apps.superadmin.feature_flags)
+FEATURE_FLAGS_CHECK_INTERVAL = env.float('FEATURE_FLAGS_CHECK_INTERVAL', default=5.0)
+
+# Tenant API keys: per-process lookup cache (revocations apply within the TTL)
+API_KEY_CACHE_SIZE = env.int('API_KEY_CACHE_SIZE', default=1024)
+API_KEY_CACHE_TTL = env.float('API_KEY_CACHE_TTL', default=30.0)
+
+# Tenant backups: tables exported in parallel from one database snapshot
+BACKUP_WORKERS = env.int('BACKUP_WORKERS', default=4)
+# Private storage for tenant backups and audit archives: outside MEDIA_ROOT,
+# never URL-routed; archives are only downloadable through superadmin views
+BACKUP_S3_BUCKET = env('BACKUP_S3_BUCKET', default='')
+if BACKUP_S3_BUCKET:
+    BACKUP_STORAGE = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'bucket_name': BACKUP_S3_BUCKET,
+            'default_acl': 'private',
+            'querystring_auth': True,
+            'custom_domain': None,
+        },
+    }
+else:
+    BACKUP_STORAGE = {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': env('BACKUP_ROOT', default=str(BASE_DIR / 'private')),
+            'file_permissions_mode': 0o600,
+            'directory_permissions_mode': 0o700,
+        },
+    }
 
 # File Storage (S3)
 AWS_ACCESS_KEY_ID = env('AWS_ACCESS_KEY_ID', default='')